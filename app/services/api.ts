@@ -152,6 +152,38 @@ export const taskService = {
   }
 };
 
+export interface SearchResult {
+  type: 'project' | 'task';
+  id: number;
+  project_id: number;
+  title: string;
+  status?: string;
+  score: number;
+}
+
+export const searchService = {
+  // Projects and tasks matching every word; the last word matches as a prefix
+  search: async (q: string, limit = 20): Promise<SearchResult[]> => {
+    const response = await api.get('/api/v1/search', { params: { q, limit } });
+    return response.data;
+  }
+};
+
+export const workspaceService = {
+  // Projects, tasks and conversations as newline-delimited JSON
+  exportWorkspace: async (): Promise<Blob> => {
+    const response = await api.get('/api/v1/export', { responseType: 'blob' });
+    return response.data;
+  },
+  // Imported projects get new ids; the response maps exported ids to them
+  importWorkspace: async (file: Blob) => {
+    const response = await api.post('/api/v1/import', file, {
+      headers: { 'Content-Type': 'application/x-ndjson' }
+    });
+    return response.data;
+  }
+};
+
 export const chatService = {
   sendMessage: async (message: string, projectId?: number, options?: ChatOptions) => {
     try {
@@ -1,14 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any
 from ..database import get_db
 from ..services.ai_service import AIService
+from ..services.history_search import HistorySearch
 from ..models import ChatHistory, Project
 from pydantic import BaseModel
 from datetime import datetime
 
 router = APIRouter()
 ai_service = AIService()
+history_search = HistorySearch(ai_service)
 
 class ChatMessage(BaseModel):
     message: str
@@ -55,6 +57,7 @@ async def chat(
     db.add(chat_history)
     db.commit()
     db.refresh(chat_history)
+    history_search.add_chat(chat_history)
 
     return ChatResponse(
         message=response,
@@ -84,18 +87,24 @@ async def get_chat_history(
 async def search_chat_history(
     project_id: int,
     query: str,
+    k: int = Query(5, ge=1, le=50),
+    mode: str = Query("auto", pattern="^(auto|lexical|semantic|hybrid)$"),
     db: Session = Depends(get_db)
 ):
-    """Search through chat history for relevant information."""
+    """Search through chat history for relevant information.
+
+    Exact terms are matched through a keyword index and related wording
+    through the vector store; `mode` picks one or both ("auto" skips the
+    vector store when the keywords alone find enough results).
+    """
     # Verify project exists
     project = db.query(Project).filter(Project.id == project_id).first()
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
 
-    # Search through vector store
-    results = await ai_service.search_project_history(
-        str(project_id),
-        query
-    )
+    return await history_search.search(db, project_id, query, k=k, mode=mode)
 
-    return results 
\ No newline at end of file
+@router.get("/stats")
+async def search_stats():
+    """Index sizes and how many searches skipped the vector store."""
+    return {"history_search": history_search.stats(), "ai": ai_service.stats()}
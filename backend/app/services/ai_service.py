@@ -1,38 +1,172 @@
-from langchain.vectorstores import Chroma
-from langchain.embeddings import OpenAIEmbeddings
-from langchain.chat_models import ChatOpenAI
-from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
+from langchain.chains import ConversationalRetrievalChain, LLMChain
+from langchain.chains.conversational_retrieval.prompts import CONDENSE_QUESTION_PROMPT
+from langchain.chains.question_answering import load_qa_chain
 from langchain.prompts import PromptTemplate
-from typing import List, Dict, Any, Optional
+from langchain.callbacks.base import AsyncCallbackHandler
+from langchain.schema import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
+import asyncio
+import hashlib
 import os
+import time
 from dotenv import load_dotenv
+from app.services.conversation_memory import GENERAL, ConversationMemory, Turn
+from app.services.response_cache import ResponseCache, unit_vector
+from app.services.embedding_cache import CachedEmbeddings
+from app.services.ingestion_queue import IngestionQueue
+from app.services.providers import create_models
+from app.services.vector_collections import ProjectCollections, ProjectRetriever
 
 load_dotenv()
 
+SUMMARY_PROMPT = """Summarize the conversation between a user and a project management assistant below in a few sentences. Keep project and task names, decisions and open questions.
+
+Summary so far:
+{summary}
+
+New lines:
+{lines}
+
+New summary:"""
+
+def conversation_document(project_id: str, user_message: str, assistant_message: str) -> str:
+    """Text a conversation turn is stored under in the vector store."""
+    return f"Project {project_id}: User: {user_message}\nAssistant: {assistant_message}"
+
+def collection_key(user_id: str, project_id: str) -> str:
+    """Vector collection a conversation is stored in and retrieved from.
+
+    Conversations about a project share its collection. General ones,
+    about no project, get a collection per user, so that one user's chats
+    are never retrieved into another's prompt.
+    """
+    if project_id != GENERAL:
+        return project_id
+    return f"{GENERAL}-{hashlib.sha256(user_id.encode()).hexdigest()[:16]}"
+
+def content_id(text: str) -> str:
+    """Vector store id of a document, derived from its text."""
+    return hashlib.sha256(text.encode()).hexdigest()
+
+class TokenQueueHandler(AsyncCallbackHandler):
+    """Collects tokens from streaming LLM calls into an asyncio queue."""
+
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        if token:
+            self.queue.put_nowait(token)
+
+class UpstreamLimiter:
+    """Caps concurrent calls to the OpenAI API and tracks the queue in front of it."""
+
+    def __init__(self, max_concurrent: int):
+        self.max_concurrent = max_concurrent
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.waiting = 0
+        self.active = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.max_waiting = 0
+        self.total_wait = 0.0
+
+    @asynccontextmanager
+    async def slot(self):
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        queued_at = time.monotonic()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.total_wait += time.monotonic() - queued_at
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "completed": self.completed,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(self.total_wait / (self.completed or 1) * 1000, 2),
+        }
+
 class AIService:
     def __init__(self):
+        # Every upstream call goes through the limiter, and LLM calls are
+        # abandoned after llm_timeout seconds, so slow completions queue
+        # among themselves instead of starving the rest of the app.
+        self.limiter = UpstreamLimiter(int(os.getenv("LLM_MAX_CONCURRENCY", "8")))
+        self.llm_timeout = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+        # Chat history per (user, project), bounded in tokens and in the
+        # number of conversations held in memory
+        self.memory = ConversationMemory(
+            os.getenv("CONVERSATION_DIR", "./data/conversations"),
+            token_budget=int(os.getenv("CONVERSATION_TOKEN_BUDGET", "1500")),
+            max_conversations=int(os.getenv("CONVERSATION_CACHE_SIZE", "256")),
+            summarizer=self.summarize_turns
+        )
+        # Answers to repeated questions about a project whose context has
+        # not changed since they were generated
+        self.response_cache = ResponseCache(
+            max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "1000")),
+            ttl=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "600")),
+            threshold=float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.95"))
+        )
+        # "openai", or "offline" for local stand-in models that need no
+        # network, for load tests and profiling
+        self.provider = os.getenv("AI_PROVIDER", "openai").lower()
         try:
-            self.openai_api_key = os.getenv("OPENAI_API_KEY")
-            if not self.openai_api_key:
-                raise ValueError("OPENAI_API_KEY environment variable is not set")
-
-            self.embeddings = OpenAIEmbeddings(openai_api_key=self.openai_api_key)
-            self.llm = ChatOpenAI(
-                openai_api_key=self.openai_api_key,
-                model_name="gpt-4",
-                temperature=0.7
+            models = create_models(self.provider, self.llm_timeout)
+
+            # Vectors are cached on disk, so repeated documents and queries
+            # are only embedded once
+            self.embeddings = CachedEmbeddings(
+                models.embeddings,
+                os.getenv("EMBEDDING_CACHE_PATH", "./data/embeddings.sqlite3"),
+                model=models.embedding_model
             )
+            self.llm = models.llm
+            # Answers are generated with streaming enabled so their tokens
+            # reach callbacks as they arrive; rephrasing the question for
+            # the retriever uses the plain model, so only answer tokens
+            # are streamed.
+            self.streaming_llm = models.streaming_llm
             
-            # Initialize vector store
-            self.vector_store = Chroma(
-                persist_directory="./data/vectorstore",
-                embedding_function=self.embeddings
+            # Initialize vector store, one collection per project; stand-in
+            # vectors are kept apart from the real ones. Several workers
+            # must share a Chroma server rather than the directory.
+            default_vector_dir = "./data/vectorstore" if self.provider == "openai" else f"./data/{self.provider}/vectorstore"
+            self.collections = ProjectCollections(
+                os.getenv("VECTORSTORE_DIR", default_vector_dir),
+                self.embeddings,
+                max_open=int(os.getenv("VECTOR_COLLECTION_CACHE_SIZE", "64")),
+                server=os.getenv("CHROMA_SERVER") or None
+            )
+            # General conversations were once stored in one collection for
+            # all users; they cannot be told apart, so they are dropped
+            self.collections.drop(GENERAL)
+            # Conversations are embedded and written in batches off the
+            # request path
+            self.ingestion = IngestionQueue(
+                self.collections.add,
+                batch_size=int(os.getenv("VECTOR_INGEST_BATCH_SIZE", "32")),
+                interval=int(os.getenv("VECTOR_INGEST_INTERVAL_MS", "2000")) / 1000
             )
 
             # Custom prompt template
             self.prompt_template = PromptTemplate(
-                input_variables=["context", "question", "chat_history"],
+                input_variables=["context", "history", "question", "chat_history"],
                 template="""You are an AI project management assistant with direct access to project data. You should provide specific information about projects when available, not just instructions on how to find it.
 
                 When project information is available in the context, use it to give specific answers about the project's details, tasks, and status. Don't tell users to navigate the UI - you have direct access to the information.
@@ -40,6 +174,9 @@ class AIService:
                 Current Project Context:
                 {context}
 
+                Related Earlier Conversations:
+                {history}
+
                 Chat History:
                 {chat_history}
 
@@ -48,71 +185,279 @@ class AIService:
                 Answer:"""
             )
 
-            # Initialize conversation chain
-            self.conversation_chain = ConversationalRetrievalChain.from_llm(
-                llm=self.llm,
-                retriever=self.vector_store.as_retriever(),
-                memory=ConversationBufferMemory(
-                    memory_key="chat_history",
-                    return_messages=True
-                ),
-                combine_docs_chain_kwargs={"prompt": self.prompt_template}
+            # Parts of the conversation chain; each project's chain pairs
+            # them with a retriever over that project's collection. The
+            # retrieved conversations fill {history}, leaving {context} to
+            # the project context passed with the question.
+            self.combine_docs_chain = load_qa_chain(
+                self.streaming_llm,
+                chain_type="stuff",
+                prompt=self.prompt_template,
+                document_variable_name="history"
             )
+            self.question_generator = LLMChain(llm=self.llm, prompt=CONDENSE_QUESTION_PROMPT)
             self.is_openai_available = True
         except Exception as e:
-            print(f"Failed to initialize OpenAI services: {str(e)}")
+            print(f"Failed to initialize {self.provider} AI services: {str(e)}")
             self.is_openai_available = False
 
+    def stats(self) -> Dict[str, Any]:
+        """Queue depths and cache counters of the service's parts."""
+        stats = {
+            "upstream": self.limiter.stats(),
+            "conversations": self.memory.stats(),
+            "response_cache": self.response_cache.stats(),
+        }
+        if self.is_openai_available:
+            stats["embeddings"] = self.embeddings.stats()
+            stats["ingestion"] = self.ingestion.stats()
+            stats["collections"] = self.collections.stats()
+        return stats
+
     async def add_to_memory(self, project_id: str, user_message: str, assistant_message: str):
         """Add a conversation to the vector store for future reference."""
         # Create a document with metadata
-        doc = f"Project {project_id}: User: {user_message}\nAssistant: {assistant_message}"
+        doc = conversation_document(project_id, user_message, assistant_message)
         metadata = {
             "project_id": project_id,
-            "type": "conversation"
+            "type": "conversation",
+            "created_at": time.time()
         }
         
-        # Add to vector store
-        self.vector_store.add_texts(
-            texts=[doc],
-            metadatas=[metadata]
+        # Queue for the vector store; it is embedded and written with the
+        # next batch. Documents are keyed by their content, so a repeated
+        # exchange replaces the earlier copy instead of adding another.
+        self.ingestion.enqueue(doc, metadata, doc_id=content_id(doc))
+
+    async def conversation_chain(self, project_id: str) -> ConversationalRetrievalChain:
+        """Conversation chain retrieving from the project's own past conversations."""
+        return ConversationalRetrievalChain(
+            retriever=ProjectRetriever(collections=self.collections, project_id=str(project_id)),
+            combine_docs_chain=self.combine_docs_chain,
+            question_generator=self.question_generator
         )
-        self.vector_store.persist()
 
-    async def get_response(self, project_id: str, user_message: str, project_context: Optional[str] = None) -> str:
-        """Get a response from the AI assistant based on the user's message and project context."""
+    async def drop_project(self, project_id: str):
+        """Forget a deleted project's conversations in the vector store."""
+        if not self.is_openai_available:
+            return
+        await asyncio.to_thread(self.ingestion.discard, lambda metadata: metadata["project_id"] == project_id)
+        await asyncio.to_thread(self.collections.drop, project_id)
+
+    async def summarize_turns(self, summary: str, turns: List[Turn]) -> str:
+        """Fold conversation turns into a running summary."""
+        lines = "\n".join(f"User: {user}\nAssistant: {assistant}" for user, assistant in turns)
+        prompt = SUMMARY_PROMPT.format(summary=summary or "(none)", lines=lines)
+        async with self.limiter.slot():
+            return await asyncio.wait_for(self.llm.apredict(prompt), timeout=self.llm_timeout)
+
+    async def summarize_documents(self, documents: List[str]) -> str:
+        """Summarize stored conversation documents into one, for vector store maintenance."""
+        prompt = SUMMARY_PROMPT.format(summary="(none)", lines="\n\n".join(documents))
+        async with self.limiter.slot():
+            return await asyncio.wait_for(self.llm.apredict(prompt), timeout=self.llm_timeout)
+
+    def _chain_inputs(self, user_id: str, project_id: str, user_message: str, context: str) -> Dict[str, Any]:
+        summary, turns = self.memory.history(user_id, project_id)
+        chat_history: List[BaseMessage] = []
+        if summary:
+            chat_history.append(SystemMessage(content=f"Summary of the earlier conversation: {summary}"))
+        for user, assistant in turns:
+            chat_history += [HumanMessage(content=user), AIMessage(content=assistant)]
+        return {"question": user_message, "context": context, "chat_history": chat_history}
+
+    async def _remember(self, user_id: str, project_id: str, user_message: str, answer: str):
+        await self.memory.add_turn(user_id, project_id, user_message, answer)
+        await self.add_to_memory(collection_key(user_id, project_id), user_message, answer)
+
+    async def similarities(self, question: str, texts: List[str]) -> Optional[List[float]]:
+        """Cosine similarity of each text to the question, or None if embeddings are unavailable."""
+        if not self.is_openai_available:
+            return None
+        try:
+            async with self.limiter.slot():
+                vectors = await asyncio.wait_for(
+                    self.embeddings.aembed_documents([question] + texts), timeout=self.llm_timeout
+                )
+        except Exception as e:
+            print(f"Error embedding texts for ranking: {str(e)}")
+            return None
+        query = unit_vector(vectors[0])
+        return [sum(a * b for a, b in zip(query, unit_vector(v))) for v in vectors[1:]]
+
+    async def _cached_answer(
+        self, user_id: str, project_id: str, user_message: str, project_context: Optional[str]
+    ) -> Tuple[Optional[str], Optional[List[float]]]:
+        """Return (cached answer, question embedding) for a question about a project.
+
+        Exact repeats are answered without calling the API; otherwise the
+        question is embedded to find a similar one, and the embedding is
+        returned so a new answer can be cached under it.
+        """
+        if not project_context:
+            return None, None
+        scope = (user_id, project_id)
+        answer = self.response_cache.lookup(scope, project_context, user_message)
+        if answer is not None:
+            return answer, None
+        try:
+            async with self.limiter.slot():
+                embedding = await asyncio.wait_for(
+                    self.embeddings.aembed_query(user_message), timeout=self.llm_timeout
+                )
+        except Exception as e:
+            print(f"Error embedding question for the response cache: {str(e)}")
+            return None, None
+        return self.response_cache.lookup_similar(scope, project_context, embedding), embedding
+
+    def _cache_answer(
+        self,
+        user_id: str,
+        project_id: str,
+        user_message: str,
+        project_context: Optional[str],
+        embedding: Optional[List[float]],
+        answer: str
+    ):
+        if project_context:
+            self.response_cache.put((user_id, project_id), project_context, user_message, embedding, answer)
+
+    async def get_response(
+        self,
+        project_id: str,
+        user_message: str,
+        project_context: Optional[str] = None,
+        user_id: str = "anonymous",
+        prompt_context: Optional[str] = None
+    ) -> str:
+        """Get a response from the AI assistant based on the user's message and project context.
+
+        `prompt_context`, when given, is sent to the model in place of the
+        full `project_context`, which still keys the response cache.
+        """
+        prompt_context = prompt_context or project_context
         try:
             # Add project context to the query
-            context = project_context if project_context else "No specific project context available."
+            context = prompt_context if prompt_context else "No specific project context available."
+
+            cached, embedding = await self._cached_answer(user_id, project_id, user_message, project_context)
+            if cached is not None:
+                await self.memory.add_turn(user_id, project_id, user_message, cached)
+                return cached
             
             # Get response from conversation chain
-            response = self.conversation_chain({
-                "question": user_message,
-                "context": context
-            })
+            chain = await self.conversation_chain(collection_key(user_id, project_id))
+            async with self.limiter.slot():
+                response = await asyncio.wait_for(
+                    chain.acall(
+                        self._chain_inputs(user_id, project_id, user_message, context)
+                    ),
+                    timeout=self.llm_timeout
+                )
             
             # Store the conversation in memory
-            await self.add_to_memory(project_id, user_message, response["answer"])
+            self._cache_answer(user_id, project_id, user_message, project_context, embedding, response["answer"])
+            await self._remember(user_id, project_id, user_message, response["answer"])
             
             return response["answer"]
+        except asyncio.TimeoutError:
+            self.limiter.timeouts += 1
+            print(f"AI response timed out after {self.llm_timeout}s")
+            return self._fallback_response(prompt_context)
         except Exception as e:
             print(f"Error getting AI response: {str(e)}")
-            # If we have project context, return it without the error message
-            if project_context:
-                return project_context.strip()
-            return "I apologize, but I encountered an error processing your request. Please try again later."
+            return self._fallback_response(prompt_context)
+
+    @staticmethod
+    def _fallback_response(project_context: Optional[str]) -> str:
+        # If we have project context, return it without the error message
+        if project_context:
+            return project_context.strip()
+        return "I apologize, but I encountered an error processing your request. Please try again later."
+
+    async def stream_response(
+        self,
+        project_id: str,
+        user_message: str,
+        project_context: Optional[str] = None,
+        user_id: str = "anonymous",
+        prompt_context: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Like get_response, but yields the answer token by token as the LLM produces it.
+
+        The conversation is stored in memory once the answer is complete.
+        If the LLM fails or times out before the first token, the fallback
+        answer is yielded instead; after it, the error is raised, as the
+        answer already sent is cut off.
+        """
+        prompt_context = prompt_context or project_context
+        context = prompt_context if prompt_context else "No specific project context available."
+        cached, embedding = await self._cached_answer(user_id, project_id, user_message, project_context)
+        if cached is not None:
+            yield cached
+            await self.memory.add_turn(user_id, project_id, user_message, cached)
+            return
+
+        handler = TokenQueueHandler()
+        streamed = False
+        chain_call = None
+        try:
+            chain = await self.conversation_chain(collection_key(user_id, project_id))
+            async with self.limiter.slot():
+                deadline = time.monotonic() + self.llm_timeout
+                chain_call = asyncio.ensure_future(chain.acall(
+                    self._chain_inputs(user_id, project_id, user_message, context),
+                    callbacks=[handler]
+                ))
+                while True:
+                    next_token = asyncio.ensure_future(handler.queue.get())
+                    done, _ = await asyncio.wait(
+                        {next_token, chain_call},
+                        timeout=deadline - time.monotonic(),
+                        return_when=asyncio.FIRST_COMPLETED
+                    )
+                    if next_token not in done:
+                        next_token.cancel()
+                        if not done:
+                            self.limiter.timeouts += 1
+                            raise asyncio.TimeoutError(f"AI response timed out after {self.llm_timeout}s")
+                        break
+                    streamed = True
+                    yield next_token.result()
+                while not handler.queue.empty():
+                    streamed = True
+                    yield handler.queue.get_nowait()
+                response = chain_call.result()
+        except Exception as e:
+            print(f"Error streaming AI response: {str(e)}")
+            if streamed:
+                raise
+            yield self._fallback_response(prompt_context)
+            return
+        finally:
+            if chain_call is not None and not chain_call.done():
+                # Timed out, or the client went away mid-answer
+                chain_call.cancel()
+
+        if not streamed:
+            yield response["answer"]
+        self._cache_answer(user_id, project_id, user_message, project_context, embedding, response["answer"])
+        await self._remember(user_id, project_id, user_message, response["answer"])
 
     async def search_project_history(self, project_id: str, query: str, k: int = 5) -> List[Dict[str, Any]]:
         """Search through project history for relevant information."""
-        # Add project filter to query
         search_query = f"Project {project_id}: {query}"
-        
-        # Search vector store
-        results = self.vector_store.similarity_search_with_score(
-            search_query,
-            k=k,
-            filter={"project_id": project_id}
-        )
+
+        # Only the project's own collection is searched
+        async with self.limiter.slot():
+            results = await asyncio.to_thread(
+                self.collections.call,
+                project_id,
+                lambda store: store.similarity_search_with_score(search_query, k=k),
+                False
+            )
+        if results is None:
+            return []
         
         return [
             {
@@ -121,4 +466,10 @@ class AIService:
                 "metadata": doc.metadata
             }
             for doc, score in results
-        ] 
\ No newline at end of file
+        ]
+
+    def close(self):
+        """Write queued documents to disk."""
+        if self.is_openai_available:
+            self.ingestion.close()
+            self.embeddings.close()
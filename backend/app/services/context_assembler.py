@@ -0,0 +1,139 @@
+import logging
+import math
+import re
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+WORD = re.compile(r"\w+")
+
+# Tasks still open matter more to most questions than finished ones
+STATUS_WEIGHTS = {"IN_PROGRESS": 1.0, "TODO": 0.7, "DONE": 0.2}
+
+Embed = Callable[[str, List[str]], Awaitable[Optional[List[float]]]]
+
+
+def _load_encoding():
+    try:
+        import tiktoken
+
+        return tiktoken.encoding_for_model("gpt-4")
+    except Exception as e:
+        # tiktoken downloads its vocabulary on first use
+        logger.warning(f"Tokenizer unavailable, estimating token counts: {e}")
+        return None
+
+
+_encoding = None
+_encoding_loaded = False
+
+
+def count_tokens(text: str) -> int:
+    """Tokens `text` takes in a GPT-4 prompt, estimated when tiktoken is missing."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding = _load_encoding()
+        _encoding_loaded = True
+    if _encoding is None:
+        return len(text) // 4 + 1
+    return len(_encoding.encode(text))
+
+
+def _terms(text: str) -> List[str]:
+    return WORD.findall(text.lower())
+
+
+def task_text(task: dict) -> str:
+    description = task.get("description") or ""
+    return f"{task['title']}: {description}" if description else task["title"]
+
+
+class ContextAssembler:
+    """Builds a project's prompt context within a token budget.
+
+    Tasks are ranked for the question by a mix of BM25 over their titles
+    and descriptions, embedding similarity, how recently they were created
+    and their status, then listed best first until the budget is spent.
+    The context always ends with a count of tasks per status, so the model
+    still sees the shape of the whole project.
+
+    Embedding similarity is only computed for the `semantic_candidates`
+    best tasks by the other signals, through `embed(question, texts)`,
+    which returns the cosine similarity of each text to the question, or
+    None when embeddings are unavailable.
+    """
+
+    def __init__(self, token_budget: int = 1500, embed: Optional[Embed] = None, semantic_candidates: int = 100):
+        self.token_budget = token_budget
+        self.embed = embed
+        self.semantic_candidates = semantic_candidates
+
+    @staticmethod
+    def _bm25(question: str, tasks: List[dict], k1: float = 1.2, b: float = 0.75) -> List[float]:
+        query = set(_terms(question))
+        documents = [_terms(task_text(task)) for task in tasks]
+        if not query or not documents:
+            return [0.0] * len(tasks)
+        average_length = sum(len(d) for d in documents) / len(documents) or 1.0
+        frequencies = Counter(term for d in documents for term in set(d) if term in query)
+        idf = {
+            term: math.log(1 + (len(documents) - n + 0.5) / (n + 0.5))
+            for term, n in frequencies.items()
+        }
+        scores = []
+        for document in documents:
+            counts = Counter(t for t in document if t in idf)
+            norm = k1 * (1 - b + b * len(document) / average_length)
+            scores.append(sum(idf[t] * c * (k1 + 1) / (c + norm) for t, c in counts.items()))
+        return scores
+
+    async def _rank(self, question: str, tasks: List[dict]) -> List[dict]:
+        lexical = self._bm25(question, tasks)
+        top_lexical = max(lexical, default=0.0) or 1.0
+        by_age = sorted(range(len(tasks)), key=lambda i: tasks[i].get("created_at") or "")
+        recency = [0.0] * len(tasks)
+        for rank, i in enumerate(by_age):
+            recency[i] = (rank + 1) / len(tasks)
+        scores = [
+            0.5 * lexical[i] / top_lexical
+            + 0.15 * recency[i]
+            + 0.15 * STATUS_WEIGHTS.get(task.get("status"), 0.5)
+            for i, task in enumerate(tasks)
+        ]
+        order = sorted(range(len(tasks)), key=lambda i: scores[i], reverse=True)
+
+        if self.embed is not None and question.strip():
+            candidates = order[:self.semantic_candidates]
+            similarities = await self.embed(question, [task_text(tasks[i]) for i in candidates])
+            if similarities is not None:
+                for i, similarity in zip(candidates, similarities):
+                    scores[i] += 0.4 * max(similarity, 0.0)
+                order = sorted(candidates, key=lambda i: scores[i], reverse=True) + order[len(candidates):]
+        return [tasks[i] for i in order]
+
+    async def assemble(self, project: dict, tasks: List[dict], question: str) -> str:
+        histogram: Dict[str, int] = Counter(task.get("status") for task in tasks)
+        header = [
+            f"Project: {project['title']}",
+            f"Description: {project['description']}",
+            f"Created: {project['created_at']}",
+        ]
+        status_line = "Tasks by status: " + ", ".join(f"{s} {n}" for s, n in sorted(histogram.items()))
+        # Leave room for the listing line, whose count is only known at the end
+        used = sum(count_tokens(line) + 1 for line in header + [status_line]) + 16
+
+        listed = []
+        for task in await self._rank(question, tasks):
+            line = f"- {task['title']} ({task['status']})"
+            cost = count_tokens(line) + 1
+            if used + cost > self.token_budget:
+                break
+            listed.append(line)
+            used += cost
+
+        if len(listed) == len(tasks):
+            listing = f"Tasks ({len(tasks)}):"
+        else:
+            listing = f"Tasks ({len(tasks)}, showing the {len(listed)} most relevant):"
+        return "\n".join(header + [listing] + listed + [status_line])
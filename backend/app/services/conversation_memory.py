@@ -0,0 +1,236 @@
+import asyncio
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+from app.storage.journal import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+Turn = Tuple[str, str]
+
+# Project id conversations outside any project are kept under
+GENERAL = "general"
+Summarizer = Callable[[str, List[Turn]], Awaitable[str]]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count, about four characters per token for English text."""
+    return len(text) // 4 + 1
+
+
+def clip_to_tokens(text: str, tokens: int) -> str:
+    limit = tokens * 4
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+class Conversation:
+    def __init__(self, summary: str = "", turns: Optional[List[Turn]] = None):
+        self.summary = summary
+        self.turns: List[Turn] = turns or []
+        self.summarizing = False
+        # (inode, mtime) of the file this copy was read from or written to
+        self.stamp: Optional[Tuple[int, int]] = None
+
+    def tokens(self) -> int:
+        return estimate_tokens(self.summary) + sum(estimate_tokens(h) + estimate_tokens(a) for h, a in self.turns)
+
+    def to_dict(self) -> dict:
+        return {"summary": self.summary, "turns": [list(turn) for turn in self.turns]}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Conversation":
+        return cls(data.get("summary", ""), [tuple(turn) for turn in data.get("turns", [])])
+
+
+def _file_stamp(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns
+
+
+class ConversationMemory:
+    """Chat history kept separately for each (user, project) pair.
+
+    A conversation holds a running summary plus its most recent turns,
+    within `token_budget` tokens. Once the turns outgrow the budget, the
+    oldest ones are folded into the summary by `summarizer` until the rest
+    fit in half the budget, so summarizing happens every few turns rather
+    than on each one.
+
+    Conversations are stored as JSON files in `directory`, which worker
+    processes may share. Every change re-reads the file and writes it back
+    under a lock on that conversation, so turns added by different workers
+    are all kept. Up to `max_conversations` are also held in memory, and a
+    held copy is only used while its file is unchanged since this worker
+    read or wrote it. `add_turn` waits for the lock and writes the file in
+    a thread, so a conversation busy in another worker does not hold up
+    this worker's event loop.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        token_budget: int = 1500,
+        max_conversations: int = 256,
+        summarizer: Optional[Summarizer] = None,
+    ):
+        self.directory = directory
+        self.token_budget = token_budget
+        self.max_conversations = max_conversations
+        self.summarizer = summarizer
+        self._conversations: "OrderedDict[Tuple[str, str], Conversation]" = OrderedDict()
+        # Updates run in threads: one lock guards the held conversations,
+        # the other stands in for the lock files where there is no flock
+        self._held_lock = threading.Lock()
+        self._update_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: Tuple[str, str]) -> str:
+        digest = hashlib.sha1(json.dumps(key).encode()).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    @contextlib.contextmanager
+    def _locked(self, key: Tuple[str, str]):
+        """Hold the conversation's lock file, so one worker at a time changes it."""
+        if fcntl is None:
+            with self._update_lock:
+                yield
+            return
+        with open(self._path(key)[:-len(".json")] + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _read(self, key: Tuple[str, str]) -> Optional[Conversation]:
+        path = self._path(key)
+        stamp = _file_stamp(path)
+        if stamp is None:
+            return None
+        try:
+            with open(path, 'r') as f:
+                conversation = Conversation.from_dict(json.load(f))
+        except Exception as e:
+            logger.error(f"Error loading conversation from {path}: {e}")
+            return None
+        conversation.stamp = stamp
+        return conversation
+
+    def _cached(self, key: Tuple[str, str]) -> Optional[Conversation]:
+        """The held copy of the conversation, if no other worker has written it since."""
+        conversation = self._conversations.get(key)
+        if conversation is not None and conversation.stamp == _file_stamp(self._path(key)):
+            return conversation
+        return None
+
+    def _get(self, key: Tuple[str, str]) -> Conversation:
+        conversation = self._cached(key) or self._read(key) or Conversation()
+        with self._held_lock:
+            self._conversations[key] = conversation
+            self._conversations.move_to_end(key)
+            while len(self._conversations) > self.max_conversations:
+                self._conversations.popitem(last=False)
+        return conversation
+
+    def _save(self, key: Tuple[str, str], conversation: Conversation):
+        path = self._path(key)
+        try:
+            atomic_write_json(path, conversation.to_dict())
+            conversation.stamp = _file_stamp(path)
+        except OSError as e:
+            logger.error(f"Error saving conversation: {e}")
+
+    def _update(self, key: Tuple[str, str], change: Callable[[Conversation], None]) -> Conversation:
+        """Apply `change` to the current version of the conversation and write it."""
+        with self._locked(key):
+            conversation = self._get(key)
+            change(conversation)
+            self._save(key, conversation)
+        return conversation
+
+    def history(self, user_id: str, project_id: str) -> Tuple[str, List[Turn]]:
+        """Return (summary, recent turns) for the conversation."""
+        conversation = self._get((user_id, project_id))
+        return conversation.summary, list(conversation.turns)
+
+    async def add_turn(self, user_id: str, project_id: str, user_message: str, assistant_message: str):
+        key = (user_id, project_id)
+        # A single turn may use at most a quarter of the budget
+        turn_budget = self.token_budget // 8
+        turn = (clip_to_tokens(user_message, turn_budget), clip_to_tokens(assistant_message, turn_budget))
+        conversation = await asyncio.to_thread(self._update, key, lambda c: c.turns.append(turn))
+        if conversation.tokens() > self.token_budget and not conversation.summarizing:
+            await self._fold(key, conversation)
+
+    async def _fold(self, key: Tuple[str, str], conversation: Conversation):
+        # Keep the newest turns that fit in half the budget next to the summary
+        first_kept = len(conversation.turns)
+        kept_tokens = estimate_tokens(conversation.summary)
+        while first_kept > 1:
+            h, a = conversation.turns[first_kept - 1]
+            if kept_tokens + estimate_tokens(h) + estimate_tokens(a) > self.token_budget // 2:
+                break
+            kept_tokens += estimate_tokens(h) + estimate_tokens(a)
+            first_kept -= 1
+        # but always the latest one, even when the summary alone is large
+        folded = conversation.turns[:min(first_kept, len(conversation.turns) - 1)]
+        previous_summary = conversation.summary
+        if not folded:
+            summary = previous_summary
+        else:
+            conversation.summarizing = True
+            try:
+                summary = previous_summary
+                if self.summarizer is not None:
+                    summary = await self.summarizer(previous_summary, folded)
+            except Exception as e:
+                # Drop the old turns unsummarized rather than exceed the budget
+                logger.error(f"Error summarizing conversation: {e}")
+            finally:
+                conversation.summarizing = False
+
+        def apply(current: Conversation):
+            # Another worker may have folded these turns in the meantime
+            if current.summary != previous_summary or current.turns[:len(folded)] != folded:
+                return
+            current.summary = clip_to_tokens(summary, self.token_budget // 4)
+            del current.turns[:len(folded)]
+
+        await asyncio.to_thread(self._update, key, apply)
+
+    def peek(self, user_id: str, project_id: str) -> Optional[Conversation]:
+        """Return the conversation if there is one, without caching it in memory."""
+        key = (user_id, project_id)
+        return self._cached(key) or self._read(key)
+
+    def merge(self, user_id: str, project_id: str, summary: str, turns: List[Turn]):
+        """Add older history, as from a backup, in front of the conversation.
+
+        Turns the conversation already has are not added again, so
+        importing the same history twice leaves one copy. The next turn
+        folds the result back into the token budget.
+        """
+        def change(conversation: Conversation):
+            present = set(conversation.turns)
+            conversation.turns[:0] = [turn for turn in turns if turn not in present]
+            if summary and summary not in conversation.summary:
+                conversation.summary = f"{summary}\n{conversation.summary}" if conversation.summary else summary
+
+        self._update((user_id, project_id), change)
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_memory": len(self._conversations), "max_conversations": self.max_conversations}
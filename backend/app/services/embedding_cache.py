@@ -0,0 +1,95 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+from typing import Dict, List
+
+from langchain.schema.embeddings import Embeddings
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key TEXT PRIMARY KEY,
+    vector BLOB NOT NULL
+);
+"""
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that stores every vector in a local SQLite file.
+
+    Vectors are keyed by the model name plus a SHA-256 of the text, so the
+    same text is only ever sent to the API once per model, across restarts
+    and across the documents and queries that go through the vector store.
+    `hits` and `misses` count texts served from and added to the cache.
+    """
+
+    def __init__(self, underlying: Embeddings, path: str, model: str):
+        self.underlying = underlying
+        self.path = path
+        self.model = model
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(SCHEMA)
+
+    def _key(self, text: str) -> str:
+        return f"{self.model}:{hashlib.sha256(text.encode()).hexdigest()}"
+
+    def _lookup(self, texts: List[str]) -> Dict[str, List[float]]:
+        keys = {self._key(text): text for text in texts}
+        found = {}
+        with self._lock:
+            for key, text in keys.items():
+                row = self._conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    found[text] = array("d", row[0]).tolist()
+        return found
+
+    def _store(self, vectors: Dict[str, List[float]]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(self._key(text), array("d", vector).tobytes()) for text, vector in vectors.items()]
+            )
+
+    def _split(self, texts: List[str]):
+        found = self._lookup(texts)
+        missing = list(dict.fromkeys(t for t in texts if t not in found))
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        return found, missing
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        found, missing = self._split(texts)
+        if missing:
+            computed = dict(zip(missing, self.underlying.embed_documents(missing)))
+            self._store(computed)
+            found.update(computed)
+        return [found[text] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        found, missing = self._split(texts)
+        if missing:
+            computed = dict(zip(missing, await self.underlying.aembed_documents(missing)))
+            self._store(computed)
+            found.update(computed)
+        return [found[text] for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
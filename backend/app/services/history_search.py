@@ -0,0 +1,268 @@
+import asyncio
+import heapq
+import math
+import re
+from collections import Counter, OrderedDict, defaultdict
+from typing import Any, Dict, Hashable, List, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models import ChatHistory
+from app.services.ai_service import AIService, conversation_document
+
+WORD = re.compile(r"\w+")
+
+# Documents are stamped when queued but written with a later batch, possibly
+# by another worker, so syncs look back this far past the newest one seen
+INGEST_LOOKBACK_SECONDS = 300.0
+
+
+def terms(text: str) -> List[str]:
+    return WORD.findall(text.lower())
+
+
+class BM25Index:
+    """Inverted index scored with BM25, updated one document at a time.
+
+    `search` only visits the postings of the query's terms, so its cost
+    depends on how many documents contain them, not on the index size.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[Hashable, int]] = defaultdict(dict)
+        self._lengths: Dict[Hashable, int] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, key: Hashable, text: str):
+        if key in self._lengths:
+            raise ValueError(f"Document {key!r} is already indexed")
+        counts = Counter(terms(text))
+        for term, n in counts.items():
+            self._postings[term][key] = n
+        self._lengths[key] = sum(counts.values())
+        self._total_length += self._lengths[key]
+
+    def remove(self, key: Hashable, text: str):
+        """Remove a document, given the text it was added with."""
+        length = self._lengths.pop(key, None)
+        if length is None:
+            return
+        self._total_length -= length
+        for term in set(terms(text)):
+            postings = self._postings.get(term)
+            if postings is not None and postings.pop(key, None) is not None and not postings:
+                del self._postings[term]
+
+    def search(self, query: str, k: int) -> List[Tuple[Hashable, float, int]]:
+        """Best `k` documents for `query` as (key, score, number of query terms matched)."""
+        query_terms = set(terms(query))
+        if not query_terms or not self._lengths:
+            return []
+        count = len(self._lengths)
+        average_length = self._total_length / count or 1.0
+        scores: Dict[Hashable, float] = defaultdict(float)
+        matched: Counter = Counter()
+        for term in query_terms:
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for key, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[key] / average_length)
+                scores[key] += idf * tf * (self.k1 + 1) / (tf + norm)
+                matched[key] += 1
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(key, score, matched[key]) for key, score in best]
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Merge ranked lists, scoring each item by the sum of 1 / (k + rank) over the lists."""
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class _ProjectIndex:
+    __slots__ = ("index", "documents", "last_chat_id", "vector_count", "vector_ids", "vector_seen")
+
+    def __init__(self):
+        self.index = BM25Index()
+        # Key -> (text, metadata); chat rows are keyed ("chat", id) and
+        # vector store documents ("vector", id)
+        self.documents: Dict[Tuple[str, Any], Tuple[str, Dict[str, Any]]] = {}
+        self.last_chat_id = 0
+        self.vector_count = -1
+        self.vector_ids: Set[str] = set()
+        # Latest created_at among the indexed vector documents
+        self.vector_seen = 0.0
+
+    def add(self, key: Tuple[str, Any], text: str, metadata: Dict[str, Any]):
+        if key in self.documents:
+            self.remove(key)
+        self.documents[key] = (text, metadata)
+        self.index.add(key, text)
+        if key[0] == "vector":
+            self.vector_ids.add(key[1])
+            created_at = metadata.get("created_at")
+            if isinstance(created_at, (int, float)):
+                self.vector_seen = max(self.vector_seen, created_at)
+
+    def remove(self, key: Tuple[str, Any]):
+        document = self.documents.pop(key, None)
+        if document is None:
+            return
+        self.index.remove(key, document[0])
+        if key[0] == "vector":
+            self.vector_ids.discard(key[1])
+
+
+class HistorySearch:
+    """Hybrid lexical and semantic search over each project's chat history.
+
+    A project's BM25 index covers its ChatHistory rows and the documents in
+    its vector store collection. Before each search it catches up with rows
+    added since the highest id it has seen and, when the collection's
+    document count changed, with documents stamped since the newest one it
+    has indexed, so it stays current with writes made by other workers. The
+    collection's ids are only compared in full when that does not account
+    for the count, as after maintenance deleted documents.
+
+    Lexical and vector results are merged with reciprocal rank fusion.
+    Queries whose terms all occur together in at least `k` documents, such
+    as exact task names, are answered from the index alone, without an
+    embedding call. At most `max_projects` indexes are kept, evicting the
+    least recently used.
+    """
+
+    def __init__(self, ai_service: AIService, max_projects: int = 256, candidates: int = 20):
+        self.ai_service = ai_service
+        self.max_projects = max_projects
+        self.candidates = candidates
+        self.lexical_only = 0
+        self.hybrid = 0
+        self._projects: "OrderedDict[int, _ProjectIndex]" = OrderedDict()
+
+    def _project(self, project_id: int) -> _ProjectIndex:
+        project = self._projects.get(project_id)
+        if project is None:
+            project = self._projects[project_id] = _ProjectIndex()
+            while len(self._projects) > self.max_projects:
+                self._projects.popitem(last=False)
+        else:
+            self._projects.move_to_end(project_id)
+        return project
+
+    def add_chat(self, row: ChatHistory):
+        """Index a chat row as soon as it is committed."""
+        project = self._projects.get(row.project_id)
+        if project is not None and row.id > project.last_chat_id:
+            self._add_row(project, row)
+
+    @staticmethod
+    def _add_row(project: _ProjectIndex, row: ChatHistory):
+        text = conversation_document(str(row.project_id), row.user_message, row.assistant_message)
+        metadata = {
+            "project_id": str(row.project_id),
+            "type": "conversation",
+            "chat_id": row.id,
+            "created_at": row.created_at.isoformat() if row.created_at else None,
+        }
+        project.add(("chat", row.id), text, metadata)
+        project.last_chat_id = max(project.last_chat_id, row.id)
+
+    def _vector_changes(self, project_id: str, known_count: int, indexed: Set[str], seen: float):
+        """(document count, documents added, ids removed) since the last sync.
+
+        Runs in a worker thread, since every call goes to Chroma.
+        """
+        collections = self.ai_service.collections
+        count = collections.count(project_id)
+        if count == known_count:
+            return count, {}, set()
+        added = {}
+        if known_count >= 0:
+            since = collections.documents_since(project_id, seen - INGEST_LOOKBACK_SECONDS)
+            added = {doc_id: document for doc_id, document in since.items() if doc_id not in indexed}
+            if len(indexed) + len(added) == count:
+                return count, added, set()
+        # First sync, deletes, or documents written too late for the look-back
+        current = set(collections.ids(project_id))
+        missing = current - indexed - set(added)
+        added.update(collections.documents(project_id, list(missing)))
+        return count, added, indexed - current
+
+    async def _sync(self, db: Session, project_id: int) -> _ProjectIndex:
+        project = self._project(project_id)
+        rows = db.query(ChatHistory).filter(
+            ChatHistory.project_id == project_id,
+            ChatHistory.id > project.last_chat_id
+        ).order_by(ChatHistory.id).all()
+        for row in rows:
+            self._add_row(project, row)
+
+        if self.ai_service.is_openai_available:
+            count, added, removed = await asyncio.to_thread(
+                self._vector_changes, str(project_id), project.vector_count, set(project.vector_ids), project.vector_seen
+            )
+            for doc_id in removed:
+                project.remove(("vector", doc_id))
+            for doc_id, (text, metadata) in added.items():
+                project.add(("vector", doc_id), text, metadata)
+            project.vector_count = count
+        return project
+
+    async def search(self, db: Session, project_id: int, query: str, k: int = 5, mode: str = "auto") -> List[Dict[str, Any]]:
+        """Search a project's chat history.
+
+        `mode` is "lexical", "semantic", "hybrid", or "auto", which is
+        lexical when the query's terms all appear together in at least `k`
+        documents and hybrid otherwise.
+        """
+        project = await self._sync(db, project_id)
+        lexical = project.index.search(query, max(k, self.candidates))
+        # The same turn is usually both a chat row and a vector document
+        texts: Dict[str, Dict[str, Any]] = {}
+        lexical_ranking: List[str] = []
+        for key, _, _ in lexical:
+            text, metadata = project.documents[key]
+            if text not in texts:
+                texts[text] = metadata
+                lexical_ranking.append(text)
+
+        if mode == "auto":
+            query_terms = len(set(terms(query)))
+            exact = sum(1 for _, _, matched in lexical if matched == query_terms)
+            use_vectors = exact < k
+        else:
+            use_vectors = mode in ("semantic", "hybrid")
+        use_vectors = use_vectors and self.ai_service.is_openai_available
+
+        rankings = [] if mode == "semantic" else [lexical_ranking]
+        if use_vectors:
+            self.hybrid += 1
+            semantic = await self.ai_service.search_project_history(str(project_id), query, k=max(k, self.candidates))
+            rankings.append([result["content"] for result in semantic])
+            for result in semantic:
+                texts.setdefault(result["content"], result["metadata"])
+        else:
+            self.lexical_only += 1
+
+        return [
+            {"content": text, "score": score, "metadata": texts[text]}
+            for text, score in reciprocal_rank_fusion(rankings)[:k]
+        ]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "projects": len(self._projects),
+            "documents": sum(len(p.documents) for p in self._projects.values()),
+            "lexical_only": self.lexical_only,
+            "hybrid": self.hybrid,
+        }
@@ -0,0 +1,154 @@
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+Pending = Tuple[str, str, Dict[str, Any]]
+
+
+class IngestionQueue:
+    """Adds documents to the vector store in batches from a background thread.
+
+    `enqueue` only appends to a list, so callers on the request path never
+    wait for embedding or disk writes. The writer thread passes pending
+    documents to `write(ids, texts, metadatas)` in one call, so they can
+    be embedded as a single batch. A batch is written once `batch_size`
+    documents are pending, or `interval` seconds after the first of them
+    was queued.
+
+    Each document has its id from when it was queued, so a batch that fails stays
+    queued and is retried with the next one without duplicating the
+    documents that did get written. At most `max_pending` documents are
+    held; past that the oldest are dropped. `close()` stops the thread and
+    writes whatever is left.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[List[str], List[str], List[Dict[str, Any]]], None],
+        batch_size: int = 32,
+        interval: float = 2.0,
+        max_pending: int = 10000
+    ):
+        self.write = write
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_pending = max_pending
+        self.batches = 0
+        self.written = 0
+        self.failures = 0
+        self.dropped = 0
+        self._pending: List[Pending] = []
+        self._first_queued_at: Optional[float] = None
+        self._cond = threading.Condition()
+        # Held while a batch is being written, so flush() can wait for it
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="vector-ingestion", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, text: str, metadata: Dict[str, Any], doc_id: Optional[str] = None):
+        """Queue a document; one with the id of an existing document replaces it."""
+        with self._cond:
+            if not self._pending:
+                # Start the writer's interval timer
+                self._first_queued_at = time.monotonic()
+                self._cond.notify()
+            self._pending.append((doc_id or uuid.uuid4().hex, text, metadata))
+            overflow = len(self._pending) - self.max_pending
+            if overflow > 0:
+                del self._pending[:overflow]
+                self.dropped += overflow
+                logger.warning(f"Vector ingestion queue full, dropped {overflow} documents")
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+
+    def _take_batch(self) -> List[Pending]:
+        batch = self._pending[:self.batch_size]
+        del self._pending[:len(batch)]
+        self._first_queued_at = time.monotonic() if self._pending else None
+        return batch
+
+    def _write(self, batch: List[Pending]) -> bool:
+        try:
+            self.write(
+                [doc_id for doc_id, _, _ in batch],
+                [text for _, text, _ in batch],
+                [metadata for _, _, metadata in batch]
+            )
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Error writing {len(batch)} documents to the vector store: {e}")
+            with self._cond:
+                self._pending[:0] = batch
+                if self._first_queued_at is None:
+                    self._first_queued_at = time.monotonic()
+            return False
+        self.batches += 1
+        self.written += len(batch)
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if len(self._pending) >= self.batch_size:
+                        break
+                    if self._first_queued_at is not None:
+                        remaining = self._first_queued_at + self.interval - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    else:
+                        self._cond.wait()
+                if self._closed:
+                    return
+                batch = self._take_batch()
+            with self._write_lock:
+                written = self._write(batch)
+            if not written:
+                # Back off before retrying a failed batch
+                time.sleep(self.interval)
+
+    def flush(self):
+        """Write every pending document now, on the calling thread."""
+        with self._write_lock:
+            while True:
+                with self._cond:
+                    if not self._pending:
+                        return
+                    batch = self._take_batch()
+                if not self._write(batch):
+                    return
+
+    def discard(self, predicate: Callable[[Dict[str, Any]], bool]) -> int:
+        """Drop pending documents whose metadata matches, once any batch in flight is written."""
+        with self._write_lock, self._cond:
+            kept = [doc for doc in self._pending if not predicate(doc[2])]
+            removed = len(self._pending) - len(kept)
+            self._pending[:] = kept
+            if not kept:
+                self._first_queued_at = None
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "batches": self.batches,
+            "written": self.written,
+            "failures": self.failures,
+            "dropped": self.dropped,
+        }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self.flush()
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from passlib.context import CryptContext
+
+logger = logging.getLogger(__name__)
+
+
+class HasherBusyError(RuntimeError):
+    """Too many hash/verify calls are already waiting for a worker."""
+
+
+class PasswordHasher:
+    """Runs password hashing and verification on a bounded thread pool.
+
+    bcrypt releases the GIL while it works, so `max_workers` threads use
+    that many cores and the event loop stays free for other requests. At
+    most `max_queue` calls may wait for a worker; beyond that callers get
+    HasherBusyError instead of piling up. `stats()` reports queue depth
+    and wait times.
+    """
+
+    def __init__(self, context: CryptContext, max_workers: int, max_queue: int):
+        self.context = context
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hasher")
+        self._stats_lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._total_run = 0.0
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(self.context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._submit(self.context.verify, password, hashed_password)
+
+    async def _submit(self, fn: Callable[..., Any], *args) -> Any:
+        with self._stats_lock:
+            if self._queued >= self.max_queue:
+                self._rejected += 1
+                raise HasherBusyError(f"{self._queued} password checks already queued")
+            self._queued += 1
+        try:
+            future = self._executor.submit(self._run, time.monotonic(), fn, args)
+        except BaseException:
+            self._dequeue()
+            raise
+        # A call cancelled while still queued never reaches _run, which
+        # otherwise gives up its place in the queue
+        future.add_done_callback(lambda f: f.cancelled() and self._dequeue())
+        return await asyncio.wrap_future(future)
+
+    def _dequeue(self):
+        with self._stats_lock:
+            self._queued -= 1
+
+    def _run(self, submitted: float, fn: Callable[..., Any], args) -> Any:
+        started = time.monotonic()
+        wait = started - submitted
+        with self._stats_lock:
+            self._queued -= 1
+            self._running += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+        try:
+            return fn(*args)
+        finally:
+            with self._stats_lock:
+                self._running -= 1
+                self._completed += 1
+                self._total_run += time.monotonic() - started
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            completed = self._completed or 1
+            return {
+                "workers": self.max_workers,
+                "queued": self._queued,
+                "running": self._running,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "avg_wait_ms": round(self._total_wait / completed * 1000, 2),
+                "max_wait_ms": round(self._max_wait * 1000, 2),
+                "avg_run_ms": round(self._total_run / completed * 1000, 2),
+            }
+
+    def close(self):
+        self._executor.shutdown(wait=False)
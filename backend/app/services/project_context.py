@@ -0,0 +1,101 @@
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from app.storage.base import Storage
+
+PROJECT_FIELDS = ("title", "description", "created_at")
+
+
+def task_line(task: dict) -> str:
+    return f"- {task['title']} ({task['status']})"
+
+
+class _Entry:
+    __slots__ = ("header", "version", "lines", "text", "tokens")
+
+    def __init__(self):
+        self.header: Optional[Tuple] = None
+        self.version: Optional[str] = None
+        # Task id -> (title, status, rendered line), in task order
+        self.lines: Dict[int, Tuple[str, str, str]] = {}
+        self.text = ""
+        # Token count of `text`, once something asked for it
+        self.tokens: Optional[int] = None
+
+
+class ProjectContextCache:
+    """Chat context text per project, kept until the project or its tasks change.
+
+    Each entry records the store's task-list version for the project, which
+    the store updates on every task write, including writes by other
+    workers. While the version and the project's own fields are unchanged,
+    `get` returns the stored text without reading any tasks. After a change
+    the text is reassembled, and only the lines of tasks whose title or
+    status changed are rendered again.
+
+    The text's token count is kept with it, so it is counted once per
+    version rather than on every chat message.
+
+    At most `max_projects` entries are kept, evicting the least recently
+    used.
+    """
+
+    def __init__(self, max_projects: int = 1024):
+        self.max_projects = max_projects
+        self.hits = 0
+        self.rebuilds = 0
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+
+    def get(self, store: Storage, project: dict) -> str:
+        return self._entry(store, project).text
+
+    def token_count(self, store: Storage, project: dict, count: Callable[[str], int]) -> int:
+        """Tokens in the project's context text, as counted by `count`."""
+        entry = self._entry(store, project)
+        if entry.tokens is None:
+            entry.tokens = count(entry.text)
+        return entry.tokens
+
+    def _entry(self, store: Storage, project: dict) -> _Entry:
+        project_id = project["id"]
+        entry = self._entries.get(project_id)
+        if entry is None:
+            entry = self._entries[project_id] = _Entry()
+            while len(self._entries) > self.max_projects:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(project_id)
+
+        header = tuple(project.get(field) for field in PROJECT_FIELDS)
+        version, _ = store.task_list_version(project_id)
+        if entry.version == version and entry.header == header:
+            self.hits += 1
+            return entry
+
+        lines = {}
+        for task in store.list_tasks(project_id):
+            cached = entry.lines.get(task["id"])
+            if cached is not None and cached[0] == task["title"] and cached[1] == task["status"]:
+                lines[task["id"]] = cached
+            else:
+                lines[task["id"]] = (task["title"], task["status"], task_line(task))
+        title, description, created_at = header
+        entry.text = "\n".join([
+            f"Project: {title}",
+            f"Description: {description}",
+            f"Created: {created_at}",
+            f"Tasks ({len(lines)}):",
+            *(line for _, _, line in lines.values()),
+        ])
+        entry.lines = lines
+        entry.header = header
+        entry.version = version
+        entry.tokens = None
+        self.rebuilds += 1
+        return entry
+
+    def discard(self, project_id: int):
+        self._entries.pop(project_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {"projects": len(self._entries), "hits": self.hits, "rebuilds": self.rebuilds}
@@ -0,0 +1,117 @@
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+from app.storage.base import Storage
+
+
+def normalize_title(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class _Node:
+    __slots__ = ("children", "project_ids")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.project_ids: Set[int] = set()
+
+
+class TitleTrie:
+    """Trie of normalized project titles for finding mentions in a message.
+
+    `longest_match` walks the trie from every position of the message, so
+    its cost depends on the message and the longest title, not on how many
+    titles there are. Titles can be added and removed one at a time.
+    """
+
+    def __init__(self):
+        self._root = _Node()
+        self.titles: Dict[int, str] = {}
+
+    def add(self, project_id: int, title: str):
+        title = normalize_title(title)
+        if not title:
+            return
+        node = self._root
+        for char in title:
+            node = node.children.setdefault(char, _Node())
+        node.project_ids.add(project_id)
+        self.titles[project_id] = title
+
+    def remove(self, project_id: int):
+        title = self.titles.pop(project_id, None)
+        if title is None:
+            return
+        path = [self._root]
+        for char in title:
+            path.append(path[-1].children[char])
+        path[-1].project_ids.discard(project_id)
+        # Prune nodes that no longer lead to any title
+        for depth in range(len(title), 0, -1):
+            node = path[depth]
+            if node.children or node.project_ids:
+                break
+            del path[depth - 1].children[title[depth - 1]]
+
+    def longest_match(self, message: str) -> Optional[int]:
+        """Id of the longest title found in `message`, the earliest one on ties.
+
+        Projects sharing that title resolve to the oldest one.
+        """
+        text = normalize_title(message)
+        best: Optional[Tuple[int, int]] = None
+        for start in range(len(text)):
+            node = self._root
+            for end in range(start, len(text)):
+                node = node.children.get(text[end])
+                if node is None:
+                    break
+                length = end - start + 1
+                if node.project_ids and (best is None or length > best[0]):
+                    best = (length, min(node.project_ids))
+        return best[1] if best else None
+
+
+class ProjectMatcher:
+    """Per-user title tries, kept in step with each user's project list.
+
+    A user's trie is compared with the store's project-list version on
+    each lookup. When the version moved, for example because a project
+    was created, renamed or deleted by this or another worker, only the
+    titles that changed are added to or removed from the trie. At most
+    `max_users` tries are kept, evicting the least recently used.
+    """
+
+    def __init__(self, max_users: int = 1024):
+        self.max_users = max_users
+        self._tries: "OrderedDict[str, Tuple[str, TitleTrie]]" = OrderedDict()
+
+    def _trie(self, store: Storage, owner_email: str) -> TitleTrie:
+        version, _ = store.project_list_version(owner_email)
+        cached = self._tries.get(owner_email)
+        if cached is not None:
+            self._tries.move_to_end(owner_email)
+            if cached[0] == version:
+                return cached[1]
+            trie = cached[1]
+        else:
+            trie = TitleTrie()
+
+        projects = {p["id"]: normalize_title(p["title"]) for p in store.list_projects(owner_email)}
+        for project_id in [pid for pid, title in trie.titles.items() if projects.get(pid) != title]:
+            trie.remove(project_id)
+        for project_id, title in projects.items():
+            if project_id not in trie.titles:
+                trie.add(project_id, title)
+
+        self._tries[owner_email] = (version, trie)
+        while len(self._tries) > self.max_users:
+            self._tries.popitem(last=False)
+        return trie
+
+    def find(self, store: Storage, owner_email: str, message: str) -> Optional[dict]:
+        """Return the user's project whose title is the longest match in `message`."""
+        project_id = self._trie(store, owner_email).longest_match(message)
+        if project_id is None:
+            return None
+        return store.get_project(project_id, owner_email)
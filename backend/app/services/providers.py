@@ -0,0 +1,154 @@
+import asyncio
+import hashlib
+import math
+import os
+import re
+import time
+from typing import Any, Iterator, List, NamedTuple, Optional
+
+from langchain.callbacks.manager import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain.chat_models import ChatOpenAI
+from langchain.chat_models.base import BaseChatModel
+from langchain.embeddings import OpenAIEmbeddings
+from langchain.schema import AIMessage, BaseMessage, ChatGeneration, ChatResult
+from langchain.schema.embeddings import Embeddings
+
+WORD = re.compile(r"\w+")
+
+
+class Models(NamedTuple):
+    embeddings: Embeddings
+    # Name the embedding cache keys vectors by
+    embedding_model: str
+    llm: BaseChatModel
+    streaming_llm: BaseChatModel
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic stand-in embeddings computed locally from word hashes.
+
+    Each word adds +1 or -1 to a few dimensions chosen by its hash, and the
+    sum is normalized, so texts sharing words get similar vectors, which
+    keeps the response cache and history search meaningful offline.
+    """
+
+    def __init__(self, size: int = 1536):
+        self.size = size
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.size
+        for word in WORD.findall(text.lower()):
+            digest = hashlib.blake2b(word.encode(), digest_size=12).digest()
+            for i in range(0, 12, 4):
+                index = int.from_bytes(digest[i:i + 3], "big") % self.size
+                vector[index] += 1.0 if digest[i + 3] & 1 else -1.0
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class StandInChatModel(BaseChatModel):
+    """Chat model that answers locally with a deterministic canned reply.
+
+    The reply is `response_tokens` words picked from the prompt by its
+    hash. It starts after `latency` seconds and is then produced at
+    `tokens_per_second`, token by token through the callbacks when
+    `streaming` is set, so timings resemble a real completion.
+    """
+
+    latency: float = 0.5
+    tokens_per_second: float = 30.0
+    response_tokens: int = 60
+    streaming: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "stand-in-chat"
+
+    def _tokens(self, messages: List[BaseMessage]) -> List[str]:
+        prompt = "\n".join(str(m.content) for m in messages)
+        words = WORD.findall(prompt) or ["ok"]
+        seed = int.from_bytes(hashlib.blake2b(prompt.encode(), digest_size=8).digest(), "big")
+        return [
+            ("" if i == 0 else " ") + words[(seed + i * 7919) % len(words)]
+            for i in range(self.response_tokens)
+        ]
+
+    def _result(self, tokens: List[str]) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    def _paced(self, tokens: List[str]) -> Iterator[tuple]:
+        """Yield (delay before token, token)."""
+        interval = 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        for i, token in enumerate(tokens):
+            yield (self.latency if i == 0 else interval), token
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        tokens = self._tokens(messages)
+        for delay, token in self._paced(tokens):
+            time.sleep(delay)
+            if self.streaming and run_manager:
+                run_manager.on_llm_new_token(token)
+        return self._result(tokens)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        tokens = self._tokens(messages)
+        for delay, token in self._paced(tokens):
+            await asyncio.sleep(delay)
+            if self.streaming and run_manager:
+                await run_manager.on_llm_new_token(token)
+        return self._result(tokens)
+
+
+def create_models(provider: str, timeout: float) -> Models:
+    """Build the models for AI_PROVIDER: "openai", or "offline" for local stand-ins."""
+    if provider == "openai":
+        openai_api_key = os.getenv("OPENAI_API_KEY")
+        if not openai_api_key:
+            raise ValueError("OPENAI_API_KEY environment variable is not set")
+        embeddings = OpenAIEmbeddings(openai_api_key=openai_api_key)
+        llm = ChatOpenAI(
+            openai_api_key=openai_api_key,
+            model_name="gpt-4",
+            temperature=0.7,
+            request_timeout=timeout
+        )
+        streaming_llm = ChatOpenAI(
+            openai_api_key=openai_api_key,
+            model_name="gpt-4",
+            temperature=0.7,
+            request_timeout=timeout,
+            streaming=True
+        )
+        return Models(embeddings, embeddings.model, llm, streaming_llm)
+    if provider == "offline":
+        size = int(os.getenv("OFFLINE_EMBEDDING_SIZE", "1536"))
+        settings = dict(
+            latency=int(os.getenv("OFFLINE_LLM_LATENCY_MS", "500")) / 1000,
+            tokens_per_second=float(os.getenv("OFFLINE_LLM_TOKENS_PER_SECOND", "30")),
+            response_tokens=int(os.getenv("OFFLINE_LLM_RESPONSE_TOKENS", "60")),
+        )
+        return Models(
+            HashEmbeddings(size),
+            f"stand-in-hash-{size}",
+            StandInChatModel(**settings),
+            StandInChatModel(streaming=True, **settings),
+        )
+    raise ValueError(f"Unknown AI_PROVIDER: {provider}")
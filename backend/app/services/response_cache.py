@@ -0,0 +1,126 @@
+import hashlib
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, NamedTuple, Optional, Set, Tuple
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(question.lower().split())
+
+
+def unit_vector(vector: List[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+class CachedAnswer(NamedTuple):
+    embedding: Optional[List[float]]
+    answer: str
+    expires_at: float
+
+
+class ResponseCache:
+    """Answers reused for repeated questions about an unchanged project.
+
+    Entries are grouped by scope, a (user, project) pair, and remember the
+    hash of the project context they were answered from. A lookup with a
+    different context hash means the project's tasks changed, and drops
+    every entry in that scope. A question matches an entry when its
+    normalized text is identical, or when the cosine similarity of the
+    question embeddings reaches `threshold`.
+
+    Entries expire after `ttl` seconds, and at most `max_entries` are kept,
+    evicting the least recently used.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 600.0, threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[Hashable, str], CachedAnswer]" = OrderedDict()
+        self._scopes: Dict[Hashable, Tuple[str, Set[str]]] = {}
+
+    @staticmethod
+    def context_hash(context: str) -> str:
+        return hashlib.blake2b(context.encode(), digest_size=16).hexdigest()
+
+    def _questions(self, scope: Hashable, context: str) -> Set[str]:
+        """Questions cached for `scope`, after dropping them if the context changed."""
+        digest = self.context_hash(context)
+        current = self._scopes.get(scope)
+        if current is not None and current[0] == digest:
+            return current[1]
+        self.invalidate(scope)
+        questions: Set[str] = set()
+        self._scopes[scope] = (digest, questions)
+        return questions
+
+    def _hit(self, key: Tuple[Hashable, str], now: float) -> Optional[str]:
+        entry = self._entries[key]
+        if entry.expires_at <= now:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.answer
+
+    def lookup(self, scope: Hashable, context: str, question: str) -> Optional[str]:
+        """Answer cached for exactly this question, ignoring case and spacing."""
+        question = normalize_question(question)
+        if question in self._questions(scope, context):
+            answer = self._hit((scope, question), time.time())
+            if answer is not None:
+                return answer
+        return None
+
+    def lookup_similar(self, scope: Hashable, context: str, embedding: List[float]) -> Optional[str]:
+        """Answer cached for the most similar question above the threshold."""
+        embedding = unit_vector(embedding)
+        best_key, best_score = None, self.threshold
+        for question in self._questions(scope, context):
+            cached = self._entries[(scope, question)].embedding
+            if cached is None:
+                continue
+            score = sum(a * b for a, b in zip(embedding, cached))
+            if score >= best_score:
+                best_key, best_score = (scope, question), score
+        if best_key is not None:
+            answer = self._hit(best_key, time.time())
+            if answer is not None:
+                return answer
+        self.misses += 1
+        return None
+
+    def put(self, scope: Hashable, context: str, question: str, embedding: Optional[List[float]], answer: str):
+        question = normalize_question(question)
+        self._questions(scope, context).add(question)
+        key = (scope, question)
+        self._entries[key] = CachedAnswer(
+            unit_vector(embedding) if embedding is not None else None,
+            answer,
+            time.time() + self.ttl
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: Tuple[Hashable, str]):
+        scope, question = key
+        self._entries.pop(key, None)
+        current = self._scopes.get(scope)
+        if current is not None:
+            current[1].discard(question)
+            if not current[1]:
+                del self._scopes[scope]
+
+    def invalidate(self, scope: Hashable):
+        current = self._scopes.pop(scope, None)
+        if current is not None:
+            for question in current[1]:
+                self._entries.pop((scope, question), None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,220 @@
+import heapq
+import re
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.storage.base import Storage
+
+WORD = re.compile(r"\w+")
+
+Key = Tuple[str, int]
+
+# Shorter last words only match whole words; one letter would match most of the index
+MIN_PREFIX = 2
+
+
+def terms(text: str) -> List[str]:
+    return WORD.findall(text.lower())
+
+
+class _Document:
+    __slots__ = ("title", "status", "project_id", "fingerprint", "terms")
+
+    def __init__(self, title: str, status: Optional[str], project_id: int, fingerprint: tuple, terms: Set[str]):
+        self.title = title
+        self.status = status
+        self.project_id = project_id
+        self.fingerprint = fingerprint
+        self.terms = terms
+
+
+class _Postings:
+    __slots__ = ("anywhere", "in_title")
+
+    def __init__(self):
+        self.anywhere: Set[Key] = set()
+        self.in_title: Set[Key] = set()
+
+
+class _OwnerIndex:
+    """Inverted index over one owner's projects and tasks."""
+
+    def __init__(self):
+        self.version: Optional[str] = None
+        # Project id -> task-list version the project's tasks are indexed at
+        self.task_versions: Dict[int, Optional[str]] = {}
+        self.tasks_by_project: Dict[int, Set[int]] = {}
+        self.documents: Dict[Key, _Document] = {}
+        self.postings: Dict[str, _Postings] = {}
+        # Sorted terms for prefix lookups. Terms added since the last lookup
+        # are sorted in when the next one happens; removed terms stay until
+        # they make up half the list, and are skipped meanwhile.
+        self.vocabulary: List[str] = []
+        self.new_terms: List[str] = []
+        self.removed_terms = 0
+
+    def _sorted_vocabulary(self) -> List[str]:
+        if self.removed_terms > len(self.vocabulary) // 2:
+            self.vocabulary = sorted(self.postings)
+            self.new_terms = []
+            self.removed_terms = 0
+        elif self.new_terms:
+            # Nearly sorted already, which list.sort handles in linear time
+            self.vocabulary += self.new_terms
+            self.vocabulary.sort()
+            self.new_terms = []
+        return self.vocabulary
+
+    def put(self, key: Key, title: str, description: Optional[str], status: Optional[str], project_id: int):
+        fingerprint = (title, description, status)
+        current = self.documents.get(key)
+        if current is not None:
+            if current.fingerprint == fingerprint:
+                return
+            self.remove(key)
+        title_terms = set(terms(title))
+        all_terms = title_terms.union(terms(description or ""))
+        self.documents[key] = _Document(title, status, project_id, fingerprint, all_terms)
+        for term in all_terms:
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = _Postings()
+                self.new_terms.append(term)
+            postings.anywhere.add(key)
+            if term in title_terms:
+                postings.in_title.add(key)
+
+    def remove(self, key: Key):
+        document = self.documents.pop(key, None)
+        if document is None:
+            return
+        for term in document.terms:
+            postings = self.postings[term]
+            postings.anywhere.discard(key)
+            postings.in_title.discard(key)
+            if not postings.anywhere:
+                del self.postings[term]
+                self.removed_terms += 1
+
+    def matching(self, word: str, prefix: bool = False) -> Tuple[Set[Key], Set[Key]]:
+        """(documents containing `word`, those with it in the title).
+
+        With `prefix`, any term starting with `word` matches.
+        """
+        if not prefix:
+            postings = self.postings.get(word)
+            return (postings.anywhere, postings.in_title) if postings else (set(), set())
+        vocabulary = self._sorted_vocabulary()
+        start = bisect_left(vocabulary, word)
+        # A term removed and added again is listed twice
+        candidates = set(vocabulary[start:bisect_left(vocabulary, word + "\uffff")])
+        found = [self.postings[t] for t in candidates if t in self.postings]
+        if len(found) == 1:
+            return found[0].anywhere, found[0].in_title
+        return set().union(*(p.anywhere for p in found)), set().union(*(p.in_title for p in found))
+
+
+class SearchIndex:
+    """Full-text search over each user's projects and tasks.
+
+    Every word of a query must appear in a result's title or description;
+    the last word also matches longer words it is a prefix of, once it is
+    `MIN_PREFIX` characters long, so results follow the query as it is
+    typed. Results are ranked by where the words
+    matched, titles counting double.
+
+    A user's index is brought up to date before each search using the
+    store's versions, so creates, edits and deletes made by any worker are
+    reflected. Only projects whose version moved are read again, and only
+    documents whose title, description or status changed are re-indexed.
+    At most `max_users` indexes are kept, evicting the least recently used.
+    """
+
+    def __init__(self, max_users: int = 256):
+        self.max_users = max_users
+        self._owners: "OrderedDict[str, _OwnerIndex]" = OrderedDict()
+
+    def _sync(self, store: Storage, owner_email: str) -> _OwnerIndex:
+        index = self._owners.get(owner_email)
+        if index is None:
+            index = self._owners[owner_email] = _OwnerIndex()
+            while len(self._owners) > self.max_users:
+                self._owners.popitem(last=False)
+        else:
+            self._owners.move_to_end(owner_email)
+
+        version, _ = store.project_list_version(owner_email)
+        if index.version != version:
+            projects = {p["id"]: p for p in store.list_projects(owner_email)}
+            for project_id in [pid for pid in index.task_versions if pid not in projects]:
+                for task_id in index.tasks_by_project.pop(project_id, ()):
+                    index.remove(("task", task_id))
+                index.remove(("project", project_id))
+                del index.task_versions[project_id]
+            for project_id, project in projects.items():
+                index.put(("project", project_id), project["title"], project.get("description"), None, project_id)
+                index.task_versions.setdefault(project_id, None)
+            index.version = version
+
+        for project_id, indexed_version in index.task_versions.items():
+            version, _ = store.task_list_version(project_id)
+            if version == indexed_version:
+                continue
+            tasks = store.list_tasks(project_id)
+            task_ids = {task["id"] for task in tasks}
+            for task_id in index.tasks_by_project.get(project_id, set()) - task_ids:
+                index.remove(("task", task_id))
+            for task in tasks:
+                index.put(("task", task["id"]), task["title"], task.get("description"), task.get("status"), project_id)
+            index.tasks_by_project[project_id] = task_ids
+            index.task_versions[project_id] = version
+        return index
+
+    def search(self, store: Storage, owner_email: str, query: str, limit: int = 20) -> List[dict]:
+        words = terms(query)
+        if not words:
+            return []
+        index = self._sync(store, owner_email)
+
+        # The last word may still be being typed
+        words = list(dict.fromkeys(words))
+        matches = [
+            index.matching(word, prefix=i == len(words) - 1 and len(word) >= MIN_PREFIX)
+            for i, word in enumerate(words)
+        ]
+        matches.sort(key=lambda match: len(match[0]))
+        found = matches[0][0].intersection(*(anywhere for anywhere, _ in matches[1:]))
+        if not found:
+            return []
+
+        # A word counts double when it is in the title. Results with every
+        # word in the title come first; the rest are only scored when there
+        # are too few of those.
+        def order(key: Key) -> tuple:
+            return key[0] == "project", key[1]
+
+        all_in_title = found.intersection(*(in_title for _, in_title in matches))
+        top_score = 2 * len(matches)
+        best = [(key, top_score) for key in heapq.nlargest(limit, all_in_title, key=order)]
+        if len(best) < limit:
+            title_hits = Counter()
+            for _, in_title in matches:
+                title_hits.update(in_title & found)
+            rest = (
+                (key, len(matches) + title_hits[key]) for key in found - all_in_title
+            )
+            best += heapq.nlargest(limit - len(best), rest, key=lambda item: (item[1],) + order(item[0]))
+
+        results = []
+        for (kind, item_id), score in best:
+            document = index.documents[(kind, item_id)]
+            results.append({
+                "type": kind,
+                "id": item_id,
+                "project_id": document.project_id,
+                "title": document.title,
+                "status": document.status,
+                "score": score,
+            })
+        return results
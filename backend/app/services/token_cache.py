@@ -0,0 +1,54 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, NamedTuple, Optional
+
+
+class CachedToken(NamedTuple):
+    principal: Any
+    fingerprint: Hashable
+    expires_at: float
+
+
+class TokenCache:
+    """Bounded LRU cache of verified access tokens.
+
+    Maps a token to the user principal it resolved to, until the earlier of
+    the token's `exp` and `ttl` seconds from now. Each entry also keeps a
+    fingerprint of the user fields that matter for authentication, so the
+    caller can compare it with the stored user and drop the entry once the
+    password changes or the user is disabled.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 300.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, CachedToken]" = OrderedDict()
+
+    def get(self, token: str) -> Optional[CachedToken]:
+        entry = self._entries.get(token)
+        if entry is None or entry.expires_at <= time.time():
+            if entry is not None:
+                del self._entries[token]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(token)
+        self.hits += 1
+        return entry
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def put(self, token: str, principal: Any, fingerprint: Hashable, expires_at: float):
+        expires_at = min(expires_at, time.time() + self.ttl)
+        self._entries[token] = CachedToken(principal, fingerprint, expires_at)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, token: str):
+        self._entries.pop(token, None)
+
+    def clear(self):
+        self._entries.clear()
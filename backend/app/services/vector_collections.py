@@ -0,0 +1,368 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+import chromadb
+from langchain.callbacks.manager import CallbackManagerForRetrieverRun
+from langchain.schema import BaseRetriever, Document
+from langchain.schema.embeddings import Embeddings
+from langchain.vectorstores import Chroma
+
+logger = logging.getLogger(__name__)
+
+# Collection the single shared store used before it was split per project
+LEGACY_COLLECTION = "langchain"
+
+COLLECTION_PREFIX = "project-"
+
+# Prefix of the collection a rebuild copies into before swapping it in
+REBUILD_PREFIX = "rebuild-"
+
+# Records per call when copying a collection
+COPY_BATCH = 1000
+
+
+T = TypeVar("T")
+
+
+def collection_name(project_id: str, prefix: str = COLLECTION_PREFIX) -> str:
+    # Chroma names are 3-63 characters of letters, digits, "_" and "-"
+    return prefix + re.sub(r"[^A-Za-z0-9_-]", "-", str(project_id))[:50]
+
+
+class ProjectCollections:
+    """One Chroma collection per project, under a single client.
+
+    A project's collection is created the first time a document is written
+    for it, so searching a project only ever walks that project's own
+    history. At most `max_open` collection handles are kept, evicting the
+    least recently used; reopening one costs a lookup in Chroma's catalog.
+
+    Documents written to the shared collection used before are moved into
+    the project's own collection, embeddings included, when that
+    collection is first opened.
+
+    The store is kept in `directory` by an embedded client, which is only
+    safe within one process: each process holds its own copy of the HNSW
+    indexes and writes it back over the others'. Processes sharing a store
+    give `server` ("host:port" of a Chroma server) instead, and
+    `directory` then only holds the maintenance lock.
+    """
+
+    def __init__(self, directory: str, embeddings: Embeddings, max_open: int = 64, server: Optional[str] = None):
+        self.directory = directory
+        self.server = server
+        self.embeddings = embeddings
+        self.max_open = max_open
+        self.opened = 0
+        self.dropped = 0
+        self.migrated = 0
+        if server:
+            host, _, port = server.rpartition(":")
+            self.client = chromadb.HttpClient(host=host or server, port=port if host else "8000")
+            os.makedirs(directory, exist_ok=True)
+        else:
+            self.client = chromadb.PersistentClient(path=directory)
+        self._handles: "OrderedDict[str, Chroma]" = OrderedDict()
+        self._lock = threading.Lock()
+        try:
+            self._legacy = self._get_collection(LEGACY_COLLECTION)
+        except ValueError:
+            self._legacy = None
+
+    def _get_collection(self, name: str):
+        return self._catalog(self.client.get_collection, name)
+
+    def _delete_collection(self, name: str):
+        self._catalog(self.client.delete_collection, name)
+
+    @staticmethod
+    def _catalog(fn: Callable[[str], T], name: str) -> T:
+        try:
+            return fn(name)
+        except ValueError:
+            raise
+        except Exception as e:
+            # The HTTP client reports a missing collection as a bare
+            # Exception; raise ValueError as the embedded client does
+            if "does not exist" in str(e):
+                raise ValueError(str(e)) from e
+            raise
+
+    def _exists(self, name: str) -> bool:
+        try:
+            self._get_collection(name)
+        except ValueError:
+            return False
+        return True
+
+    def _migrate(self, project_id: str, name: str) -> bool:
+        """Move the project's documents out of the shared collection, if any."""
+        if self._legacy is None:
+            return False
+        found = self._legacy.get(
+            where={"project_id": project_id},
+            include=["embeddings", "documents", "metadatas"]
+        )
+        if not found["ids"]:
+            return False
+        target = self.client.get_or_create_collection(name)
+        target.add(
+            ids=found["ids"],
+            embeddings=found["embeddings"],
+            documents=found["documents"],
+            metadatas=found["metadatas"]
+        )
+        self._legacy.delete(ids=found["ids"])
+        self.migrated += len(found["ids"])
+        self._prune_legacy()
+        return True
+
+    def _prune_legacy(self):
+        if self._legacy.count() == 0:
+            self._delete_collection(LEGACY_COLLECTION)
+            self._legacy = None
+
+    def get(self, project_id: str, create: bool = True) -> Optional[Chroma]:
+        """The project's collection, or None if it has none and `create` is False."""
+        project_id = str(project_id)
+        with self._lock:
+            handle = self._handles.get(project_id)
+            if handle is not None:
+                self._handles.move_to_end(project_id)
+                return handle
+            name = collection_name(project_id)
+            if (
+                not self._exists(name)
+                and not self._finish_rebuild(project_id, name)
+                and not self._migrate(project_id, name)
+                and not create
+            ):
+                return None
+            handle = Chroma(
+                client=self.client,
+                collection_name=name,
+                embedding_function=self.embeddings,
+                persist_directory=None if self.server else self.directory
+            )
+            self._handles[project_id] = handle
+            self.opened += 1
+            while len(self._handles) > self.max_open:
+                self._handles.popitem(last=False)
+            return handle
+
+    def _forget(self, project_id: str):
+        with self._lock:
+            self._handles.pop(project_id, None)
+
+    def call(self, project_id: str, fn: Callable[[Chroma], T], create: bool = True) -> Optional[T]:
+        """Run `fn` with the project's collection; None if it has none.
+
+        Another worker's rebuild or drop replaces the collection under the
+        handle cached here. The handle is then reopened once and `fn` run
+        again, or None returned if the project has no collection any more.
+        """
+        project_id = str(project_id)
+        handle = self.get(project_id, create)
+        if handle is None:
+            return None
+        try:
+            return fn(handle)
+        except Exception:
+            # Chroma fails differently depending on the call (an
+            # InvalidCollectionException, or a StopIteration from a read), so
+            # ask the catalog whether the handle is still current
+            if not self._replaced(project_id, handle):
+                raise
+            self._forget(project_id)
+            handle = self.get(project_id, create=False)
+            return fn(handle) if handle is not None else None
+
+    def _replaced(self, project_id: str, handle: Chroma) -> bool:
+        try:
+            current = self._get_collection(collection_name(project_id))
+        except ValueError:
+            return True
+        return current.id != handle._collection.id
+
+    def add(self, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]]):
+        """Write documents to the collections of the projects in their metadata."""
+        # Embed the whole batch in one request; each collection's add_texts
+        # then finds its vectors in the embedding cache
+        self.embeddings.embed_documents(texts)
+        # An id queued twice in one batch keeps its last document
+        latest = {doc_id: i for i, doc_id in enumerate(ids)}
+        groups: Dict[str, List[int]] = defaultdict(list)
+        for i in sorted(latest.values()):
+            groups[str(metadatas[i]["project_id"])].append(i)
+        for project_id, indexes in groups.items():
+            args = dict(
+                texts=[texts[i] for i in indexes],
+                metadatas=[metadatas[i] for i in indexes],
+                ids=[ids[i] for i in indexes]
+            )
+            if self.call(project_id, lambda handle: handle.add_texts(**args)) is None:
+                # Dropped by another worker since the handle was opened
+                logger.info(f"Skipped {len(indexes)} documents for deleted project {project_id}")
+
+    def count(self, project_id: str) -> int:
+        """Number of documents in the project's collection."""
+        try:
+            return self._get_collection(collection_name(project_id)).count()
+        except ValueError:
+            return 0
+
+    def ids(self, project_id: str) -> List[str]:
+        found = self.call(project_id, lambda handle: handle.get(include=[]), create=False)
+        return found["ids"] if found is not None else []
+
+    def _documents(self, project_id: str, **query) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+        found = self.call(
+            project_id, lambda handle: handle.get(include=["documents", "metadatas"], **query), create=False
+        )
+        if found is None:
+            return {}
+        return {
+            doc_id: (text, metadata)
+            for doc_id, text, metadata in zip(found["ids"], found["documents"], found["metadatas"])
+        }
+
+    def documents(self, project_id: str, ids: List[str]) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+        """Id -> (text, metadata) of the given documents of the project."""
+        return self._documents(project_id, ids=ids) if ids else {}
+
+    def documents_since(self, project_id: str, created_after: float) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+        """Id -> (text, metadata) of the project's documents stamped after `created_after`."""
+        return self._documents(project_id, where={"created_at": {"$gt": created_after}})
+
+    # Maintenance
+
+    def project_ids(self) -> List[str]:
+        """Projects that have a collection, as their collection names spell them."""
+        return [
+            c.name[len(COLLECTION_PREFIX):] for c in self.client.list_collections()
+            if c.name.startswith(COLLECTION_PREFIX)
+        ]
+
+    def records(self, project_id: str) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """(id, text, metadata) of every document in the project's collection."""
+        try:
+            collection = self._get_collection(collection_name(project_id))
+        except ValueError:
+            return []
+        found = collection.get(include=["documents", "metadatas"])
+        return list(zip(found["ids"], found["documents"], found["metadatas"]))
+
+    def delete(self, project_id: str, ids: List[str]):
+        if ids:
+            self._get_collection(collection_name(project_id)).delete(ids=ids)
+
+    def update_metadata(self, project_id: str, ids: List[str], metadatas: List[Dict[str, Any]]):
+        if ids:
+            self._get_collection(collection_name(project_id)).update(ids=ids, metadatas=metadatas)
+
+    def rebuild(self, project_id: str):
+        """Recreate the project's collection from its current documents.
+
+        Chroma's HNSW index keeps deleted vectors, so after large deletes
+        the collection is copied into a fresh one to reclaim them. The copy
+        is made under a temporary name and only swapped in once complete;
+        if the swap is interrupted, the next `get` finishes it.
+        """
+        project_id = str(project_id)
+        name = collection_name(project_id)
+        temporary = collection_name(project_id, REBUILD_PREFIX)
+        with self._lock:
+            self._handles.pop(project_id, None)
+            old = self._get_collection(name)
+            if self._exists(temporary):
+                # Left by a rebuild that failed while copying
+                self._delete_collection(temporary)
+            new = self.client.create_collection(temporary, metadata=old.metadata)
+            copied = self._copy(old, new, old.get(include=[])["ids"])
+            # Catch documents other workers wrote meanwhile
+            self._copy(old, new, [doc_id for doc_id in old.get(include=[])["ids"] if doc_id not in copied])
+            self._delete_collection(name)
+            new.modify(name=name)
+
+    @staticmethod
+    def _copy(source, target, ids: List[str]) -> set:
+        for start in range(0, len(ids), COPY_BATCH):
+            found = source.get(ids=ids[start:start + COPY_BATCH], include=["embeddings", "documents", "metadatas"])
+            if found["ids"]:
+                target.add(
+                    ids=found["ids"],
+                    embeddings=found["embeddings"],
+                    documents=found["documents"],
+                    metadatas=found["metadatas"]
+                )
+        return set(ids)
+
+    def _finish_rebuild(self, project_id: str, name: str) -> bool:
+        """Swap in a rebuilt copy whose original was already deleted, if there is one."""
+        try:
+            rebuilt = self._get_collection(collection_name(project_id, REBUILD_PREFIX))
+        except ValueError:
+            return False
+        # Renaming by id, so it does no harm if another worker got here first
+        rebuilt.modify(name=name)
+        logger.info(f"Finished interrupted rebuild of the collection of project {project_id}")
+        return True
+
+    def vacuum(self):
+        """Return space freed by deletes in Chroma's SQLite file to the filesystem."""
+        if self.server:
+            # The server's file is out of reach; it is vacuumed by hand
+            return
+        connection = sqlite3.connect(os.path.join(self.directory, "chroma.sqlite3"))
+        try:
+            connection.execute("VACUUM")
+        finally:
+            connection.close()
+
+    def drop(self, project_id: str):
+        """Delete the project's collection and any documents it still has in the shared one."""
+        project_id = str(project_id)
+        with self._lock:
+            self._handles.pop(project_id, None)
+            try:
+                self._delete_collection(collection_name(project_id))
+                self.dropped += 1
+            except ValueError:
+                pass
+            if self._exists(collection_name(project_id, REBUILD_PREFIX)):
+                self._delete_collection(collection_name(project_id, REBUILD_PREFIX))
+            if self._legacy is not None:
+                self._legacy.delete(where={"project_id": project_id})
+                self._prune_legacy()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "open": len(self._handles),
+            "max_open": self.max_open,
+            "opened": self.opened,
+            "dropped": self.dropped,
+            "migrated": self.migrated,
+        }
+
+
+class ProjectRetriever(BaseRetriever):
+    """Retriever over one project's collection, through ProjectCollections.call.
+
+    Unlike a retriever bound to a Chroma handle, it keeps working when
+    another worker rebuilds the collection.
+    """
+
+    collections: Any
+    project_id: str
+    k: int = 4
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        found = self.collections.call(
+            self.project_id, lambda handle: handle.similarity_search(query, k=self.k), create=False
+        )
+        return found or []
@@ -0,0 +1,255 @@
+"""Retention, deduplication and compaction of the per-project vector collections.
+
+Run once from the backend directory with
+
+    python -m app.services.vector_maintenance [--project ID] [--dry-run]
+
+or let the app run it every VECTOR_MAINTENANCE_INTERVAL_HOURS.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+from app.services.ai_service import content_id
+from app.services.vector_collections import ProjectCollections
+
+logger = logging.getLogger(__name__)
+
+DAY = 24 * 60 * 60
+
+
+class RetentionPolicy(NamedTuple):
+    # Documents older than this are deleted; 0 keeps them forever
+    retention_days: float = 180
+    # Conversations older than this are folded into summary documents;
+    # 0 never summarizes
+    summarize_after_days: float = 30
+    # Conversations per summary document
+    summary_batch: int = 20
+
+
+def load_policies(path: Optional[str]) -> Dict[str, RetentionPolicy]:
+    """Read policies from a JSON file like {"default": {...}, "projects": {"12": {...}}}.
+
+    Returns the policy per project id, with the default under "*". Fields
+    left out fall back to the environment defaults.
+    """
+    default = RetentionPolicy(
+        retention_days=float(os.getenv("VECTOR_RETENTION_DAYS", "180")),
+        summarize_after_days=float(os.getenv("VECTOR_SUMMARIZE_AFTER_DAYS", "30")),
+        summary_batch=int(os.getenv("VECTOR_SUMMARY_BATCH", "20")),
+    )
+    policies = {"*": default}
+    if path and os.path.exists(path):
+        with open(path) as f:
+            config = json.load(f)
+        policies["*"] = default = default._replace(**config.get("default", {}))
+        for project_id, fields in config.get("projects", {}).items():
+            policies[str(project_id)] = default._replace(**fields)
+    return policies
+
+
+class VectorMaintenance:
+    """Keeps each project's vector collection bounded in size.
+
+    A run goes through every project collection and
+    - stamps documents written before `created_at` was recorded with the
+      time they were first seen, so they age like the rest,
+    - removes documents with the same text, keeping the newest copy,
+    - deletes documents older than the project's retention period,
+    - folds conversations older than `summarize_after_days` into summary
+      documents of `summary_batch` conversations each, written by
+      `summarize`, which also age out at the end of the retention period,
+    - rebuilds the collection when at least `rebuild_fraction` of it was
+      deleted, since Chroma's HNSW index keeps deleted vectors,
+    and finally vacuums Chroma's SQLite file once anything was deleted.
+
+    With `dry_run` nothing is changed and the report says what would be.
+    """
+
+    def __init__(
+        self,
+        collections: ProjectCollections,
+        summarize: Optional[Callable[[List[str]], Awaitable[str]]],
+        policies: Dict[str, RetentionPolicy],
+        rebuild_fraction: float = 0.2
+    ):
+        self.collections = collections
+        self.summarize = summarize
+        self.policies = policies
+        self.rebuild_fraction = rebuild_fraction
+
+    def policy_for(self, project_id: str) -> RetentionPolicy:
+        return self.policies.get(str(project_id), self.policies["*"])
+
+    async def run_project(self, project_id: str, dry_run: bool = False) -> Dict[str, int]:
+        policy = self.policy_for(project_id)
+        records = await asyncio.to_thread(self.collections.records, project_id)
+        report = {"documents": len(records), "stamped": 0, "duplicates": 0, "expired": 0, "summarized": 0, "summaries": 0}
+        now = time.time()
+
+        unstamped = [(doc_id, metadata) for doc_id, _, metadata in records if "created_at" not in metadata]
+        for _, metadata in unstamped:
+            metadata["created_at"] = now
+        report["stamped"] = len(unstamped)
+        if unstamped and not dry_run:
+            await asyncio.to_thread(
+                self.collections.update_metadata,
+                project_id,
+                [doc_id for doc_id, _ in unstamped],
+                [metadata for _, metadata in unstamped]
+            )
+
+        # Newest first, so the first copy of a text seen is the one kept
+        records.sort(key=lambda record: record[2]["created_at"], reverse=True)
+        removed: List[str] = []
+        kept = []
+        seen = set()
+        for record in records:
+            digest = content_id(record[1])
+            if digest in seen:
+                removed.append(record[0])
+                report["duplicates"] += 1
+                continue
+            seen.add(digest)
+            if policy.retention_days and record[2]["created_at"] < now - policy.retention_days * DAY:
+                removed.append(record[0])
+                report["expired"] += 1
+                continue
+            kept.append(record)
+
+        if removed and not dry_run:
+            await asyncio.to_thread(self.collections.delete, project_id, removed)
+
+        if policy.summarize_after_days and self.summarize is not None:
+            cutoff = now - policy.summarize_after_days * DAY
+            old = [r for r in reversed(kept) if r[2].get("type") == "conversation" and r[2]["created_at"] < cutoff]
+            # Only full batches, so each summary covers as many as the policy asks
+            for start in range(0, len(old) - policy.summary_batch + 1, policy.summary_batch):
+                batch = old[start:start + policy.summary_batch]
+                report["summarized"] += len(batch)
+                report["summaries"] += 1
+                if dry_run:
+                    continue
+                summary = await self.summarize([text for _, text, _ in batch])
+                text = f"Project {project_id}: Summary of earlier conversations: {summary}"
+                metadata = {
+                    "project_id": project_id,
+                    "type": "summary",
+                    "created_at": batch[-1][2]["created_at"],
+                    "conversations": len(batch),
+                }
+                await asyncio.to_thread(
+                    self.collections.add, [content_id(text)], [text], [metadata]
+                )
+                # Delete as each summary lands, so an interrupted run loses nothing
+                await asyncio.to_thread(self.collections.delete, project_id, [doc_id for doc_id, _, _ in batch])
+
+        report["deleted"] = len(removed) + report["summarized"]
+        report["rebuilt"] = 0
+        if not dry_run and records and report["deleted"] >= self.rebuild_fraction * len(records):
+            await asyncio.to_thread(self.collections.rebuild, project_id)
+            report["rebuilt"] = 1
+        return report
+
+    async def run(self, project_ids: Optional[List[str]] = None, dry_run: bool = False) -> Dict[str, Dict[str, int]]:
+        if project_ids is None:
+            project_ids = await asyncio.to_thread(self.collections.project_ids)
+        reports = {}
+        for project_id in project_ids:
+            try:
+                reports[project_id] = await self.run_project(project_id, dry_run=dry_run)
+            except Exception as e:
+                logger.error(f"Vector maintenance failed for project {project_id}: {e}")
+        if not dry_run and any(r["deleted"] for r in reports.values()):
+            await asyncio.to_thread(self.collections.vacuum)
+        return reports
+
+
+def create_maintenance(ai_service) -> VectorMaintenance:
+    return VectorMaintenance(
+        ai_service.collections,
+        ai_service.summarize_documents,
+        load_policies(os.getenv("VECTOR_POLICY_FILE", "./data/vector_policies.json")),
+        rebuild_fraction=float(os.getenv("VECTOR_REBUILD_FRACTION", "0.2"))
+    )
+
+
+@contextlib.contextmanager
+def maintenance_lock(directory: str):
+    """Yield True if this process got the maintenance lock, False if another holds it.
+
+    Keeps workers sharing a vector store from maintaining it at the same time.
+    Without flock (on Windows) every caller gets it.
+    """
+    if fcntl is None:
+        yield True
+        return
+    with open(os.path.join(directory, "maintenance.lock"), "a") as lock_file:
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+async def run_periodically(maintenance: VectorMaintenance, interval: float):
+    """Run maintenance every `interval` seconds, in whichever worker gets the lock."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            with maintenance_lock(maintenance.collections.directory) as acquired:
+                if not acquired:
+                    continue
+                started = time.monotonic()
+                reports = await maintenance.run()
+        except Exception as e:
+            # Such as vacuum finding the database locked by ingestion; try
+            # again next interval
+            logger.error(f"Vector maintenance failed: {e}")
+            continue
+        deleted = sum(r["deleted"] for r in reports.values())
+        logger.info(
+            f"Vector maintenance: {len(reports)} projects, {deleted} documents removed "
+            f"in {time.monotonic() - started:.1f}s"
+        )
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--project", action="append", help="only this project id (repeatable)")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without changing it")
+    args = parser.parse_args(argv)
+
+    from app.services.ai_service import AIService
+
+    ai_service = AIService()
+    if not ai_service.is_openai_available:
+        raise SystemExit("The AI service is not configured; see AI_PROVIDER in .env")
+    try:
+        with maintenance_lock(ai_service.collections.directory) as acquired:
+            if not acquired:
+                raise SystemExit("Vector maintenance is already running")
+            reports = asyncio.run(create_maintenance(ai_service).run(args.project, dry_run=args.dry_run))
+        for project_id, report in sorted(reports.items()):
+            print(project_id, json.dumps(report))
+    finally:
+        ai_service.close()
+
+
+if __name__ == "__main__":
+    main()
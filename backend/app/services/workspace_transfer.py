@@ -0,0 +1,127 @@
+import json
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional
+
+from app.services.conversation_memory import GENERAL, ConversationMemory
+from app.storage.base import Storage
+
+FORMAT_VERSION = 1
+
+PROJECT_FIELDS = ("title", "description", "created_at")
+TASK_FIELDS = ("title", "description", "status", "created_at")
+
+
+class WorkspaceImportError(ValueError):
+    """An import line that cannot be applied."""
+
+
+def _line(record: dict) -> str:
+    return json.dumps(record, separators=(",", ":")) + "\n"
+
+
+async def export_ndjson(
+    store: Storage, memory: ConversationMemory, owner_email: str, page_size: int = 500
+) -> AsyncIterator[str]:
+    """Yield the owner's workspace as NDJSON text, a page of records at a time.
+
+    A header line comes first, then each project followed by its tasks and
+    its conversation, then the conversation held outside any project.
+    Projects and tasks are read a page at a time, so memory use does not
+    grow with the size of the workspace. The store is read on the event
+    loop, between the writes of other requests, never from a thread.
+    """
+    yield _line({
+        "type": "workspace",
+        "version": FORMAT_VERSION,
+        "owner": owner_email,
+        "exported_at": datetime.utcnow().isoformat(),
+    })
+    after = None
+    while True:
+        projects = store.list_projects(owner_email, after=after, limit=page_size)
+        for project in projects:
+            yield _line(dict({"type": "project", "id": project["id"]}, **{f: project.get(f) for f in PROJECT_FIELDS}))
+            task_after = None
+            while True:
+                tasks = store.list_tasks(project["id"], after=task_after, limit=page_size)
+                yield "".join(
+                    _line(dict({"type": "task", "id": task["id"], "project_id": project["id"]}, **{f: task.get(f) for f in TASK_FIELDS}))
+                    for task in tasks
+                )
+                if len(tasks) < page_size:
+                    break
+                task_after = tasks[-1]["id"]
+            yield _conversation_line(memory, owner_email, str(project["id"]), project["id"])
+        if len(projects) < page_size:
+            break
+        after = projects[-1]["id"]
+    yield _conversation_line(memory, owner_email, GENERAL, None)
+
+
+def _conversation_line(memory: ConversationMemory, owner_email: str, key: str, project_id: Optional[int]) -> str:
+    conversation = memory.peek(owner_email, key)
+    if conversation is None or not (conversation.summary or conversation.turns):
+        return ""
+    return _line({
+        "type": "conversation",
+        "project_id": project_id,
+        "summary": conversation.summary,
+        "turns": [list(turn) for turn in conversation.turns],
+    })
+
+
+class WorkspaceImporter:
+    """Writes exported records into an owner's workspace under new ids.
+
+    Projects are created as they arrive and their exported ids mapped to
+    the ones the store allocates; tasks and conversations follow that map.
+    Tasks are written through the store's batch path, `batch_size` at a
+    time, so at most that many are held in memory. Conversations are
+    merged with the history the owner already has. Records written before
+    a failing line stay imported.
+    """
+
+    def __init__(self, store: Storage, memory: ConversationMemory, owner_email: str, batch_size: int = 1000):
+        self.store = store
+        self.memory = memory
+        self.owner_email = owner_email
+        self.batch_size = batch_size
+        # Exported project id -> new id
+        self.project_ids: Dict[int, int] = {}
+        self.counts = {"projects": 0, "tasks": 0, "conversations": 0}
+        self._pending_project: Optional[int] = None
+        self._pending: List[dict] = []
+
+    def _new_project_id(self, exported_id) -> int:
+        try:
+            return self.project_ids[exported_id]
+        except (KeyError, TypeError):
+            raise WorkspaceImportError(f"project {exported_id!r} is not earlier in the file")
+
+    def add_project(self, exported_id: int, fields: dict):
+        if not isinstance(exported_id, int) or isinstance(exported_id, bool):
+            raise WorkspaceImportError(f"project id {exported_id!r} is not an integer")
+        self.flush()
+        project = self.store.create_project(dict(fields, owner_email=self.owner_email))
+        self.project_ids[exported_id] = project["id"]
+        self.counts["projects"] += 1
+
+    def add_task(self, exported_project_id: int, fields: dict):
+        project_id = self._new_project_id(exported_project_id)
+        if project_id != self._pending_project or len(self._pending) >= self.batch_size:
+            self.flush()
+            self._pending_project = project_id
+        self._pending.append({"op": "create", "fields": fields})
+
+    def add_conversation(self, exported_project_id: Optional[int], summary: str, turns: List[list]):
+        if not all(isinstance(turn, list) and len(turn) == 2 and all(isinstance(m, str) for m in turn) for turn in turns):
+            raise WorkspaceImportError("conversation turns must be [user message, assistant message] pairs")
+        key = GENERAL if exported_project_id is None else str(self._new_project_id(exported_project_id))
+        self.memory.merge(self.owner_email, key, summary, [tuple(turn) for turn in turns])
+        self.counts["conversations"] += 1
+
+    def flush(self):
+        if self._pending:
+            self.store.apply_task_batch(self._pending_project, self._pending)
+            self.counts["tasks"] += len(self._pending)
+            self._pending = []
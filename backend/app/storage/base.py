@@ -0,0 +1,150 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class TaskNotFoundError(LookupError):
+    """A batch operation referenced a task that is not in the project."""
+
+    def __init__(self, task_id: int):
+        super().__init__(f"Task {task_id} not found")
+        self.task_id = task_id
+
+
+class Storage(ABC):
+    """Persistence interface main.py uses for users, projects and tasks.
+
+    Rows are plain dicts shaped like the API models. Returned rows must be
+    treated as read-only; changes go through `put_*` or `update_*`.
+    """
+
+    # Users
+
+    @abstractmethod
+    def get_user(self, email: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def put_user(self, user: dict):
+        ...
+
+    @abstractmethod
+    def add_user(self, user: dict) -> bool:
+        """Insert a user unless the email is taken; return whether it was inserted."""
+
+    # Projects
+
+    @abstractmethod
+    def get_project(self, project_id: int, owner_email: Optional[str] = None) -> Optional[dict]:
+        """Return the project, or None if it is missing or owned by someone else."""
+
+    @abstractmethod
+    def list_projects(
+        self,
+        owner_email: str,
+        after: Optional[int] = None,
+        limit: Optional[int] = None,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None,
+    ) -> List[dict]:
+        """Return the owner's projects in id order.
+
+        `after` is a keyset cursor (only ids greater than it are returned)
+        and the `created_*` bounds are inclusive ISO timestamps.
+        """
+
+    @abstractmethod
+    def create_project(self, project: dict) -> dict:
+        """Insert a project under a newly allocated id and return it."""
+
+    @abstractmethod
+    def put_project(self, project: dict):
+        ...
+
+    @abstractmethod
+    def update_project(self, project_id: int, fields: Dict[str, Any]) -> dict:
+        """Apply a partial update and return the updated project."""
+
+    @abstractmethod
+    def delete_project(self, project_id: int):
+        """Delete a project together with all of its tasks in one write."""
+
+    # Tasks
+
+    @abstractmethod
+    def get_task(self, task_id: int, project_id: Optional[int] = None) -> Optional[dict]:
+        """Return the task, or None if it is missing or belongs to another project."""
+
+    @abstractmethod
+    def list_tasks(
+        self,
+        project_id: int,
+        after: Optional[int] = None,
+        limit: Optional[int] = None,
+        status: Optional[str] = None,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None,
+    ) -> List[dict]:
+        """Return the project's tasks in id order, filtered like list_projects."""
+
+    @abstractmethod
+    def create_task(self, task: dict) -> dict:
+        """Insert a task under a newly allocated id and return it."""
+
+    @abstractmethod
+    def put_task(self, task: dict):
+        ...
+
+    @abstractmethod
+    def update_task(self, task_id: int, fields: Dict[str, Any]) -> dict:
+        """Apply a partial update and return the updated task."""
+
+    @abstractmethod
+    def delete_task(self, task_id: int):
+        ...
+
+    @abstractmethod
+    def apply_task_batch(self, project_id: int, operations: List[dict]) -> List[dict]:
+        """Apply create/update/delete operations to one project's tasks atomically.
+
+        Operations look like {"op": "create", "fields": {...}},
+        {"op": "update", "id": 5, "fields": {...}} or {"op": "delete", "id": 5}
+        and see the effects of earlier operations in the same batch. Returns
+        the resulting task for each operation (the removed task for deletes).
+        Raises TaskNotFoundError, writing nothing, if an update or delete
+        targets a task outside the project.
+        """
+
+    # Versions
+
+    @abstractmethod
+    def project_list_version(self, owner_email: str) -> Tuple[str, float]:
+        """Return (version, last modified Unix time) of the owner's projects.
+
+        The version changes whenever one of the owner's projects is created,
+        changed or deleted; the time is never earlier than that change.
+        """
+
+    @abstractmethod
+    def task_list_version(self, project_id: int) -> Tuple[str, float]:
+        """Return (version, last modified Unix time) of the project's tasks."""
+
+    # Lifecycle
+
+    def load(self):
+        """Re-read durable state written outside this process."""
+
+    def refresh(self):
+        """Like load(), but only does work when another process has written."""
+
+    def refresh_users(self):
+        """Like refresh(), but also picks up edits made to the users file by hand."""
+        self.refresh()
+
+    def flush(self):
+        """Persist any writes that are still buffered in memory."""
+
+    async def wait_durable(self):
+        """Wait until every write made so far has reached stable storage."""
+
+    def close(self):
+        """Flush pending writes and release files/connections."""
@@ -0,0 +1,27 @@
+import os
+
+from .base import Storage
+
+
+def create_store(db_dir: str) -> Storage:
+    """Build the storage backend selected by STORAGE_BACKEND ("json" or "sqlite")."""
+    backend = os.getenv("STORAGE_BACKEND", "json").lower()
+    if backend == "sqlite":
+        from .sqlite import SQLiteStore
+
+        path = os.getenv("SQLITE_PATH", os.path.join(db_dir, "app.sqlite3"))
+        durable = os.getenv("DURABLE_WRITES", "false").lower() == "true"
+        return SQLiteStore(path, db_dir=db_dir, durable=durable)
+    if backend == "json":
+        from .journal import JournalStore
+
+        compact_bytes = int(os.getenv("JOURNAL_COMPACT_BYTES", str(4 * 1024 * 1024)))
+        flush_interval = int(os.getenv("STORE_FLUSH_INTERVAL_MS", "50")) / 1000
+        multiprocess = os.getenv("STORE_MULTIPROCESS", "false").lower() == "true"
+        return JournalStore(
+            db_dir,
+            compact_bytes=compact_bytes,
+            flush_interval=flush_interval,
+            multiprocess=multiprocess,
+        )
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
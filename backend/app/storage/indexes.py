@@ -0,0 +1,120 @@
+import bisect
+import hashlib
+import json
+import time
+from itertools import islice
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+def row_hash(row: dict) -> int:
+    """Stable 64-bit hash of a row's content, identical across processes."""
+    encoded = json.dumps(row, sort_keys=True, separators=(",", ":")).encode()
+    return int.from_bytes(hashlib.blake2b(encoded, digest_size=8).digest(), "big")
+
+
+class SecondaryIndex:
+    """Hash index from a field value to the rows that carry it.
+
+    Rows are grouped by `key_fn(row)` and kept in insertion order within a
+    bucket, so lookups return the same order a full scan of the table would.
+    Each bucket's ids are also kept sorted, so a page past a cursor starts
+    with a binary search instead of a scan from the start of the bucket.
+
+    Each bucket also carries a version, the XOR of its rows' content hashes,
+    which changes whenever a row is added, changed or removed and depends
+    only on the bucket's contents, and the time it last changed.
+    """
+
+    def __init__(self, key_fn: Callable[[dict], Any], id_fn: Callable[[dict], Any]):
+        self.key_fn = key_fn
+        self.id_fn = id_fn
+        self._buckets: Dict[Any, Dict[Any, dict]] = {}
+        self._ids: Dict[Any, List[Any]] = {}
+        self._versions: Dict[Any, int] = {}
+        # Kept after a bucket empties, so deleting its last row still moves
+        # the bucket's modification time forward.
+        self._modified: Dict[Any, float] = {}
+        self._rebuilt_at = time.time()
+
+    def _touch(self, key: Any, digest: int):
+        self._versions[key] = self._versions.get(key, 0) ^ digest
+        self._modified[key] = time.time()
+
+    def add(self, row: dict):
+        key = self.key_fn(row)
+        row_id = self.id_fn(row)
+        bucket = self._buckets.setdefault(key, {})
+        if row_id not in bucket:
+            ids = self._ids.setdefault(key, [])
+            if not ids or row_id > ids[-1]:
+                ids.append(row_id)
+            else:
+                bisect.insort(ids, row_id)
+        bucket[row_id] = row
+        self._touch(key, row_hash(row))
+
+    def remove(self, row: dict):
+        key = self.key_fn(row)
+        row_id = self.id_fn(row)
+        bucket = self._buckets.get(key)
+        if bucket is None or bucket.pop(row_id, None) is None:
+            return
+        ids = self._ids[key]
+        del ids[bisect.bisect_left(ids, row_id)]
+        self._touch(key, row_hash(row))
+        if not bucket:
+            del self._buckets[key]
+            del self._ids[key]
+            del self._versions[key]
+
+    def replace(self, old: Optional[dict], new: dict):
+        """Swap `old` for `new`, keeping its position when the key is unchanged."""
+        if old is None:
+            self.add(new)
+        elif self.key_fn(old) != self.key_fn(new):
+            self.remove(old)
+            self.add(new)
+        else:
+            key = self.key_fn(new)
+            self._buckets.setdefault(key, {})[self.id_fn(new)] = new
+            self._touch(key, row_hash(old) ^ row_hash(new))
+
+    def get(self, key: Any) -> List[dict]:
+        return list(self._buckets.get(key, {}).values())
+
+    def page(
+        self,
+        key: Any,
+        after: Optional[Any] = None,
+        limit: Optional[int] = None,
+        predicate: Optional[Callable[[dict], bool]] = None,
+    ) -> List[dict]:
+        """Rows in the bucket whose id is past `after` and match `predicate`, by id."""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return []
+        ids = self._ids[key]
+        start = 0 if after is None else bisect.bisect_right(ids, after)
+        rows = (bucket[ids[i]] for i in range(start, len(ids)))
+        if predicate is not None:
+            rows = (r for r in rows if predicate(r))
+        return list(islice(rows, limit))
+
+    def count(self, key: Any) -> int:
+        return len(self._buckets.get(key, ()))
+
+    def version(self, key: Any) -> Tuple[str, float]:
+        """Return (version, last modified Unix time) for a bucket."""
+        return format(self._versions.get(key, 0), "016x"), self._modified.get(key, self._rebuilt_at)
+
+    def clear(self):
+        self._buckets.clear()
+        self._ids.clear()
+        self._versions.clear()
+        self._modified.clear()
+        self._rebuilt_at = time.time()
+
+    def rebuild(self, rows):
+        self.clear()
+        for row in rows:
+            self.add(row)
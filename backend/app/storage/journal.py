@@ -0,0 +1,684 @@
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+from .base import Storage, TaskNotFoundError
+from .indexes import SecondaryIndex
+
+logger = logging.getLogger(__name__)
+
+# Snapshot file for each table. The layout matches the files main.py has
+# always written, so an existing db/ directory loads without migration.
+SNAPSHOT_FILES = {
+    "users": "users.json",
+    "projects": "projects.json",
+    "tasks": "tasks.json",
+}
+JOURNAL_FILE = "journal.log"
+ROTATED_JOURNAL_FILE = "journal.log.old"
+LOCK_FILE = ".lock"
+
+
+def _fsync_dir(path: str):
+    """Flush directory metadata so a rename survives a crash."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_json(path: str, data: Any):
+    """Write JSON to a temp file and rename it over `path`.
+
+    Readers only ever see the old file or the complete new one, never a
+    truncated file.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_dir(os.path.dirname(path) or ".")
+
+
+class JournalStore(Storage):
+    """In-memory users/projects/tasks tables backed by snapshot + write-ahead log.
+
+    Every mutation is written to `journal.log` as a single JSON line and
+    applied in memory, so a write costs O(record size) instead of rewriting
+    a whole table. The line only goes to the OS page cache; a flusher
+    thread fsyncs everything written within `flush_interval` seconds at
+    once (group commit), and `wait_durable()` lets a caller wait for the
+    fsync that covers its writes. With `flush_interval=0` every mutation is
+    fsynced inline.
+
+    On startup the snapshots are loaded and the log is replayed on top.
+    Once the log grows past `compact_bytes`, a background thread folds it
+    into fresh snapshots.
+
+    Projects are indexed by owner and tasks by project; both indexes are
+    maintained in `_apply`, the single point every mutation and replayed
+    record goes through.
+
+    With `multiprocess=True` several worker processes can share one db
+    directory. Mutations and compaction hold an exclusive flock on
+    `db/.lock`. Before mutating or reading, a worker compares the journal's
+    inode and size with what it has already applied: it tails the new
+    records when another worker appended and reloads fully when another
+    worker compacted.
+    """
+
+    def __init__(
+        self,
+        db_dir: str,
+        compact_bytes: int = 4 * 1024 * 1024,
+        flush_interval: float = 0.05,
+        multiprocess: bool = False,
+    ):
+        if multiprocess and fcntl is None:
+            raise RuntimeError("Multi-process journal storage requires fcntl file locking")
+        self.db_dir = db_dir
+        self.compact_bytes = compact_bytes
+        self.flush_interval = flush_interval
+        self.multiprocess = multiprocess
+        self.journal_path = os.path.join(db_dir, JOURNAL_FILE)
+        self.rotated_journal_path = os.path.join(db_dir, ROTATED_JOURNAL_FILE)
+
+        self.users: Dict[str, dict] = {}
+        self.projects: Dict[int, dict] = {}
+        self.tasks: Dict[int, dict] = {}
+        self.projects_by_owner = SecondaryIndex(lambda p: p["owner_email"], lambda p: p["id"])
+        self.tasks_by_project = SecondaryIndex(lambda t: t["project_id"], lambda t: t["id"])
+        # High-water mark of allocated ids; deleted ids are never reused.
+        self._max_ids = {"projects": 0, "tasks": 0}
+
+        # Lock order: _compact_lock or _flush_lock, then _lock, then the
+        # cross-process file lock.
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._journal = None
+        # Bytes of the live journal already applied in memory, and its
+        # inode; together they reveal writes and compactions by other workers.
+        self._journal_bytes = 0
+        self._journal_ino: Optional[int] = None
+        # (mtime, size) of users.json as last loaded or written by us, to
+        # notice when it is edited by hand.
+        self._users_snapshot_stat: Optional[Tuple[int, int]] = None
+        self._lock_file = None
+        self._lock_depth = 0
+        self._compact_requested = threading.Event()
+        self._closed = threading.Event()
+        self._compactor: Optional[threading.Thread] = None
+
+        # Group commit state: sequence numbers of the last written and the
+        # last fsynced line, and the asyncio futures waiting for a sequence
+        # to become durable.
+        self._written_seq = 0
+        self._durable_seq = 0
+        self._waiters: List[Tuple[int, asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self._flush_requested = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+        os.makedirs(db_dir, exist_ok=True)
+        if multiprocess:
+            self._lock_file = open(os.path.join(db_dir, LOCK_FILE), 'a')
+        with self._process_lock():
+            self._init_snapshot_files()
+            self.load()
+        self._start_background_threads()
+
+    @contextlib.contextmanager
+    def _process_lock(self):
+        """Hold the thread lock and, in multi-process mode, the db flock."""
+        with self._lock:
+            if self._lock_file is None:
+                yield
+                return
+            if self._lock_depth == 0:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    # Loading and replay
+
+    def _init_snapshot_files(self):
+        for table, filename in SNAPSHOT_FILES.items():
+            path = os.path.join(self.db_dir, filename)
+            if not os.path.exists(path):
+                logger.debug(f"Creating new {table} file at {path}")
+                atomic_write_json(path, {} if table == "users" else [])
+
+    def _table(self, name: str) -> Dict[Any, dict]:
+        return getattr(self, name)
+
+    def _index(self, name: str) -> Optional[SecondaryIndex]:
+        if name == "projects":
+            return self.projects_by_owner
+        if name == "tasks":
+            return self.tasks_by_project
+        return None
+
+    def _snapshot_stat(self, table: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(os.path.join(self.db_dir, SNAPSHOT_FILES[table]))
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _load_snapshot(self, table: str):
+        path = os.path.join(self.db_dir, SNAPSHOT_FILES[table])
+        if table == "users":
+            self._users_snapshot_stat = self._snapshot_stat(table)
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading {table} snapshot: {e}")
+            data = {} if table == "users" else []
+
+        target = self._table(table)
+        target.clear()
+        if table == "users":
+            target.update(data)
+        else:
+            for row in data:
+                target[row["id"]] = row
+
+    def _apply(self, record: dict):
+        if record["op"] == "batch":
+            for sub_record in record["r"]:
+                self._apply(sub_record)
+            return
+        table = self._table(record["t"])
+        index = self._index(record["t"])
+        if record["op"] == "put":
+            old = table.get(record["k"])
+            table[record["k"]] = record["v"]
+            if index is not None:
+                index.replace(old, record["v"])
+                self._max_ids[record["t"]] = max(self._max_ids[record["t"]], record["k"])
+        elif record["op"] == "del":
+            old = table.pop(record["k"], None)
+            if index is not None and old is not None:
+                index.remove(old)
+
+    def _replay(self, path: str, offset: int = 0, truncate_torn_tail: bool = False) -> int:
+        """Apply every complete record in `path` after `offset`.
+
+        Returns the offset just past the last complete record. A trailing
+        partial line is left in place unless `truncate_torn_tail` is set,
+        which is only safe while holding the db lock.
+        """
+        if not os.path.exists(path):
+            return offset
+        valid_bytes = offset
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                self._apply(record)
+                valid_bytes += len(line)
+        if truncate_torn_tail and valid_bytes != os.path.getsize(path):
+            logger.warning(f"Truncating torn journal tail in {path} at byte {valid_bytes}")
+            with open(path, 'r+b') as f:
+                f.truncate(valid_bytes)
+                f.flush()
+                os.fsync(f.fileno())
+        return valid_bytes
+
+    def load(self):
+        """Rebuild the in-memory tables from snapshots plus journal."""
+        with self._process_lock():
+            for table in SNAPSHOT_FILES:
+                self._load_snapshot(table)
+            # A rotated journal is left behind when compaction was
+            # interrupted; it predates the live journal.
+            self._replay(self.rotated_journal_path)
+            self._journal_bytes = self._replay(self.journal_path, truncate_torn_tail=True)
+            self.projects_by_owner.rebuild(self.projects.values())
+            self.tasks_by_project.rebuild(self.tasks.values())
+            self._max_ids["projects"] = max(self._max_ids["projects"], max(self.projects, default=0))
+            self._max_ids["tasks"] = max(self._max_ids["tasks"], max(self.tasks, default=0))
+            self._open_journal()
+
+    def _open_journal(self):
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = open(self.journal_path, 'ab', buffering=0)
+        self._journal_ino = os.fstat(self._journal.fileno()).st_ino
+
+    def _journal_changed(self) -> Tuple[bool, bool]:
+        """Return (rotated, grown) for the journal relative to what is applied."""
+        try:
+            st = os.stat(self.journal_path)
+        except FileNotFoundError:
+            return True, False
+        if st.st_ino != self._journal_ino:
+            return True, False
+        return False, st.st_size != self._journal_bytes
+
+    def refresh(self):
+        """Pick up records written by other workers since the last call.
+
+        Costs one stat() when nothing changed, a tail read when another
+        worker appended, and a full reload when another worker compacted.
+        """
+        if not self.multiprocess:
+            return
+        rotated, grown = self._journal_changed()
+        if rotated:
+            self.load()
+        elif grown:
+            with self._lock:
+                # Another worker may be mid-write; the partial line is
+                # skipped and picked up on the next refresh.
+                self._journal_bytes = self._replay(self.journal_path, offset=self._journal_bytes)
+
+    def refresh_users(self):
+        """Reload everything if users.json changed on disk, else refresh()."""
+        if self._snapshot_stat("users") != self._users_snapshot_stat:
+            logger.debug("Users snapshot changed on disk, reloading")
+            self.load()
+        else:
+            self.refresh()
+
+    def _catch_up(self):
+        # Caller holds the db lock, so no other worker is mid-write and a
+        # partial trailing line can only come from a crashed worker.
+        rotated, grown = self._journal_changed()
+        if rotated:
+            self.load()
+        elif grown:
+            self._journal_bytes = self._replay(
+                self.journal_path, offset=self._journal_bytes, truncate_torn_tail=True
+            )
+
+    # Mutations
+
+    def _mutate(self, build: Callable[[], List[dict]]):
+        """Build records from the current state, then journal and apply them.
+
+        `build` runs under the db lock after catching up with other workers,
+        so the ids it allocates and the rows it reads are current. Several
+        records are wrapped in a single batch line, so a crash mid-write
+        drops all of them rather than leaving half a cascade.
+        """
+        with self._process_lock():
+            if self.multiprocess:
+                self._catch_up()
+            records = build()
+            if not records:
+                return
+            record = records[0] if len(records) == 1 else {"op": "batch", "r": records}
+            line = (json.dumps(record, separators=(",", ":")) + "\n").encode()
+            self._journal.write(line)
+            self._journal_bytes += len(line)
+            self._apply(record)
+            self._written_seq += 1
+            if self._journal_bytes >= self.compact_bytes:
+                self._compact_requested.set()
+        if self.flush_interval <= 0:
+            self.flush()
+        else:
+            self._flush_requested.set()
+
+    @staticmethod
+    def _put_record(table: str, key: Any, value: dict) -> dict:
+        return {"t": table, "op": "put", "k": key, "v": dict(value)}
+
+    @staticmethod
+    def _del_record(table: str, key: Any) -> dict:
+        return {"t": table, "op": "del", "k": key}
+
+    def _create(self, table: str, row: dict) -> dict:
+        created = {}
+
+        def build():
+            created.update(row, id=self._max_ids[table] + 1)
+            return [self._put_record(table, created["id"], created)]
+
+        self._mutate(build)
+        return self._table(table)[created["id"]]
+
+    def _update(self, table: str, row_id: int, fields: Dict[str, Any]) -> dict:
+        self._mutate(lambda: [self._put_record(table, row_id, dict(self._table(table)[row_id], **fields))])
+        return self._table(table)[row_id]
+
+    def get_user(self, email: str) -> Optional[dict]:
+        self.refresh()
+        return self.users.get(email)
+
+    def put_user(self, user: dict):
+        self._mutate(lambda: [self._put_record("users", user["email"], user)])
+
+    def add_user(self, user: dict) -> bool:
+        added = []
+
+        def build():
+            # Checked under the db lock, after catching up with other workers
+            if user["email"] in self.users:
+                return []
+            added.append(user["email"])
+            return [self._put_record("users", user["email"], user)]
+
+        self._mutate(build)
+        return bool(added)
+
+    def create_project(self, project: dict) -> dict:
+        return self._create("projects", project)
+
+    def put_project(self, project: dict):
+        self._mutate(lambda: [self._put_record("projects", project["id"], project)])
+
+    def update_project(self, project_id: int, fields: Dict[str, Any]) -> dict:
+        return self._update("projects", project_id, fields)
+
+    def delete_project(self, project_id: int):
+        def build():
+            records = [self._del_record("tasks", task["id"]) for task in self.tasks_by_project.get(project_id)]
+            records.append(self._del_record("projects", project_id))
+            return records
+
+        self._mutate(build)
+
+    def create_task(self, task: dict) -> dict:
+        return self._create("tasks", task)
+
+    def put_task(self, task: dict):
+        self._mutate(lambda: [self._put_record("tasks", task["id"], task)])
+
+    def update_task(self, task_id: int, fields: Dict[str, Any]) -> dict:
+        return self._update("tasks", task_id, fields)
+
+    def delete_task(self, task_id: int):
+        self._mutate(lambda: [self._del_record("tasks", task_id)])
+
+    def apply_task_batch(self, project_id: int, operations: List[dict]) -> List[dict]:
+        results: List[dict] = []
+
+        def build():
+            # Stage rows so later operations see earlier ones; nothing is
+            # applied until every operation has been validated.
+            results.clear()
+            staged: Dict[int, Optional[dict]] = {}
+            records = []
+            next_id = self._max_ids["tasks"]
+            for operation in operations:
+                if operation["op"] == "create":
+                    next_id += 1
+                    row = dict(operation["fields"], id=next_id, project_id=project_id)
+                else:
+                    task_id = operation["id"]
+                    current = staged[task_id] if task_id in staged else self.tasks.get(task_id)
+                    if current is None or current["project_id"] != project_id:
+                        raise TaskNotFoundError(task_id)
+                    if operation["op"] == "delete":
+                        staged[task_id] = None
+                        records.append(self._del_record("tasks", task_id))
+                        results.append(current)
+                        continue
+                    row = dict(current, **operation.get("fields", {}), id=task_id, project_id=project_id)
+                staged[row["id"]] = row
+                records.append(self._put_record("tasks", row["id"], row))
+                results.append(row)
+            return records
+
+        self._mutate(build)
+        return results
+
+    # Group commit
+
+    def flush(self):
+        """Fsync every journal line written so far."""
+        with self._flush_lock:
+            with self._lock:
+                seq = self._written_seq
+                if seq <= self._durable_seq:
+                    return
+                # fsync a duplicate descriptor so compaction may close the
+                # journal meanwhile; appends only need _lock and keep going.
+                fd = os.dup(self._journal.fileno())
+            try:
+                os.fsync(fd)
+            except Exception as e:
+                logger.error(f"Journal fsync failed: {e}")
+                self._notify_waiters(e)
+                raise
+            finally:
+                os.close(fd)
+            with self._lock:
+                self._durable_seq = max(self._durable_seq, seq)
+            self._notify_waiters()
+
+    def _notify_waiters(self, error: Optional[Exception] = None):
+        with self._lock:
+            if error is not None:
+                ready, self._waiters = self._waiters, []
+            else:
+                ready = [w for w in self._waiters if w[0] <= self._durable_seq]
+                self._waiters = [w for w in self._waiters if w[0] > self._durable_seq]
+        for _, loop, future in ready:
+            loop.call_soon_threadsafe(_resolve_future, future, error)
+
+    async def wait_durable(self):
+        """Wait until every mutation made so far is fsynced to the journal."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            seq = self._written_seq
+            if seq <= self._durable_seq:
+                return
+            future = loop.create_future()
+            self._waiters.append((seq, loop, future))
+        self._flush_requested.set()
+        await future
+
+    def _flush_loop(self):
+        while not self._closed.is_set():
+            self._flush_requested.wait()
+            if self._closed.is_set():
+                break
+            # Let more mutations pile up so they share one fsync.
+            time.sleep(self.flush_interval)
+            self._flush_requested.clear()
+            try:
+                self.flush()
+            except Exception:
+                time.sleep(self.flush_interval)
+                self._flush_requested.set()
+
+    # Indexed lookups
+
+    def get_project(self, project_id: int, owner_email: Optional[str] = None) -> Optional[dict]:
+        """Return the project, or None if it is missing or owned by someone else."""
+        self.refresh()
+        project = self.projects.get(project_id)
+        if project is None or (owner_email is not None and project["owner_email"] != owner_email):
+            return None
+        return project
+
+    def list_projects(
+        self,
+        owner_email: str,
+        after: Optional[int] = None,
+        limit: Optional[int] = None,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None,
+    ) -> List[dict]:
+        self.refresh()
+        predicate = _row_filter(None, created_after, created_before)
+        return self.projects_by_owner.page(owner_email, after, limit, predicate)
+
+    def get_task(self, task_id: int, project_id: Optional[int] = None) -> Optional[dict]:
+        """Return the task, or None if it is missing or belongs to another project."""
+        self.refresh()
+        task = self.tasks.get(task_id)
+        if task is None or (project_id is not None and task["project_id"] != project_id):
+            return None
+        return task
+
+    def list_tasks(
+        self,
+        project_id: int,
+        after: Optional[int] = None,
+        limit: Optional[int] = None,
+        status: Optional[str] = None,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None,
+    ) -> List[dict]:
+        self.refresh()
+        predicate = _row_filter(status, created_after, created_before)
+        return self.tasks_by_project.page(project_id, after, limit, predicate)
+
+    # Versions
+
+    def project_list_version(self, owner_email: str) -> Tuple[str, float]:
+        self.refresh()
+        return self.projects_by_owner.version(owner_email)
+
+    def task_list_version(self, project_id: int) -> Tuple[str, float]:
+        self.refresh()
+        return self.tasks_by_project.version(project_id)
+
+    # Compaction
+
+    def compact(self):
+        """Fold the journal into fresh snapshots.
+
+        The live journal is fsynced and rotated aside under the lock, so
+        writers only wait for a rename. Snapshots are then written
+        atomically and the rotated journal is removed. Replaying records
+        over a snapshot that already contains them is idempotent, so a
+        crash at any point leaves a recoverable state. In multi-process
+        mode the db lock is held until the snapshots are in place, so other
+        workers never reload a half-compacted directory.
+        """
+        with self._compact_lock:
+            with self._process_lock():
+                if self.multiprocess:
+                    self._catch_up()
+                if self._journal_bytes == 0 and not os.path.exists(self.rotated_journal_path):
+                    return
+                os.fsync(self._journal.fileno())
+                self._journal.close()
+                self._journal = None
+                if os.path.exists(self.rotated_journal_path):
+                    # A previous compaction was interrupted; merge its log
+                    # into the live one before rotating again.
+                    with open(self.rotated_journal_path, 'ab') as old, open(self.journal_path, 'rb') as live:
+                        old.write(live.read())
+                        old.flush()
+                        os.fsync(old.fileno())
+                    os.remove(self.journal_path)
+                else:
+                    os.replace(self.journal_path, self.rotated_journal_path)
+                self._open_journal()
+                self._journal_bytes = 0
+                _fsync_dir(self.db_dir)
+                snapshot = {
+                    "users": dict(self.users),
+                    "projects": list(self.projects.values()),
+                    "tasks": list(self.tasks.values()),
+                }
+                if self.multiprocess:
+                    self._write_snapshots(snapshot)
+                    return
+            self._write_snapshots(snapshot)
+
+    def _write_snapshots(self, snapshot: Dict[str, Any]):
+        for table, data in snapshot.items():
+            atomic_write_json(os.path.join(self.db_dir, SNAPSHOT_FILES[table]), data)
+        self._users_snapshot_stat = self._snapshot_stat("users")
+        os.remove(self.rotated_journal_path)
+        _fsync_dir(self.db_dir)
+        logger.debug("Compacted journal into snapshots")
+
+    def _start_background_threads(self):
+        self._compactor = threading.Thread(target=self._compact_loop, name="journal-compactor", daemon=True)
+        self._compactor.start()
+        if self.flush_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_loop, name="journal-flusher", daemon=True)
+            self._flusher.start()
+
+    def _compact_loop(self):
+        while not self._closed.is_set():
+            self._compact_requested.wait()
+            self._compact_requested.clear()
+            if self._closed.is_set():
+                break
+            try:
+                self.compact()
+            except Exception as e:
+                logger.error(f"Journal compaction failed: {e}")
+
+    def close(self):
+        """Stop the background threads, fold the journal and close the log file."""
+        self._closed.set()
+        self._compact_requested.set()
+        self._flush_requested.set()
+        for thread in (self._compactor, self._flusher):
+            if thread is not None:
+                thread.join()
+        self.flush()
+        self.compact()
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+
+
+def _row_filter(
+    status: Optional[str], created_after: Optional[str], created_before: Optional[str]
+) -> Optional[Callable[[dict], bool]]:
+    if status is None and created_after is None and created_before is None:
+        return None
+
+    def matches(row: dict) -> bool:
+        if status is not None and row.get("status") != status:
+            return False
+        if created_after is not None and row["created_at"] < created_after:
+            return False
+        if created_before is not None and row["created_at"] > created_before:
+            return False
+        return True
+
+    return matches
+
+
+def _resolve_future(future: asyncio.Future, error: Optional[Exception]):
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(None)
@@ -0,0 +1,313 @@
+import logging
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import journal
+from .base import Storage, TaskNotFoundError
+from .journal import JOURNAL_FILE, ROTATED_JOURNAL_FILE, SNAPSHOT_FILES, JournalStore
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    email TEXT PRIMARY KEY,
+    hashed_password TEXT NOT NULL,
+    disabled INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS projects (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    description TEXT,
+    owner_email TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_projects_owner ON projects (owner_email, id);
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project_id INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    description TEXT,
+    status TEXT NOT NULL DEFAULT 'TODO',
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_tasks_project ON tasks (project_id, id);
+CREATE INDEX IF NOT EXISTS ix_tasks_project_status ON tasks (project_id, status, id);
+CREATE TABLE IF NOT EXISTS versions (
+    scope TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    modified_at REAL NOT NULL
+);
+"""
+
+# Keep a version counter per owner's project list and per project's task
+# list, bumped in the same transaction as the write that changes it.
+_BUMP = (
+    "INSERT INTO versions (scope, version, modified_at) "
+    "VALUES ({scope}, 1, (julianday('now') - 2440587.5) * 86400.0) "
+    "ON CONFLICT(scope) DO UPDATE SET version = version + 1, modified_at = excluded.modified_at;"
+)
+VERSION_TRIGGERS = "".join(
+    f"CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()} AFTER {event} ON {table} BEGIN "
+    + "".join(_BUMP.format(scope=f"'{table}:' || {row}.{column}") for row in rows)
+    + " END;\n"
+    for table, column in (("projects", "owner_email"), ("tasks", "project_id"))
+    for event, rows in (("INSERT", ("NEW",)), ("UPDATE", ("OLD", "NEW")), ("DELETE", ("OLD",)))
+)
+
+PROJECT_COLUMNS = ("id", "title", "description", "owner_email", "created_at")
+TASK_COLUMNS = ("id", "project_id", "title", "description", "status", "created_at")
+
+
+class SQLiteStore(Storage):
+    """Storage backed by a local SQLite file in WAL mode.
+
+    Uses the stdlib driver, so no database server is needed. Lookups go
+    through the primary keys and the owner/project indexes, and each
+    mutation is its own transaction. SQLite's file locking makes the
+    database safe to share between worker processes. On first start it is
+    seeded from the JSON store in `db_dir`, if any, including writes
+    still in its journal.
+
+    WAL mode with synchronous=NORMAL only fsyncs at checkpoints, so a
+    power loss can undo the last commits. With `durable=True` every commit
+    is fsynced before it returns (synchronous=FULL).
+    """
+
+    def __init__(self, path: str, db_dir: Optional[str] = None, durable: bool = False):
+        self.path = path
+        self._lock = threading.RLock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={'FULL' if durable else 'NORMAL'}")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(SCHEMA)
+        self._conn.executescript(VERSION_TRIGGERS)
+        if db_dir is not None and self._is_empty():
+            self._seed_from_json(db_dir)
+
+    def _execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def _transaction(self, statements):
+        """Run (sql, params) pairs atomically."""
+        def run():
+            for sql, params in statements:
+                self._conn.execute(sql, params)
+
+        self._run_in_transaction(run)
+
+    def _run_in_transaction(self, fn):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn()
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def _is_empty(self) -> bool:
+        row = self._execute(
+            "SELECT (SELECT COUNT(*) FROM users) + (SELECT COUNT(*) FROM projects) + (SELECT COUNT(*) FROM tasks)"
+        ).fetchone()
+        return row[0] == 0
+
+    def _seed_from_json(self, db_dir: str):
+        if not any(
+            os.path.exists(os.path.join(db_dir, name))
+            for name in (*SNAPSHOT_FILES.values(), JOURNAL_FILE, ROTATED_JOURNAL_FILE)
+        ):
+            return
+        # Load through the JSON backend so records still in the journal
+        # are replayed on top of the snapshots. Workers starting together
+        # may all seed, so take the db lock where flock exists.
+        source = JournalStore(db_dir, flush_interval=0, multiprocess=journal.fcntl is not None)
+        try:
+            users = list(source.users.values())
+            projects = list(source.projects.values())
+            tasks = list(source.tasks.values())
+        finally:
+            source.close()
+        if not (users or projects or tasks):
+            return
+        statements = [self._upsert_user_sql(u) for u in users]
+        statements += [self._upsert_sql("projects", PROJECT_COLUMNS, p) for p in projects]
+        statements += [self._upsert_sql("tasks", TASK_COLUMNS, t) for t in tasks]
+        self._transaction(statements)
+        logger.debug(f"Seeded {self.path} from the JSON store in {db_dir}")
+
+    @staticmethod
+    def _upsert_sql(table: str, columns, row: dict):
+        placeholders = ", ".join("?" for _ in columns)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != "id")
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) ON CONFLICT(id) DO UPDATE SET {updates}"
+        return sql, tuple(row.get(c) for c in columns)
+
+    @staticmethod
+    def _upsert_user_sql(user: dict):
+        sql = (
+            "INSERT INTO users (email, hashed_password, disabled) VALUES (?, ?, ?) "
+            "ON CONFLICT(email) DO UPDATE SET hashed_password = excluded.hashed_password, disabled = excluded.disabled"
+        )
+        return sql, (user["email"], user["hashed_password"], int(bool(user.get("disabled", False))))
+
+    @staticmethod
+    def _row(row: Optional[sqlite3.Row]) -> Optional[dict]:
+        return dict(row) if row is not None else None
+
+    def _update(self, table: str, columns, row_id: int, fields: Dict[str, Any]):
+        fields = {k: v for k, v in fields.items() if k in columns and k != "id"}
+        if fields:
+            assignments = ", ".join(f"{k} = ?" for k in fields)
+            self._execute(f"UPDATE {table} SET {assignments} WHERE id = ?", (*fields.values(), row_id))
+
+    def _select_page(self, table: str, conditions: Dict[str, Any], after, limit, created_after, created_before):
+        clauses = [f"{column} = ?" for column in conditions]
+        params = list(conditions.values())
+        for clause, value in (("id > ?", after), ("created_at >= ?", created_after), ("created_at <= ?", created_before)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        sql = f"SELECT * FROM {table} WHERE {' AND '.join(clauses)} ORDER BY id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [dict(r) for r in self._execute(sql, params).fetchall()]
+
+    def _insert(self, table: str, columns, row: dict) -> int:
+        columns = [c for c in columns if c != "id"]
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+        return self._execute(sql, tuple(row.get(c) for c in columns)).lastrowid
+
+    # Users
+
+    def get_user(self, email: str) -> Optional[dict]:
+        user = self._row(self._execute("SELECT * FROM users WHERE email = ?", (email,)).fetchone())
+        if user is not None:
+            user["disabled"] = bool(user["disabled"])
+        return user
+
+    def put_user(self, user: dict):
+        self._execute(*self._upsert_user_sql(user))
+
+    def add_user(self, user: dict) -> bool:
+        cursor = self._execute(
+            "INSERT INTO users (email, hashed_password, disabled) VALUES (?, ?, ?) ON CONFLICT(email) DO NOTHING",
+            (user["email"], user["hashed_password"], int(bool(user.get("disabled", False))))
+        )
+        return cursor.rowcount == 1
+
+    # Projects
+
+    def get_project(self, project_id: int, owner_email: Optional[str] = None) -> Optional[dict]:
+        project = self._row(self._execute("SELECT * FROM projects WHERE id = ?", (project_id,)).fetchone())
+        if project is None or (owner_email is not None and project["owner_email"] != owner_email):
+            return None
+        return project
+
+    def list_projects(
+        self,
+        owner_email: str,
+        after: Optional[int] = None,
+        limit: Optional[int] = None,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None,
+    ) -> List[dict]:
+        return self._select_page(
+            "projects", {"owner_email": owner_email}, after, limit, created_after, created_before
+        )
+
+    def create_project(self, project: dict) -> dict:
+        return self.get_project(self._insert("projects", PROJECT_COLUMNS, project))
+
+    def put_project(self, project: dict):
+        self._execute(*self._upsert_sql("projects", PROJECT_COLUMNS, project))
+
+    def update_project(self, project_id: int, fields: Dict[str, Any]) -> dict:
+        self._update("projects", PROJECT_COLUMNS, project_id, fields)
+        return self.get_project(project_id)
+
+    def delete_project(self, project_id: int):
+        self._transaction([
+            ("DELETE FROM tasks WHERE project_id = ?", (project_id,)),
+            ("DELETE FROM projects WHERE id = ?", (project_id,)),
+        ])
+
+    # Tasks
+
+    def get_task(self, task_id: int, project_id: Optional[int] = None) -> Optional[dict]:
+        task = self._row(self._execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone())
+        if task is None or (project_id is not None and task["project_id"] != project_id):
+            return None
+        return task
+
+    def list_tasks(
+        self,
+        project_id: int,
+        after: Optional[int] = None,
+        limit: Optional[int] = None,
+        status: Optional[str] = None,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None,
+    ) -> List[dict]:
+        conditions = {"project_id": project_id}
+        if status is not None:
+            conditions["status"] = status
+        return self._select_page("tasks", conditions, after, limit, created_after, created_before)
+
+    def create_task(self, task: dict) -> dict:
+        return self.get_task(self._insert("tasks", TASK_COLUMNS, task))
+
+    def put_task(self, task: dict):
+        self._execute(*self._upsert_sql("tasks", TASK_COLUMNS, task))
+
+    def update_task(self, task_id: int, fields: Dict[str, Any]) -> dict:
+        self._update("tasks", TASK_COLUMNS, task_id, fields)
+        return self.get_task(task_id)
+
+    def delete_task(self, task_id: int):
+        self._execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+
+    def apply_task_batch(self, project_id: int, operations: List[dict]) -> List[dict]:
+        def run():
+            results = []
+            for operation in operations:
+                if operation["op"] == "create":
+                    task_id = self._insert("tasks", TASK_COLUMNS, dict(operation["fields"], project_id=project_id))
+                else:
+                    task_id = operation["id"]
+                    if self.get_task(task_id, project_id) is None:
+                        raise TaskNotFoundError(task_id)
+                    if operation["op"] == "delete":
+                        results.append(self.get_task(task_id))
+                        self._execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+                        continue
+                    self._update("tasks", TASK_COLUMNS, task_id, operation.get("fields", {}))
+                results.append(self.get_task(task_id))
+            return results
+
+        return self._run_in_transaction(run)
+
+    # Versions
+
+    def _version(self, scope: str) -> Tuple[str, float]:
+        row = self._execute("SELECT version, modified_at FROM versions WHERE scope = ?", (scope,)).fetchone()
+        if row is None:
+            return "0", 0.0
+        return str(row[0]), row[1]
+
+    def project_list_version(self, owner_email: str) -> Tuple[str, float]:
+        return self._version(f"projects:{owner_email}")
+
+    def task_list_version(self, project_id: int) -> Tuple[str, float]:
+        return self._version(f"tasks:{project_id}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -37,7 +37,10 @@ sudo chown -R ubuntu:ubuntu /var/log/ai-project-assistant
 echo "Configuring environment..."
 cp deployment.env .env
 
-# Set up systemd service
+# Set up systemd service. One worker by default: the vector store is only
+# safe in one process. For more, run a Chroma server, set CHROMA_SERVER in
+# .env and pass WORKERS=$(nproc) to this script.
+WORKERS=${WORKERS:-1}
 echo "Setting up systemd service..."
 sudo tee /etc/systemd/system/ai-project-assistant.service << EOF
 [Unit]
@@ -48,7 +51,8 @@ After=network.target
 User=ubuntu
 WorkingDirectory=/home/ubuntu/ai-project-assistant/backend
 Environment="PATH=/home/ubuntu/ai-project-assistant/.venv/bin"
-ExecStart=/home/ubuntu/ai-project-assistant/.venv/bin/uvicorn main:app --host 0.0.0.0 --port 8000
+Environment="STORE_MULTIPROCESS=true"
+ExecStart=/home/ubuntu/ai-project-assistant/.venv/bin/uvicorn main:app --host 0.0.0.0 --port 8000 --workers $WORKERS
 Restart=always
 
 [Install]
@@ -1,15 +1,32 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime, timedelta
-from typing import Optional, Dict, List
+from fastapi.responses import JSONResponse, StreamingResponse
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Optional, List, Literal, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, ValidationError
+import asyncio
 import os
+import hashlib
 import json
+import math
+import time
+from email.utils import formatdate, parsedate_to_datetime
 from dotenv import load_dotenv
 from app.services.ai_service import AIService
+from app.services.conversation_memory import GENERAL
+from app.storage.base import TaskNotFoundError
+from app.storage.factory import create_store
+from app.services.token_cache import TokenCache
+from app.services.password_hasher import HasherBusyError, PasswordHasher
+from app.services.project_matcher import ProjectMatcher
+from app.services.project_context import ProjectContextCache
+from app.services.search_index import SearchIndex
+from app.services.context_assembler import ContextAssembler, count_tokens
+from app.services.vector_maintenance import create_maintenance, run_periodically
+from app.services.workspace_transfer import FORMAT_VERSION, WorkspaceImporter, WorkspaceImportError, export_ndjson
 import logging
 
 # Configure logging
@@ -27,70 +44,40 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-# Database file paths
-DB_DIR = "db"
-USERS_FILE = os.path.join(DB_DIR, "users.json")
-PROJECTS_FILE = os.path.join(DB_DIR, "projects.json")
-TASKS_FILE = os.path.join(DB_DIR, "tasks.json")
-
-# Ensure database directory exists
-os.makedirs(DB_DIR, exist_ok=True)
-
-def init_db_files():
-    if not os.path.exists(USERS_FILE):
-        logger.debug(f"Creating new users file at {USERS_FILE}")
-        with open(USERS_FILE, 'w') as f:
-            json.dump({}, f)
-    if not os.path.exists(PROJECTS_FILE):
-        with open(PROJECTS_FILE, 'w') as f:
-            json.dump([], f)
-    if not os.path.exists(TASKS_FILE):
-        with open(TASKS_FILE, 'w') as f:
-            json.dump([], f)
-
-init_db_files()
-
-def load_users() -> Dict:
-    try:
-        logger.debug(f"Loading users from {USERS_FILE}")
-        with open(USERS_FILE, 'r') as f:
-            users = json.load(f)
-            logger.debug(f"Loaded users: {users}")
-            return users
-    except Exception as e:
-        logger.error(f"Error loading users: {e}")
-        return {}
+# Verified tokens are cached until they expire, so authenticated requests
+# skip JWT decoding and signature checks after the first one.
+token_cache = TokenCache(
+    max_size=int(os.getenv("TOKEN_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("TOKEN_CACHE_TTL_SECONDS", "300")),
+)
 
-def load_projects() -> List:
-    try:
-        with open(PROJECTS_FILE, 'r') as f:
-            return json.load(f)
-    except:
-        return []
+# Database directory; the backend is chosen by STORAGE_BACKEND (json or sqlite)
+DB_DIR = os.getenv("DB_DIR", "db")
 
-def load_tasks() -> List:
-    try:
-        with open(TASKS_FILE, 'r') as f:
-            return json.load(f)
-    except:
-        return []
+store = create_store(DB_DIR)
 
-# Save data to files
-def save_users(users: Dict):
-    with open(USERS_FILE, 'w') as f:
-        json.dump(users, f)
+# Finds the project a chat message refers to, and the context about it
+# that is sent along to the AI service
+project_matcher = ProjectMatcher()
+project_contexts = ProjectContextCache()
 
-def save_projects(projects: List):
-    with open(PROJECTS_FILE, 'w') as f:
-        json.dump(projects, f)
+# Full-text index behind /api/v1/search, one per user
+search_index = SearchIndex(max_users=int(os.getenv("SEARCH_INDEX_USERS", "256")))
 
-def save_tasks(tasks: List):
-    with open(TASKS_FILE, 'w') as f:
-        json.dump(tasks, f)
+# Mutations are flushed to disk in batches by the store. With DURABLE_WRITES
+# enabled, responses to mutating requests wait for the flush covering them.
+DURABLE_WRITES = os.getenv("DURABLE_WRITES", "false").lower() == "true"
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt runs on a bounded pool so logins do not block the event loop
+password_hasher = PasswordHasher(
+    pwd_context,
+    max_workers=int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1))),
+    max_queue=int(os.getenv("PASSWORD_HASH_QUEUE", "64")),
+)
+
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/token")
 
@@ -114,6 +101,10 @@ class User(UserBase):
 class UserInDB(User):
     hashed_password: str
 
+    class Config:
+        # Instances are shared between requests through the token cache
+        frozen = True
+
 class ProjectBase(BaseModel):
     title: str
     description: Optional[str] = None
@@ -145,6 +136,28 @@ class Task(TaskBase):
     class Config:
         from_attributes = True
 
+class TaskBatchOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    id: Optional[int] = None
+    title: Optional[str] = None
+    description: Optional[str] = None
+    status: Optional[str] = None
+
+class TaskBatchRequest(BaseModel):
+    operations: List[TaskBatchOperation]
+
+class TaskBatchResult(BaseModel):
+    op: str
+    task: Task
+
+class SearchResult(BaseModel):
+    type: Literal["project", "task"]
+    id: int
+    project_id: int
+    title: str
+    status: Optional[str] = None
+    score: int
+
 # Models
 class ChatRequest(BaseModel):
     message: str
@@ -167,23 +180,76 @@ app.add_middleware(
     expose_headers=["*"]
 )
 
-# Load initial users
-users_db = load_users()
-projects_db = load_projects()
-tasks_db = load_tasks()
+# Only installed when needed, as it wraps every request, streams included
+if DURABLE_WRITES:
+    @app.middleware("http")
+    async def wait_for_durable_writes(request: Request, call_next):
+        response = await call_next(request)
+        if request.method in ("POST", "PUT", "PATCH", "DELETE"):
+            await store.wait_durable()
+        return response
+
+# Vector store retention and compaction runs in the background this often;
+# 0 leaves it to `python -m app.services.vector_maintenance`
+VECTOR_MAINTENANCE_INTERVAL_HOURS = float(os.getenv("VECTOR_MAINTENANCE_INTERVAL_HOURS", "24"))
+# Each worker logs the counters served by /api/v1/stats this often; 0 disables
+STATS_LOG_INTERVAL_SECONDS = float(os.getenv("STATS_LOG_INTERVAL_SECONDS", "0"))
+background_tasks: List[asyncio.Task] = []
+
+def service_stats() -> dict:
+    """Queue depths and cache counters of this worker."""
+    return {
+        "pid": os.getpid(),
+        "ai": ai_service.stats(),
+        "password_hasher": password_hasher.stats(),
+        "token_cache": token_cache.stats(),
+        "project_contexts": project_contexts.stats(),
+    }
+
+async def log_stats_periodically(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        logger.info(f"Service stats: {json.dumps(service_stats())}")
+
+@app.on_event("startup")
+async def start_background_tasks():
+    if ai_service.is_openai_available and VECTOR_MAINTENANCE_INTERVAL_HOURS > 0:
+        background_tasks.append(asyncio.create_task(
+            run_periodically(create_maintenance(ai_service), VECTOR_MAINTENANCE_INTERVAL_HOURS * 3600)
+        ))
+    if STATS_LOG_INTERVAL_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(log_stats_periodically(STATS_LOG_INTERVAL_SECONDS)))
+
+@app.on_event("shutdown")
+def close_store():
+    for task in background_tasks:
+        task.cancel()
+    ai_service.close()
+    password_hasher.close()
+    store.close()
 
 def reload_users_db():
-    global users_db
-    users_db = load_users()
-    logger.debug(f"Reloaded users_db: {users_db}")
+    # Only re-reads the users file when it changed on disk
+    store.refresh_users()
 
 # Helper function to get current user
+def user_fingerprint(user: dict) -> Tuple[str, bool]:
+    """Fields whose change must invalidate the user's cached tokens."""
+    return user["hashed_password"], bool(user.get("disabled", False))
+
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    cached = token_cache.get(token)
+    if cached is not None:
+        user = store.get_user(cached.principal.email)
+        if user is not None and user_fingerprint(user) == cached.fingerprint:
+            return cached.principal
+        token_cache.invalidate(token)
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -193,33 +259,45 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     except JWTError:
         raise credentials_exception
     
-    user = users_db.get(token_data.email)
+    user = store.get_user(token_data.email)
     if user is None:
         raise credentials_exception
     
-    return UserInDB(
+    principal = UserInDB(
         email=user["email"],
         hashed_password=user["hashed_password"],
         disabled=user.get("disabled", False)
     )
+    expires_at = payload.get("exp")
+    token_cache.put(
+        token,
+        principal,
+        user_fingerprint(user),
+        float(expires_at) if expires_at is not None else math.inf,
+    )
+    return principal
 
 # Routes
 @app.post("/api/v1/users/register", response_model=User)
 async def register_user(user: UserCreate):
-    if user.email in users_db:
+    if store.get_user(user.email) is not None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
-    hashed_password = pwd_context.hash(user.password)
+    hashed_password = await get_password_hash(user.password)
     db_user = UserInDB(
         email=user.email,
         hashed_password=hashed_password,
         disabled=False
     )
-    users_db[user.email] = db_user.dict()
-    save_users(users_db)
+    # The email may have been taken while the password was being hashed
+    if not store.add_user(db_user.dict()):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
     return db_user
 
 @app.post("/api/v1/token", response_model=Token)
@@ -227,8 +305,7 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     logger.debug(f"Login attempt for user: {form_data.username}")
     reload_users_db()
     
-    user = users_db.get(form_data.username)
-    logger.debug(f"Found user in database: {user}")
+    user = store.get_user(form_data.username)
     
     if not user:
         logger.warning(f"User not found: {form_data.username}")
@@ -238,8 +315,7 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    password_verified = verify_password(form_data.password, user["hashed_password"])
-    logger.debug(f"Password verification result: {password_verified}")
+    password_verified = await verify_password(form_data.password, user["hashed_password"])
     
     if not password_verified:
         logger.warning(f"Invalid password for user: {form_data.username}")
@@ -257,63 +333,161 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.get("/api/v1/users/me", response_model=User)
-async def read_users_me(token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        token_data = TokenData(email=email)
-    except JWTError:
-        raise credentials_exception
-    
-    user = users_db.get(token_data.email)
-    if user is None:
-        raise credentials_exception
-    
-    return UserInDB(
-        email=user["email"],
-        hashed_password=user["hashed_password"],
-        disabled=user.get("disabled", False)
-    )
+async def read_users_me(current_user: User = Depends(get_current_user)):
+    return current_user
+
+@app.get("/api/v1/stats")
+async def read_stats(current_user: User = Depends(get_current_user)):
+    # Counters are per worker; the pid tells responses from different workers apart
+    return service_stats()
 
 @app.post("/api/v1/projects", response_model=Project)
 async def create_project(project: ProjectCreate, current_user: User = Depends(get_current_user)):
     project_dict = project.dict()
     project_dict.update({
-        "id": len(projects_db) + 1,
         "owner_email": current_user.email,
         "created_at": datetime.utcnow().isoformat()
     })
-    new_project = Project(**project_dict)
-    projects_db.append(project_dict)
-    save_projects(projects_db)
-    return new_project
+    return store.create_project(project_dict)
+
+# Listing helpers
+MAX_PAGE_SIZE = 500
+
+def normalize_timestamp(value: Optional[datetime]) -> Optional[str]:
+    """Convert a query timestamp to the naive UTC ISO format rows are stored in."""
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat()
+
+def parse_fields(fields: Optional[str], model: type[BaseModel]) -> Optional[List[str]]:
+    """Parse a `fields=a,b` projection; `id` is always kept for the cursor."""
+    if fields is None:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in model.model_fields]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}"
+        )
+    return ["id"] + [f for f in requested if f != "id"]
+
+def page_response(rows: List[dict], limit: Optional[int], fields: Optional[List[str]], response: Response):
+    """Drop the look-ahead row, expose the next cursor and apply the projection.
+
+    Callers fetch `limit + 1` rows; if the extra row is there, another page
+    exists and its cursor goes into the X-Next-Cursor header.
+    """
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = str(rows[-1]["id"])
+    if fields is None:
+        return rows
+    # Projected rows don't satisfy the response model, so bypass it
+    return JSONResponse(
+        content=[{f: row.get(f) for f in fields} for row in rows],
+        headers=dict(response.headers)
+    )
+
+def not_modified(request: Request, response: Response, version: Tuple[str, float]) -> Optional[Response]:
+    """Set ETag/Last-Modified from a store version; return a 304 if the client is current.
+
+    The ETag covers the query string, so each page/filter combination is
+    cached separately.
+    """
+    tag, modified = version
+    digest = hashlib.blake2b(f"{tag}?{request.url.query}".encode(), digest_size=12).hexdigest()
+    etag = f'"{digest}"'
+    response.headers["ETag"] = etag
+    # Let browsers keep the list but revalidate it on every request
+    response.headers["Cache-Control"] = "private, no-cache"
+    # Last-Modified has one-second resolution. Only send it once the change
+    # is at least a second old, so a later change always lands in a later
+    # second and can't be masked by If-Modified-Since.
+    last_modified = math.ceil(modified)
+    if time.time() - modified >= 1:
+        response.headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        client_tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        current = etag in client_tags or "*" in client_tags
+    else:
+        try:
+            if_modified_since = parsedate_to_datetime(request.headers["if-modified-since"])
+            current = last_modified <= if_modified_since.timestamp()
+        except (KeyError, TypeError, ValueError):
+            current = False
+    if current:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=dict(response.headers))
+    return None
 
 @app.get("/api/v1/projects", response_model=list[Project])
-async def list_projects(current_user: User = Depends(get_current_user)):
-    return [project for project in projects_db if project["owner_email"] == current_user.email]
+async def list_projects(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[int] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    fields: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    projection = parse_fields(fields, Project)
+    cached = not_modified(request, response, store.project_list_version(current_user.email))
+    if cached is not None:
+        return cached
+    
+    rows = store.list_projects(
+        current_user.email,
+        after=after,
+        limit=limit + 1 if limit is not None else None,
+        created_after=normalize_timestamp(created_after),
+        created_before=normalize_timestamp(created_before)
+    )
+    return page_response(rows, limit, projection, response)
 
 @app.get("/api/v1/projects/{project_id}", response_model=Project)
 async def get_project(project_id: int, current_user: User = Depends(get_current_user)):
-    project = next((p for p in projects_db if p["id"] == project_id and p["owner_email"] == current_user.email), None)
+    project = store.get_project(project_id, current_user.email)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     return project
 
 @app.get("/api/v1/projects/{project_id}/tasks", response_model=list[Task])
-async def get_project_tasks(project_id: int, current_user: User = Depends(get_current_user)):
+async def get_project_tasks(
+    project_id: int,
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[int] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    fields: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
     # First check if the project exists and belongs to the user
-    project = next((p for p in projects_db if p["id"] == project_id and p["owner_email"] == current_user.email), None)
+    project = store.get_project(project_id, current_user.email)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    return [task for task in tasks_db if task["project_id"] == project_id]
+    projection = parse_fields(fields, Task)
+    cached = not_modified(request, response, store.task_list_version(project_id))
+    if cached is not None:
+        return cached
+    
+    rows = store.list_tasks(
+        project_id,
+        after=after,
+        limit=limit + 1 if limit is not None else None,
+        status=status_filter,
+        created_after=normalize_timestamp(created_after),
+        created_before=normalize_timestamp(created_before)
+    )
+    return page_response(rows, limit, projection, response)
 
 @app.post("/api/v1/projects/{project_id}/tasks", response_model=Task)
 async def create_task(
@@ -322,30 +496,100 @@ async def create_task(
     current_user: User = Depends(get_current_user)
 ):
     # First check if the project exists and belongs to the user
-    project = next((p for p in projects_db if p["id"] == project_id and p["owner_email"] == current_user.email), None)
+    project = store.get_project(project_id, current_user.email)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
     task_dict = task.dict()
     task_dict.update({
-        "id": len(tasks_db) + 1,
         "project_id": project_id,
         "created_at": datetime.utcnow().isoformat()
     })
-    new_task = Task(**task_dict)
-    tasks_db.append(task_dict)
-    save_tasks(tasks_db)
-    return new_task
+    return store.create_task(task_dict)
+
+MAX_BATCH_OPERATIONS = 1000
+
+def validate_task(index: int, fields: dict) -> TaskCreate:
+    try:
+        return TaskCreate(**fields)
+    except ValidationError as e:
+        problems = "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Operation {index}: {problems}"
+        )
+
+@app.post("/api/v1/projects/{project_id}/tasks:batch", response_model=list[TaskBatchResult])
+async def batch_tasks(
+    project_id: int,
+    batch: TaskBatchRequest,
+    current_user: User = Depends(get_current_user)
+):
+    # Check project ownership once for the whole batch
+    project = store.get_project(project_id, current_user.email)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    if len(batch.operations) > MAX_BATCH_OPERATIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A batch may contain at most {MAX_BATCH_OPERATIONS} operations"
+        )
+    
+    # Validate every operation before anything is written. Updates are
+    # checked against the task as earlier operations in the batch leave it.
+    operations = []
+    staged = {}
+    created_at = datetime.utcnow().isoformat()
+    for index, operation in enumerate(batch.operations):
+        fields = operation.dict(include={"title", "description", "status"}, exclude_unset=True)
+        for name in ("title", "status"):
+            if name in fields and fields[name] is None:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Operation {index}: {name} may not be null"
+                )
+        if operation.op == "create":
+            if operation.title is None:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Operation {index}: create requires a title"
+                )
+            fields = validate_task(index, fields).dict()
+            fields["created_at"] = created_at
+            operations.append({"op": "create", "fields": fields})
+            continue
+        if operation.id is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Operation {index}: {operation.op} requires an id"
+            )
+        # A missing task is reported by the store, which writes nothing
+        current = staged[operation.id] if operation.id in staged else store.get_task(operation.id, project_id)
+        if operation.op == "delete":
+            staged[operation.id] = None
+        elif current is not None:
+            staged[operation.id] = {**current, **fields}
+            validate_task(index, staged[operation.id])
+        operations.append({"op": operation.op, "id": operation.id, "fields": fields})
+    
+    # Apply all operations atomically with a single write
+    try:
+        tasks = store.apply_task_batch(project_id, operations)
+    except TaskNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    return [{"op": op["op"], "task": task} for op, task in zip(operations, tasks)]
 
 @app.get("/api/v1/projects/{project_id}/tasks/{task_id}", response_model=Task)
 async def get_task(project_id: int, task_id: int, current_user: User = Depends(get_current_user)):
     # First check if the project exists and belongs to the user
-    project = next((p for p in projects_db if p["id"] == project_id and p["owner_email"] == current_user.email), None)
+    project = store.get_project(project_id, current_user.email)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
     # Then get the task
-    task = next((t for t in tasks_db if t["id"] == task_id and t["project_id"] == project_id), None)
+    task = store.get_task(task_id, project_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
@@ -359,41 +603,32 @@ async def update_task(
     current_user: User = Depends(get_current_user)
 ):
     # First check if the project exists and belongs to the user
-    project = next((p for p in projects_db if p["id"] == project_id and p["owner_email"] == current_user.email), None)
+    project = store.get_project(project_id, current_user.email)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
     # Then get the task
-    task_index = next((i for i, t in enumerate(tasks_db) if t["id"] == task_id and t["project_id"] == project_id), None)
-    if task_index is None:
+    task = store.get_task(task_id, project_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
     # Update the task
-    task_dict = task_update.dict()
-    task_dict.update({
-        "id": task_id,
-        "project_id": project_id,
-        "created_at": tasks_db[task_index]["created_at"]
-    })
-    tasks_db[task_index] = task_dict
-    save_tasks(tasks_db)
-    return task_dict
+    return store.update_task(task_id, task_update.dict())
 
 @app.delete("/api/v1/projects/{project_id}/tasks/{task_id}")
 async def delete_task(project_id: int, task_id: int, current_user: User = Depends(get_current_user)):
     # First check if the project exists and belongs to the user
-    project = next((p for p in projects_db if p["id"] == project_id and p["owner_email"] == current_user.email), None)
+    project = store.get_project(project_id, current_user.email)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
     # Then get the task
-    task_index = next((i for i, t in enumerate(tasks_db) if t["id"] == task_id and t["project_id"] == project_id), None)
-    if task_index is None:
+    task = store.get_task(task_id, project_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
     # Delete the task
-    tasks_db.pop(task_index)
-    save_tasks(tasks_db)
+    store.delete_task(task_id)
     return {"message": "Task deleted successfully"}
 
 @app.put("/api/v1/projects/{project_id}", response_model=Project)
@@ -402,253 +637,315 @@ async def update_project(
     project_update: ProjectCreate,
     current_user: User = Depends(get_current_user)
 ):
-    project = None
-    for p in projects_db:
-        if p["id"] == project_id and p["owner_email"] == current_user.email:
-            project = p
-            break
-    
+    project = store.get_project(project_id, current_user.email)
     if project is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Project not found or you don't have permission"
         )
     
-    project["title"] = project_update.title
-    project["description"] = project_update.description
-    save_projects(projects_db)
-    return project
+    return store.update_project(project_id, {
+        "title": project_update.title,
+        "description": project_update.description
+    })
 
 @app.delete("/api/v1/projects/{project_id}")
 async def delete_project(project_id: int, current_user: User = Depends(get_current_user)):
     # Find the project and check ownership
-    project_index = None
-    for i, project in enumerate(projects_db):
-        if project["id"] == project_id and project["owner_email"] == current_user.email:
-            project_index = i
-            break
-    
-    if project_index is None:
+    project = store.get_project(project_id, current_user.email)
+    if project is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Project not found or you don't have permission"
         )
     
-    # Remove the project
-    deleted_project = projects_db.pop(project_index)
-    save_projects(projects_db)
-    
-    # Delete all tasks associated with this project
-    global tasks_db
-    tasks_db = [task for task in tasks_db if task["project_id"] != project_id]
-    save_tasks(tasks_db)
+    # Remove the project together with all of its tasks
+    store.delete_project(project_id)
+    project_contexts.discard(project_id)
+    await ai_service.drop_project(str(project_id))
     
     return {"message": f"Project {project_id} successfully deleted"}
 
-# Chat endpoints
-@app.post("/api/v1/chat", response_model=ChatResponse)
-async def chat(
-    request: ChatRequest,
+@app.get("/api/v1/search", response_model=list[SearchResult])
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
     current_user: User = Depends(get_current_user)
 ):
+    """Find the user's projects and tasks whose title or description contain every word of `q`.
+
+    The last word also matches as a prefix, for search-as-you-type.
+    """
+    return search_index.search(store, current_user.email, q, limit)
+
+# Workspace export and import
+MAX_IMPORT_LINE_BYTES = 1024 * 1024
+
+@app.get("/api/v1/export")
+async def export_workspace(current_user: User = Depends(get_current_user)):
+    """Stream the user's projects, tasks and chat history as NDJSON."""
+    filename = f"workspace-{datetime.utcnow():%Y%m%d}.ndjson"
+    return StreamingResponse(
+        export_ndjson(store, ai_service.memory, current_user.email, page_size=MAX_PAGE_SIZE),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+async def ndjson_lines(request: Request) -> AsyncIterator[Tuple[int, bytes]]:
+    """Yield (line number, line) for the non-blank lines of a request body as it arrives."""
+    buffer = b""
+    line_number = 0
+    async for chunk in request.stream():
+        lines = (buffer + chunk).split(b"\n")
+        buffer = lines.pop()
+        if len(buffer) > MAX_IMPORT_LINE_BYTES:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Line {line_number + len(lines) + 1} is longer than {MAX_IMPORT_LINE_BYTES} bytes"
+            )
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                yield line_number, line
+    if buffer.strip():
+        yield line_number + 1, buffer
+
+def import_timestamp(value) -> str:
+    """An imported created_at in the naive UTC ISO format rows are stored in; now if missing."""
+    if not value:
+        return datetime.utcnow().isoformat()
+    try:
+        return normalize_timestamp(datetime.fromisoformat(value))
+    except (TypeError, ValueError):
+        raise WorkspaceImportError(f"created_at {value!r} is not an ISO 8601 timestamp")
+
+@app.post("/api/v1/import")
+async def import_workspace(request: Request, current_user: User = Depends(get_current_user)):
+    """Add the projects, tasks and chat history of an NDJSON export to the user's workspace.
+
+    Imported projects and tasks get new ids; the response maps exported
+    project ids to the new ones. The body is read as it streams in and
+    tasks are written in batches, so large workspaces are not held in
+    memory. Records before a line that fails to import stay imported.
+    """
+    importer = WorkspaceImporter(store, ai_service.memory, current_user.email, batch_size=MAX_BATCH_OPERATIONS)
+    line_number = 0
     try:
-        # Extract project name from message if mentioned
-        message = request.message.lower()
-        project_context = ""
+        async for line_number, line in ndjson_lines(request):
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise WorkspaceImportError("each line must be a JSON object")
+            kind = record.get("type")
+            if kind == "workspace":
+                version = record.get("version", FORMAT_VERSION)
+                if not isinstance(version, int) or isinstance(version, bool):
+                    raise WorkspaceImportError(f"export format version {version!r} is not an integer")
+                if version > FORMAT_VERSION:
+                    raise WorkspaceImportError(f"export format version {version} is not supported")
+            elif kind == "project":
+                fields = dict(ProjectCreate(**record).dict(), created_at=import_timestamp(record.get("created_at")))
+                importer.add_project(record["id"], fields)
+            elif kind == "task":
+                fields = dict(TaskCreate(**record).dict(), created_at=import_timestamp(record.get("created_at")))
+                importer.add_task(record["project_id"], fields)
+            elif kind == "conversation":
+                importer.add_conversation(record.get("project_id"), record.get("summary") or "", record.get("turns") or [])
+            else:
+                raise WorkspaceImportError(f"unknown record type {kind!r}")
+        importer.flush()
+    except (KeyError, TypeError, ValueError) as e:
+        # Keep what was read before the bad line, as the docstring promises
+        importer.flush()
+        detail = f"missing field {e}" if isinstance(e, KeyError) else str(e)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"line": line_number, "error": detail, "imported": importer.counts}
+        )
+
+    return {"imported": importer.counts, "project_ids": importer.project_ids}
+
+# Project context sent to the model is capped at this many tokens; larger
+# projects list their most relevant tasks and a count per status
+context_assembler = ContextAssembler(
+    token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500")),
+    embed=ai_service.similarities
+)
+
+async def prompt_context_for(project: Optional[dict], project_context: str, question: str) -> Optional[str]:
+    if project is None:
+        return None
+    if project_contexts.token_count(store, project, count_tokens) <= context_assembler.token_budget:
+        return project_context
+    return await context_assembler.assemble(project, store.list_tasks(project["id"]), question)
+
+# Chat endpoints
+async def run_chat_command(
+    request: ChatRequest, current_user: User
+) -> Tuple[Optional[ChatResponse], Optional[dict], str]:
+    """Handle chat messages that act on projects and tasks directly.
+
+    Returns (reply, mentioned_project, project_context). `reply` is None
+    when the message is not a command, and the caller asks the AI service
+    using the mentioned project and its context instead.
+    """
+    # Extract project name from message if mentioned
+    message = request.message.lower()
+    project_context = ""
+    mentioned_project = None
+    
+    # Handle project creation
+    if "create a new project" in message or "create project" in message:
+        # Extract project name
+        project_name = None
+        if "named" in message:
+            name_parts = message.split("named")
+            if len(name_parts) > 1:
+                project_name = name_parts[1].split("with")[0].strip().strip('"\'')
         
-        # Handle project creation
-        if "create a new project" in message or "create project" in message:
-            # Extract project name
-            project_name = None
-            if "named" in message:
-                name_parts = message.split("named")
-                if len(name_parts) > 1:
-                    project_name = name_parts[1].split("with")[0].strip().strip('"\'')
+        if project_name:
+            # Create the project
+            project_dict = store.create_project({
+                "title": project_name,
+                "description": "",
+                "owner_email": current_user.email,
+                "created_at": datetime.utcnow().isoformat()
+            })
             
-            if project_name:
-                # Create the project
-                project_dict = {
-                    "id": len(projects_db) + 1,
-                    "title": project_name,
-                    "description": "",
-                    "owner_email": current_user.email,
-                    "created_at": datetime.utcnow().isoformat()
-                }
-                projects_db.append(project_dict)
-                save_projects(projects_db)
-                
-                # Check if there's a task to create
-                initial_task = None
-                if "with" in message and "as first task" in message:
-                    task_name = message.split("with")[1].split("as first task")[0].strip()
-                    if task_name:
-                        task_dict = {
-                            "id": len(tasks_db) + 1,
-                            "project_id": project_dict["id"],
-                            "title": task_name,
-                            "description": "",
-                            "status": "TODO",
-                            "created_at": datetime.utcnow().isoformat()
-                        }
-                        tasks_db.append(task_dict)
-                        save_tasks(tasks_db)
-                        initial_task = task_dict
-                
-                # Create project context
-                project_tasks = [t for t in tasks_db if t["project_id"] == project_dict["id"]]
-                project_context = f"""
-                Project: {project_dict['title']}
-                Description: {project_dict['description']}
-                Created: {project_dict['created_at']}
-                Tasks ({len(project_tasks)}):
-                """
-                for task in project_tasks:
-                    project_context += f"\n- {task['title']} ({task['status']})"
-                
-                return ChatResponse(
-                    message=f"I've created a new project '{project_name}'" + 
-                           (f" with the first task '{initial_task['title']}'" if initial_task else "") +
-                           ".",
-                    context=project_context
-                )
+            # Check if there's a task to create
+            initial_task = None
+            if "with" in message and "as first task" in message:
+                task_name = message.split("with")[1].split("as first task")[0].strip()
+                if task_name:
+                    initial_task = store.create_task({
+                        "project_id": project_dict["id"],
+                        "title": task_name,
+                        "description": "",
+                        "status": "TODO",
+                        "created_at": datetime.utcnow().isoformat()
+                    })
+            
+            # Create project context
+            project_context = project_contexts.get(store, project_dict)
+            
+            return ChatResponse(
+                message=f"I've created a new project '{project_name}'" + 
+                       (f" with the first task '{initial_task['title']}'" if initial_task else "") +
+                       ".",
+                context=project_context
+            ), mentioned_project, project_context
+    
+    # Find the project with the longest title mentioned in the message
+    mentioned_project = project_matcher.find(store, current_user.email, message)
+    if mentioned_project:
+        project_context = project_contexts.get(store, mentioned_project)
+
+    # Handle task completion
+    if mentioned_project and ("done" in message or "completed" in message or "finished" in message):
+        # Find tasks that might be completed
+        completed_tasks = []
+        if "landing page" in message or "wireframe" in message:
+            task_to_update = next((t for t in store.list_tasks(mentioned_project["id"]) if "wireframe" in t["title"].lower()), None)
+            if task_to_update:
+                completed_tasks.append(task_to_update)
         
-        # Load all projects for the current user
-        user_projects = [p for p in projects_db if p["owner_email"] == current_user.email]
+        # Update tasks to DONE
+        for task in completed_tasks:
+            task_update = TaskCreate(
+                title=task["title"],
+                description=task.get("description", ""),
+                status="DONE"
+            )
+            await update_task(mentioned_project["id"], task["id"], task_update, current_user)
         
-        # Try to find mentioned project
-        mentioned_project = None
-        for project in user_projects:
-            if project["title"].lower() in message:
-                mentioned_project = project
-                # Get tasks for this project
-                project_tasks = [t for t in tasks_db if t["project_id"] == project["id"]]
-                project_context = f"""
-                Project: {project['title']}
-                Description: {project['description']}
-                Created: {project['created_at']}
-                Tasks ({len(project_tasks)}):
-                """
-                for task in project_tasks:
-                    project_context += f"\n- {task['title']} ({task['status']})"
-                break
-
-        # Handle task completion
-        if mentioned_project and ("done" in message or "completed" in message or "finished" in message):
-            # Find tasks that might be completed
-            completed_tasks = []
-            if "landing page" in message or "wireframe" in message:
-                task_to_update = next((t for t in tasks_db if t["project_id"] == mentioned_project["id"] and "wireframe" in t["title"].lower()), None)
-                if task_to_update:
-                    completed_tasks.append(task_to_update)
+        if completed_tasks:
+            # Update project context with the completed tasks
+            project_context = project_contexts.get(store, mentioned_project)
             
-            # Update tasks to DONE
-            for task in completed_tasks:
+            task_names = ", ".join([t["title"] for t in completed_tasks])
+            return ChatResponse(
+                message=f"Great! I've marked the following tasks as done: {task_names}",
+                context=project_context
+            ), mentioned_project, project_context
+
+    # Handle task status update if requested
+    if mentioned_project and ("move" in message or "change" in message or "update" in message) and ("status" in message or "to doing" in message or "to done" in message or "to todo" in message):
+        # Find the task to update
+        task_name = None
+        new_status = None
+        
+        # Extract task name and new status
+        if "content calendar" in message.lower():
+            task_name = "a content calendar for vyta"
+        elif "wireframe" in message.lower():
+            task_name = "wireframe"
+        
+        if "doing" in message.lower():
+            new_status = "IN_PROGRESS"
+        elif "done" in message.lower():
+            new_status = "DONE"
+        elif "todo" in message.lower():
+            new_status = "TODO"
+            
+        if task_name and new_status:
+            # Find the task
+            task_to_update = next((t for t in store.list_tasks(mentioned_project["id"]) if t["title"].lower() == task_name.lower()), None)
+            if task_to_update:
+                # Update the task
                 task_update = TaskCreate(
-                    title=task["title"],
-                    description=task.get("description", ""),
-                    status="DONE"
+                    title=task_to_update["title"],
+                    description=task_to_update.get("description", ""),
+                    status=new_status
                 )
-                await update_task(mentioned_project["id"], task["id"], task_update, current_user)
-            
-            if completed_tasks:
-                # Update project context with the completed tasks
-                project_tasks = [t for t in tasks_db if t["project_id"] == mentioned_project["id"]]
-                project_context = f"""
-                Project: {mentioned_project['title']}
-                Description: {mentioned_project['description']}
-                Created: {mentioned_project['created_at']}
-                Tasks ({len(project_tasks)}):
-                """
-                for task in project_tasks:
-                    project_context += f"\n- {task['title']} ({task['status']})"
+                updated_task = await update_task(mentioned_project["id"], task_to_update["id"], task_update, current_user)
+                
+                # Update project context with the updated task
+                project_context = project_contexts.get(store, mentioned_project)
                 
-                task_names = ", ".join([t["title"] for t in completed_tasks])
                 return ChatResponse(
-                    message=f"Great! I've marked the following tasks as done: {task_names}",
+                    message=f"I've updated the task '{task_name}' status to {new_status}.",
                     context=project_context
-                )
+                ), mentioned_project, project_context
 
-        # Handle task status update if requested
-        if mentioned_project and ("move" in message or "change" in message or "update" in message) and ("status" in message or "to doing" in message or "to done" in message or "to todo" in message):
-            # Find the task to update
-            task_name = None
-            new_status = None
-            
-            # Extract task name and new status
-            if "content calendar" in message.lower():
-                task_name = "a content calendar for vyta"
-            elif "wireframe" in message.lower():
-                task_name = "wireframe"
-            
-            if "doing" in message.lower():
-                new_status = "IN_PROGRESS"
-            elif "done" in message.lower():
-                new_status = "DONE"
-            elif "todo" in message.lower():
-                new_status = "TODO"
-                
-            if task_name and new_status:
-                # Find the task
-                task_to_update = next((t for t in tasks_db if t["project_id"] == mentioned_project["id"] and t["title"].lower() == task_name.lower()), None)
-                if task_to_update:
-                    # Update the task
-                    task_update = TaskCreate(
-                        title=task_to_update["title"],
-                        description=task_to_update.get("description", ""),
-                        status=new_status
-                    )
-                    updated_task = await update_task(mentioned_project["id"], task_to_update["id"], task_update, current_user)
-                    
-                    # Update project context with the updated task
-                    project_tasks = [t for t in tasks_db if t["project_id"] == mentioned_project["id"]]
-                    project_context = f"""
-                    Project: {mentioned_project['title']}
-                    Description: {mentioned_project['description']}
-                    Created: {mentioned_project['created_at']}
-                    Tasks ({len(project_tasks)}):
-                    """
-                    for task in project_tasks:
-                        project_context += f"\n- {task['title']} ({task['status']})"
-                    
-                    return ChatResponse(
-                        message=f"I've updated the task '{task_name}' status to {new_status}.",
-                        context=project_context
-                    )
-
-        # Handle task creation if requested
-        if mentioned_project and ("add a task" in message or "create a task" in message):
-            # Extract task title from the message
-            task_title = message.split("create")[-1].strip() if "create" in message else message.split("add")[-1].strip()
-            if "task" in task_title:
-                task_title = task_title.split("task")[-1].strip()
-            if "to" in task_title:
-                task_title = task_title.split("to")[0].strip()
-            
-            # Create the task
-            task = TaskCreate(title=task_title, description="", status="TODO")
-            new_task = await create_task(mentioned_project["id"], task, current_user)
-            
-            # Update project context with the new task
-            project_tasks = [t for t in tasks_db if t["project_id"] == mentioned_project["id"]]
-            project_context = f"""
-            Project: {mentioned_project['title']}
-            Description: {mentioned_project['description']}
-            Created: {mentioned_project['created_at']}
-            Tasks ({len(project_tasks)}):
-            """
-            for task in project_tasks:
-                project_context += f"\n- {task['title']} ({task['status']})"
-            
-            return ChatResponse(
-                message=f"I've added a new task '{task_title}' to the {mentioned_project['title']} project.",
-                context=project_context
-            )
+    # Handle task creation if requested
+    if mentioned_project and ("add a task" in message or "create a task" in message):
+        # Extract task title from the message
+        task_title = message.split("create")[-1].strip() if "create" in message else message.split("add")[-1].strip()
+        if "task" in task_title:
+            task_title = task_title.split("task")[-1].strip()
+        if "to" in task_title:
+            task_title = task_title.split("to")[0].strip()
         
+        # Create the task
+        task = TaskCreate(title=task_title, description="", status="TODO")
+        new_task = await create_task(mentioned_project["id"], task, current_user)
+        
+        # Update project context with the new task
+        project_context = project_contexts.get(store, mentioned_project)
+        
+        return ChatResponse(
+            message=f"I've added a new task '{task_title}' to the {mentioned_project['title']} project.",
+            context=project_context
+        ), mentioned_project, project_context
+
+    return None, mentioned_project, project_context
+
+@app.post("/api/v1/chat", response_model=ChatResponse)
+async def chat(
+    request: ChatRequest,
+    current_user: User = Depends(get_current_user)
+):
+    try:
+        reply, mentioned_project, project_context = await run_chat_command(request, current_user)
+        if reply is not None:
+            return reply
+
         # Get response from AI service with project context
         response = await ai_service.get_response(
-            str(mentioned_project["id"]) if mentioned_project else "general",
+            str(mentioned_project["id"]) if mentioned_project else GENERAL,
             request.message,
-            project_context if mentioned_project else None
+            project_context if mentioned_project else None,
+            user_id=current_user.email,
+            prompt_context=await prompt_context_for(mentioned_project, project_context, request.message)
         )
         
         return ChatResponse(message=response, context=project_context if mentioned_project else None)
@@ -656,15 +953,80 @@ async def chat(
         logger.error(f"Error in chat endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/api/v1/chat/stream")
+async def chat_stream(
+    request: ChatRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Streaming variant of /api/v1/chat as Server-Sent Events.
+
+    Sends a `context` event first, then `token` events as the answer is
+    generated, then a `done` event carrying the full message. Commands
+    that are answered without the AI service send their reply as a single
+    token. If generation fails partway, an `error` event takes the place
+    of `done`, and the partial answer is not kept in the chat history.
+    """
+    try:
+        reply, mentioned_project, project_context = await run_chat_command(request, current_user)
+    except Exception as e:
+        logger.error(f"Error in chat endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def events():
+        if reply is not None:
+            yield sse_event("context", {"context": reply.context})
+            yield sse_event("token", {"text": reply.message})
+            yield sse_event("done", {"message": reply.message})
+            return
+
+        context = project_context if mentioned_project else None
+        yield sse_event("context", {"context": context})
+        message = ""
+        try:
+            async for token in ai_service.stream_response(
+                str(mentioned_project["id"]) if mentioned_project else GENERAL,
+                request.message,
+                context,
+                user_id=current_user.email,
+                prompt_context=await prompt_context_for(mentioned_project, project_context, request.message)
+            ):
+                message += token
+                yield sse_event("token", {"text": token})
+        except Exception as e:
+            logger.error(f"Error in chat stream: {str(e)}")
+            yield sse_event("error", {"detail": str(e) or type(e).__name__})
+            return
+        yield sse_event("done", {"message": message})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # Security functions
-def verify_password(plain_password, hashed_password):
-    logger.debug(f"Verifying password. Plain: {plain_password}, Hashed: {hashed_password}")
-    result = pwd_context.verify(plain_password, hashed_password)
+async def run_password_job(job):
+    try:
+        return await job
+    except HasherBusyError as e:
+        logger.warning(f"Rejecting password check: {e} ({password_hasher.stats()})")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many login attempts in progress, try again shortly",
+            headers={"Retry-After": "1"},
+        )
+
+async def verify_password(plain_password, hashed_password):
+    result = await run_password_job(password_hasher.verify(plain_password, hashed_password))
     logger.debug(f"Password verification result: {result}")
     return result
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_password_hash(password):
+    return await run_password_job(password_hasher.hash(password))
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
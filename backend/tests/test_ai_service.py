@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from app.services.ai_service import AIService
+from app.services.providers import StandInChatModel
+
+
+@pytest.fixture
+def service(monkeypatch, tmp_path):
+    for name, value in {
+        "AI_PROVIDER": "offline",
+        "OFFLINE_LLM_LATENCY_MS": "0",
+        "OFFLINE_LLM_TOKENS_PER_SECOND": "0",
+        "VECTORSTORE_DIR": str(tmp_path / "vectorstore"),
+        "EMBEDDING_CACHE_PATH": str(tmp_path / "embeddings.sqlite3"),
+        "CONVERSATION_DIR": str(tmp_path / "conversations"),
+    }.items():
+        monkeypatch.setenv(name, value)
+    ai_service = AIService()
+    assert ai_service.is_openai_available
+    yield ai_service
+    ai_service.close()
+
+
+@pytest.fixture
+def prompts(monkeypatch):
+    """Text of every prompt sent to the stand-in model."""
+    sent = []
+    answer = StandInChatModel._agenerate
+
+    async def capture(self, messages, *args, **kwargs):
+        sent.append("\n".join(str(m.content) for m in messages))
+        return await answer(self, messages, *args, **kwargs)
+
+    monkeypatch.setattr(StandInChatModel, "_agenerate", capture)
+    return sent
+
+
+def retrieved(prompt):
+    """The earlier conversations the retriever put in the prompt."""
+    return prompt.split("Related Earlier Conversations:")[1].split("Chat History:")[0]
+
+
+def test_prompt_carries_project_context_and_retrieved_history(service, prompts):
+    service.collections.add(
+        ["earlier"],
+        ["Project 7: User: who owns the launch?\nAssistant: Dana owns the launch."],
+        [{"project_id": "7", "type": "conversation", "created_at": 1.0}],
+    )
+    context = "Project: Launch\nDescription: None\nCreated: 2024-01-01\nTasks (1):\n- Book venue (TODO)"
+
+    asyncio.run(service.get_response("7", "who owns the launch?", context, user_id="alice@example.com"))
+
+    prompt = prompts[-1]
+    assert "Current Project Context:\n" + " " * 16 + context in prompt
+    assert "Dana owns the launch." in retrieved(prompt)
+    assert "Book venue" not in retrieved(prompt)
+
+
+def test_prompt_context_is_sent_in_place_of_the_full_context(service, prompts):
+    asyncio.run(service.get_response(
+        "7", "what is left?", "full context", user_id="alice@example.com", prompt_context="budgeted context"
+    ))
+
+    assert "budgeted context" in prompts[-1]
+    assert "full context" not in prompts[-1]
+
+
+def test_general_conversations_are_retrieved_only_for_their_user(service, prompts):
+    asyncio.run(service.get_response("general", "my bank PIN is SECRET-4242", user_id="alice@example.com"))
+    service.ingestion.flush()
+
+    asyncio.run(service.get_response("general", "what is my bank PIN?", user_id="bob@example.com"))
+    assert "SECRET-4242" not in prompts[-1]
+
+    asyncio.run(service.get_response("general", "what is my bank PIN?", user_id="alice@example.com"))
+    assert "SECRET-4242" in retrieved(prompts[-1])
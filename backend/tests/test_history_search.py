@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models import Base, ChatHistory
+from app.services.history_search import BM25Index, HistorySearch, reciprocal_rank_fusion
+
+
+class FakeCollections:
+    """The parts of ProjectCollections HistorySearch reads, over a dict."""
+
+    def __init__(self):
+        self.projects = {}
+        self.full_scans = 0
+
+    def put(self, project_id, doc_id, text, created_at):
+        metadata = {"project_id": project_id, "type": "conversation", "created_at": created_at}
+        self.projects.setdefault(project_id, {})[doc_id] = (text, metadata)
+
+    def count(self, project_id):
+        return len(self.projects.get(project_id, {}))
+
+    def ids(self, project_id):
+        self.full_scans += 1
+        return list(self.projects.get(project_id, {}))
+
+    def documents(self, project_id, ids):
+        found = self.projects.get(project_id, {})
+        return {doc_id: found[doc_id] for doc_id in ids if doc_id in found}
+
+    def documents_since(self, project_id, created_after):
+        return {
+            doc_id: document for doc_id, document in self.projects.get(project_id, {}).items()
+            if document[1]["created_at"] > created_after
+        }
+
+
+class FakeAIService:
+    is_openai_available = True
+
+    def __init__(self):
+        self.collections = FakeCollections()
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[ChatHistory.__table__])
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def keys(results):
+    return [key for key, _, _ in results]
+
+
+def test_bm25_ranks_by_term_rarity_and_counts_matches():
+    index = BM25Index()
+    index.add("a", "launch venue booked")
+    index.add("b", "launch budget approved")
+    index.add("c", "venue catering")
+    results = index.search("launch venue", k=3)
+    assert keys(results)[0] == "a"
+    assert dict((key, matched) for key, _, matched in results) == {"a": 2, "b": 1, "c": 1}
+    with pytest.raises(ValueError):
+        index.add("a", "again")
+
+
+def test_bm25_forgets_removed_documents():
+    index = BM25Index()
+    index.add("a", "launch venue")
+    index.add("b", "launch budget")
+    index.remove("a", "launch venue")
+    assert len(index) == 1
+    assert index.search("venue", k=5) == []
+    assert keys(index.search("launch", k=5)) == ["b"]
+    # Its terms' postings are gone with it
+    assert "venue" not in index._postings
+    index.remove("a", "launch venue")
+    index.add("a", "venue again")
+    assert keys(index.search("venue", k=5)) == ["a"]
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["x", "y", "z"], ["y", "x"], ["y"]])
+    assert [item for item, _ in fused] == ["y", "x", "z"]
+
+
+def test_sync_picks_up_new_chat_rows_and_vector_documents(db):
+    ai_service = FakeAIService()
+    search = HistorySearch(ai_service)
+    ai_service.collections.put("1", "v1", "Project 1: the venue is booked", 100.0)
+    db.add(ChatHistory(project_id=1, user_message="who caters?", assistant_message="Dana caters"))
+    db.commit()
+
+    results = asyncio.run(search.search(db, 1, "venue", mode="lexical"))
+    assert [r["content"] for r in results] == ["Project 1: the venue is booked"]
+    assert ai_service.collections.full_scans == 1
+
+    ai_service.collections.put("1", "v2", "Project 1: the venue moved", 200.0)
+    db.add(ChatHistory(project_id=1, user_message="where now?", assistant_message="the venue moved"))
+    db.commit()
+    results = asyncio.run(search.search(db, 1, "venue moved", mode="lexical"))
+    assert {r["content"] for r in results[:2]} == {
+        "Project 1: the venue moved", "Project 1: User: where now?\nAssistant: the venue moved"
+    }
+    # New documents were found by time stamp, without listing every id
+    assert ai_service.collections.full_scans == 1
+
+
+def test_sync_drops_documents_deleted_from_the_vector_store(db):
+    ai_service = FakeAIService()
+    search = HistorySearch(ai_service)
+    for i in range(3):
+        ai_service.collections.put("1", f"v{i}", f"Project 1: venue option {i}", 100.0 + i)
+    assert len(asyncio.run(search.search(db, 1, "venue", k=5, mode="lexical"))) == 3
+
+    # Maintenance deletes two and adds a summary in their place
+    del ai_service.collections.projects["1"]["v0"]
+    del ai_service.collections.projects["1"]["v1"]
+    ai_service.collections.put("1", "s", "Project 1: summary of venue options", 50.0)
+    results = asyncio.run(search.search(db, 1, "venue", k=5, mode="lexical"))
+
+    assert sorted(r["content"] for r in results) == [
+        "Project 1: summary of venue options", "Project 1: venue option 2"
+    ]
+    assert search._projects[1].vector_ids == {"v2", "s"}
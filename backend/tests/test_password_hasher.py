@@ -0,0 +1,61 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.services.password_hasher import HasherBusyError, PasswordHasher
+
+
+class GatedContext:
+    """Stands in for CryptContext; each call waits until the gate opens."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+
+    def verify(self, password, hashed_password):
+        self.gate.wait(5)
+        return password == hashed_password
+
+    def hash(self, password):
+        self.gate.wait(5)
+        return password
+
+
+def test_rejects_past_max_queue():
+    async def scenario():
+        context = GatedContext()
+        hasher = PasswordHasher(context, max_workers=1, max_queue=2)
+        # One call running and two waiting
+        calls = [asyncio.ensure_future(hasher.verify("pw", "pw")) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(HasherBusyError):
+            await hasher.verify("pw", "pw")
+        context.gate.set()
+        assert await asyncio.gather(*calls) == [True, True, True]
+        assert hasher.stats()["queued"] == 0
+        assert hasher.stats()["rejected"] == 1
+        hasher.close()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_calls_leave_the_queue():
+    async def scenario():
+        context = GatedContext()
+        hasher = PasswordHasher(context, max_workers=1, max_queue=1)
+        running = asyncio.ensure_future(hasher.verify("pw", "pw"))
+        await asyncio.sleep(0.05)
+        for _ in range(3):
+            # Waits behind the running call, then its client goes away
+            waiting = asyncio.ensure_future(hasher.verify("pw", "pw"))
+            await asyncio.sleep(0.01)
+            waiting.cancel()
+            await asyncio.gather(waiting, return_exceptions=True)
+            assert hasher.stats()["queued"] == 0
+        context.gate.set()
+        assert await running
+        assert await hasher.hash("other") == "other"
+        assert hasher.stats()["rejected"] == 0
+        hasher.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,33 @@
+from app.services.project_context import ProjectContextCache
+from app.storage.journal import JournalStore
+
+
+def test_tokens_are_counted_once_per_version(tmp_path):
+    store = JournalStore(str(tmp_path), flush_interval=0)
+    project = store.create_project({
+        "title": "Launch", "description": None, "owner_email": "owner@example.com", "created_at": "2024-01-01"
+    })
+
+    def add_task(title):
+        store.create_task({
+            "project_id": project["id"], "title": title, "description": None,
+            "status": "TODO", "created_at": "2024-01-01",
+        })
+
+    add_task("Book venue")
+    cache = ProjectContextCache()
+    counted = []
+
+    def count(text):
+        counted.append(text)
+        return len(text.split())
+
+    first = cache.token_count(store, project, count)
+    assert cache.token_count(store, project, count) == first
+    assert counted == [cache.get(store, project)]
+
+    add_task("Send invitations")
+    assert cache.token_count(store, project, count) == first + 4
+    assert len(counted) == 2
+    assert "- Send invitations (TODO)" in counted[-1]
+    store.close()
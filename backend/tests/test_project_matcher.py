@@ -0,0 +1,65 @@
+from app.services.project_matcher import ProjectMatcher, TitleTrie
+from app.storage.journal import JournalStore
+
+OWNER = "owner@example.com"
+
+
+def test_longest_title_wins():
+    trie = TitleTrie()
+    trie.add(1, "Launch")
+    trie.add(2, "Launch  Party")
+    trie.add(3, "Party")
+    assert trie.longest_match("how is the LAUNCH party going?") == 2
+    assert trie.longest_match("how is the launch going?") == 1
+    assert trie.longest_match("nothing here") is None
+
+
+def test_ties_resolve_to_earliest_mention_then_oldest_project():
+    trie = TitleTrie()
+    trie.add(1, "alpha")
+    trie.add(2, "omega")
+    assert trie.longest_match("omega before alpha") == 2
+    trie.add(3, "Omega")
+    trie.add(0, "omega")
+    assert trie.longest_match("omega") == 0
+
+
+def test_remove_prunes_only_unshared_nodes():
+    trie = TitleTrie()
+    trie.add(1, "launch")
+    trie.add(2, "launch party")
+    trie.remove(2)
+    assert trie.longest_match("launch party") == 1
+    # The nodes spelling " party" are gone, the shared prefix stays
+    node = trie._root
+    for char in "launch":
+        node = node.children[char]
+    assert node.children == {}
+
+    trie.remove(1)
+    assert trie._root.children == {}
+    assert trie.longest_match("launch") is None
+    trie.remove(1)
+
+
+def test_matcher_follows_renames_and_deletes(tmp_path):
+    store = JournalStore(str(tmp_path), flush_interval=0)
+
+    def create(title, owner=OWNER):
+        return store.create_project({"title": title, "description": None, "owner_email": owner, "created_at": "2024"})
+
+    launch = create("Launch")
+    hiring = create("Hiring plan")
+    create("Secret launch party", owner="someone@example.com")
+    matcher = ProjectMatcher()
+
+    assert matcher.find(store, OWNER, "is the launch on track?")["id"] == launch["id"]
+    assert matcher.find(store, OWNER, "the secret launch party")["id"] == launch["id"]
+
+    store.update_project(launch["id"], {"title": "Product launch"})
+    assert matcher.find(store, OWNER, "is the launch on track?") is None
+    assert matcher.find(store, OWNER, "is the product launch on track?")["title"] == "Product launch"
+
+    store.delete_project(hiring["id"])
+    assert matcher.find(store, OWNER, "update the hiring plan") is None
+    store.close()
@@ -0,0 +1,51 @@
+from app.services.response_cache import ResponseCache
+
+ALICE = ("alice@example.com", "1")
+BOB = ("bob@example.com", "1")
+
+
+def test_exact_repeat_ignores_case_and_spacing():
+    cache = ResponseCache()
+    cache.put(ALICE, "context", "What is left?", None, "Two tasks.")
+    assert cache.lookup(ALICE, "context", "  what IS   left? ") == "Two tasks."
+    assert cache.lookup(ALICE, "context", "What is done?") is None
+
+
+def test_similar_question_above_threshold():
+    cache = ResponseCache(threshold=0.9)
+    cache.put(ALICE, "context", "What is left?", [1.0, 0.0], "Two tasks.")
+    assert cache.lookup_similar(ALICE, "context", [10.0, 1.0]) == "Two tasks."
+    assert cache.lookup_similar(ALICE, "context", [1.0, 1.0]) is None
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1}
+
+
+def test_context_change_drops_only_that_scope():
+    cache = ResponseCache()
+    cache.put(ALICE, "context", "What is left?", [1.0, 0.0], "Two tasks.")
+    cache.put(BOB, "context", "What is left?", [1.0, 0.0], "Three tasks.")
+
+    assert cache.lookup(ALICE, "context with a new task", "What is left?") is None
+    # Going back to the old text does not bring the dropped answers back
+    assert cache.lookup(ALICE, "context", "What is left?") is None
+    assert cache.lookup_similar(ALICE, "context", [1.0, 0.0]) is None
+    assert cache.lookup(BOB, "context", "What is left?") == "Three tasks."
+    assert cache.stats()["entries"] == 1
+
+
+def test_answers_expire():
+    cache = ResponseCache(ttl=0)
+    cache.put(ALICE, "context", "What is left?", [1.0, 0.0], "Two tasks.")
+    assert cache.lookup(ALICE, "context", "What is left?") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_is_evicted():
+    cache = ResponseCache(max_entries=2)
+    cache.put(ALICE, "context", "first", None, "1")
+    cache.put(ALICE, "context", "second", None, "2")
+    assert cache.lookup(ALICE, "context", "first") == "1"
+    cache.put(BOB, "context", "third", None, "3")
+
+    assert cache.lookup(ALICE, "context", "second") is None
+    assert cache.lookup(ALICE, "context", "first") == "1"
+    assert cache.lookup(BOB, "context", "third") == "3"
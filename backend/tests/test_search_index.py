@@ -0,0 +1,85 @@
+import pytest
+
+from app.services.search_index import SearchIndex
+from app.storage.journal import JournalStore
+
+OWNER = "owner@example.com"
+
+
+@pytest.fixture
+def store(tmp_path):
+    backend = JournalStore(str(tmp_path), flush_interval=0)
+    yield backend
+    backend.close()
+
+
+def make_project(store, title, description=None, owner=OWNER):
+    return store.create_project({"title": title, "description": description, "owner_email": owner, "created_at": "2024"})
+
+
+def make_task(store, project_id, title, description=None):
+    return store.create_task({
+        "project_id": project_id, "title": title, "description": description, "status": "TODO", "created_at": "2024"
+    })
+
+
+def found(index, store, query):
+    return [(r["type"], r["id"]) for r in index.search(store, OWNER, query)]
+
+
+def test_every_word_must_match_and_the_last_one_as_a_prefix(store):
+    launch = make_project(store, "Product launch", "Spring release")
+    venue = make_task(store, launch["id"], "Book venue", "near the launch office")
+    make_project(store, "Launch party", owner="someone@example.com")
+    index = SearchIndex()
+
+    assert found(index, store, "launch") == [("project", launch["id"]), ("task", venue["id"])]
+    assert found(index, store, "book lau") == [("task", venue["id"])]
+    assert found(index, store, "spring rel") == [("project", launch["id"])]
+    # A single letter only matches whole words
+    assert found(index, store, "product l") == []
+    assert found(index, store, "launch missing") == []
+
+
+def test_title_matches_rank_first(store):
+    project = make_project(store, "Website")
+    in_description = make_task(store, project["id"], "Copy", "landing page text")
+    in_title = make_task(store, project["id"], "Landing page")
+    results = SearchIndex().search(store, OWNER, "landing page")
+    assert [(r["id"], r["score"]) for r in results] == [(in_title["id"], 4), (in_description["id"], 2)]
+
+
+def test_renames_and_deletes_are_picked_up(store):
+    project = make_project(store, "Launch")
+    task = make_task(store, project["id"], "Book venue")
+    other = make_task(store, project["id"], "Send invitations")
+    index = SearchIndex()
+    assert found(index, store, "ven") == [("task", task["id"])]
+
+    store.update_task(task["id"], {"title": "Book caterer"})
+    store.update_project(project["id"], {"title": "Relaunch"})
+    assert found(index, store, "ven") == []
+    assert found(index, store, "cat") == [("task", task["id"])]
+    assert found(index, store, "launch") == []
+    assert found(index, store, "relau") == [("project", project["id"])]
+
+    store.delete_task(other["id"])
+    assert found(index, store, "invitations") == []
+    store.delete_project(project["id"])
+    assert found(index, store, "caterer") == []
+    assert index._owners[OWNER].documents == {}
+
+
+def test_prefix_search_survives_vocabulary_churn(store):
+    project = make_project(store, "Churn")
+    tasks = [make_task(store, project["id"], f"word{i} shared") for i in range(20)]
+    index = SearchIndex()
+    assert len(found(index, store, "wor")) == 20
+
+    # Removed terms are skipped until the sorted list is rebuilt
+    for task in tasks[:15]:
+        store.update_task(task["id"], {"title": "renamed shared"})
+    assert sorted(found(index, store, "wor")) == sorted(("task", t["id"]) for t in tasks[15:])
+    store.update_task(tasks[0]["id"], {"title": "word0 again"})
+    assert ("task", tasks[0]["id"]) in found(index, store, "word0")
+    assert len(found(index, store, "ren")) == 14
@@ -0,0 +1,279 @@
+import os
+
+import pytest
+
+from app.storage.base import TaskNotFoundError
+from app.storage.journal import JournalStore
+from app.storage.sqlite import SQLiteStore
+
+OWNER = "owner@example.com"
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "json":
+        backend = JournalStore(str(tmp_path), flush_interval=0)
+    else:
+        backend = SQLiteStore(str(tmp_path / "app.sqlite3"))
+    yield backend
+    backend.close()
+
+
+def make_project(store, title="Project", owner=OWNER, created_at="2024-01-01T00:00:00"):
+    return store.create_project({
+        "title": title,
+        "description": None,
+        "owner_email": owner,
+        "created_at": created_at,
+    })
+
+
+def make_task(store, project_id, title="Task", status="TODO", created_at="2024-01-01T00:00:00"):
+    return store.create_task({
+        "project_id": project_id,
+        "title": title,
+        "description": None,
+        "status": status,
+        "created_at": created_at,
+    })
+
+
+def task_fields(title, status="TODO"):
+    return {"title": title, "description": None, "status": status, "created_at": "2024-01-01T00:00:00"}
+
+
+def test_users(store):
+    assert store.get_user(OWNER) is None
+    store.put_user({"email": OWNER, "hashed_password": "hash", "disabled": False})
+    assert store.get_user(OWNER) == {"email": OWNER, "hashed_password": "hash", "disabled": False}
+    store.put_user({"email": OWNER, "hashed_password": "other", "disabled": True})
+    assert store.get_user(OWNER)["hashed_password"] == "other"
+    assert store.get_user(OWNER)["disabled"] is True
+
+
+def test_add_user_keeps_existing(store):
+    assert store.add_user({"email": OWNER, "hashed_password": "first", "disabled": False})
+    assert not store.add_user({"email": OWNER, "hashed_password": "second", "disabled": False})
+    assert store.get_user(OWNER)["hashed_password"] == "first"
+
+
+def test_project_crud(store):
+    project = make_project(store)
+    assert project["id"] >= 1
+    assert store.get_project(project["id"]) == project
+    assert store.get_project(project["id"], OWNER) == project
+    assert store.get_project(project["id"], "someone@example.com") is None
+
+    updated = store.update_project(project["id"], {"title": "Renamed", "description": "d"})
+    assert updated["title"] == "Renamed"
+    assert updated["description"] == "d"
+    assert updated["created_at"] == project["created_at"]
+    assert store.get_project(project["id"])["title"] == "Renamed"
+
+
+def test_task_crud(store):
+    project = make_project(store)
+    task = make_task(store, project["id"])
+    assert store.get_task(task["id"]) == task
+    assert store.get_task(task["id"], project["id"]) == task
+    assert store.get_task(task["id"], project["id"] + 1) is None
+
+    updated = store.update_task(task["id"], {"status": "DONE"})
+    assert updated["status"] == "DONE"
+    assert updated["title"] == "Task"
+
+    store.delete_task(task["id"])
+    assert store.get_task(task["id"]) is None
+    assert store.list_tasks(project["id"]) == []
+
+
+def test_ids_are_not_reused(store):
+    project = make_project(store)
+    first = make_task(store, project["id"])
+    second = make_task(store, project["id"])
+    assert second["id"] > first["id"]
+
+
+def test_delete_project_removes_its_tasks(store):
+    project = make_project(store)
+    other = make_project(store, "Other")
+    tasks = [make_task(store, project["id"], f"t{i}") for i in range(3)]
+    kept = make_task(store, other["id"])
+
+    store.delete_project(project["id"])
+
+    assert store.get_project(project["id"]) is None
+    assert store.list_tasks(project["id"]) == []
+    assert all(store.get_task(t["id"]) is None for t in tasks)
+    assert store.get_task(kept["id"]) == kept
+    assert [p["id"] for p in store.list_projects(OWNER)] == [other["id"]]
+
+
+def test_list_projects_by_owner(store):
+    mine = [make_project(store, f"p{i}") for i in range(3)]
+    make_project(store, "theirs", owner="someone@example.com")
+    assert [p["id"] for p in store.list_projects(OWNER)] == [p["id"] for p in mine]
+
+
+def test_pagination(store):
+    project = make_project(store)
+    ids = [make_task(store, project["id"], f"t{i}")["id"] for i in range(7)]
+
+    pages = []
+    after = None
+    while True:
+        page = store.list_tasks(project["id"], after=after, limit=3)
+        pages.append([t["id"] for t in page])
+        if len(page) < 3:
+            break
+        after = page[-1]["id"]
+    assert pages == [ids[0:3], ids[3:6], ids[6:7]]
+    assert store.list_tasks(project["id"], after=ids[-1]) == []
+
+
+def test_pagination_past_deleted_rows(store):
+    project = make_project(store)
+    ids = [make_task(store, project["id"], f"t{i}")["id"] for i in range(6)]
+    store.delete_task(ids[2])
+    store.delete_task(ids[3])
+
+    # The cursor itself may have been deleted since the previous page
+    assert [t["id"] for t in store.list_tasks(project["id"], after=ids[2], limit=2)] == ids[4:6]
+    assert [t["id"] for t in store.list_tasks(project["id"], after=ids[0], limit=2)] == [ids[1], ids[4]]
+
+
+def test_list_filters(store):
+    project = make_project(store)
+    make_task(store, project["id"], "old", created_at="2024-01-01T00:00:00")
+    done = make_task(store, project["id"], "done", status="DONE", created_at="2024-02-01T00:00:00")
+    new = make_task(store, project["id"], "new", created_at="2024-03-01T00:00:00")
+
+    assert store.list_tasks(project["id"], status="DONE") == [done]
+    assert store.list_tasks(project["id"], created_after="2024-02-01T00:00:00") == [done, new]
+    assert store.list_tasks(
+        project["id"], created_after="2024-01-15T00:00:00", created_before="2024-02-15T00:00:00"
+    ) == [done]
+    assert store.list_tasks(project["id"], status="DONE", after=done["id"]) == []
+
+
+def test_batch_applies_operations_in_order(store):
+    project = make_project(store)
+    existing = make_task(store, project["id"], "existing")
+    doomed = make_task(store, project["id"], "doomed")
+
+    results = store.apply_task_batch(project["id"], [
+        {"op": "create", "fields": task_fields("created")},
+        {"op": "update", "id": existing["id"], "fields": {"status": "DONE"}},
+        {"op": "update", "id": existing["id"], "fields": {"title": "renamed"}},
+        {"op": "delete", "id": doomed["id"]},
+    ])
+
+    assert [r["title"] for r in results] == ["created", "existing", "renamed", "doomed"]
+    assert results[2]["status"] == "DONE"
+    assert results[0]["project_id"] == project["id"]
+    assert [(t["title"], t["status"]) for t in store.list_tasks(project["id"])] == [
+        ("renamed", "DONE"),
+        ("created", "TODO"),
+    ]
+
+
+def test_batch_rolls_back_on_missing_task(store):
+    project = make_project(store)
+    other = make_project(store, "Other")
+    task = make_task(store, project["id"])
+    foreign = make_task(store, other["id"])
+    version = store.task_list_version(project["id"])
+
+    for missing in (task["id"] + 100, foreign["id"]):
+        with pytest.raises(TaskNotFoundError) as error:
+            store.apply_task_batch(project["id"], [
+                {"op": "create", "fields": task_fields("never written")},
+                {"op": "update", "id": task["id"], "fields": {"status": "DONE"}},
+                {"op": "delete", "id": missing},
+            ])
+        assert error.value.task_id == missing
+
+    assert store.list_tasks(project["id"]) == [task]
+    assert store.task_list_version(project["id"]) == version
+
+
+def test_batch_cannot_touch_a_task_it_deleted(store):
+    project = make_project(store)
+    task = make_task(store, project["id"])
+    with pytest.raises(TaskNotFoundError):
+        store.apply_task_batch(project["id"], [
+            {"op": "delete", "id": task["id"]},
+            {"op": "update", "id": task["id"], "fields": {"title": "again"}},
+        ])
+    assert store.get_task(task["id"]) == task
+
+
+def test_project_list_version(store):
+    version = store.project_list_version(OWNER)
+    project = make_project(store)
+    created = store.project_list_version(OWNER)
+    assert created[0] != version[0]
+    assert created[1] >= version[1]
+
+    make_project(store, owner="someone@example.com")
+    assert store.project_list_version(OWNER) == created
+
+    store.update_project(project["id"], {"title": "Renamed"})
+    updated = store.project_list_version(OWNER)
+    assert updated[0] != created[0]
+
+    store.delete_project(project["id"])
+    assert store.project_list_version(OWNER)[0] != updated[0]
+
+
+def test_task_list_version(store):
+    project = make_project(store)
+    other = make_project(store, "Other")
+    version = store.task_list_version(project["id"])
+
+    task = make_task(store, project["id"])
+    created = store.task_list_version(project["id"])
+    assert created[0] != version[0]
+
+    make_task(store, other["id"])
+    assert store.task_list_version(project["id"]) == created
+
+    store.update_task(task["id"], {"status": "DONE"})
+    updated = store.task_list_version(project["id"])
+    assert updated[0] != created[0]
+
+    store.apply_task_batch(project["id"], [{"op": "delete", "id": task["id"]}])
+    assert store.task_list_version(project["id"])[0] != updated[0]
+
+
+def test_data_survives_reopening(store, tmp_path):
+    project = make_project(store)
+    task = make_task(store, project["id"])
+    store.close()
+    if isinstance(store, JournalStore):
+        reopened = JournalStore(str(tmp_path), flush_interval=0)
+    else:
+        reopened = SQLiteStore(store.path)
+    try:
+        assert reopened.get_project(project["id"]) == project
+        assert reopened.list_tasks(project["id"]) == [task]
+    finally:
+        reopened.close()
+
+
+def test_sqlite_seeds_from_uncompacted_journal(tmp_path):
+    source = JournalStore(str(tmp_path), flush_interval=0)
+    source.put_user({"email": OWNER, "hashed_password": "hash", "disabled": False})
+    project = make_project(source)
+    task = make_task(source, project["id"])
+    # Exit without close(), leaving the writes in journal.log only
+    source._journal.close()
+    assert os.path.getsize(tmp_path / "journal.log") > 0
+
+    store = SQLiteStore(str(tmp_path / "app.sqlite3"), db_dir=str(tmp_path))
+    try:
+        assert store.get_user(OWNER)["hashed_password"] == "hash"
+        assert store.list_projects(OWNER) == [project]
+        assert store.list_tasks(project["id"]) == [task]
+    finally:
+        store.close()
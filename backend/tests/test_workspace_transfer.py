@@ -0,0 +1,173 @@
+import asyncio
+import importlib
+import json
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services.conversation_memory import ConversationMemory
+from app.services.workspace_transfer import WorkspaceImporter, WorkspaceImportError, export_ndjson
+from app.storage.journal import JournalStore
+
+OWNER = "owner@example.com"
+
+
+@pytest.fixture
+def store(tmp_path):
+    backend = JournalStore(str(tmp_path / "db"), flush_interval=0)
+    yield backend
+    backend.close()
+
+
+@pytest.fixture
+def memory(tmp_path):
+    return ConversationMemory(str(tmp_path / "conversations"))
+
+
+def make_project(store, title, owner=OWNER):
+    return store.create_project({"title": title, "description": None, "owner_email": owner, "created_at": "2024-01-01T00:00:00"})
+
+
+def make_task(store, project_id, title, status="TODO"):
+    return store.create_task({
+        "project_id": project_id, "title": title, "description": None, "status": status, "created_at": "2024-01-02T00:00:00"
+    })
+
+
+def export_records(store, memory, owner=OWNER, page_size=500):
+    async def collect():
+        return "".join([chunk async for chunk in export_ndjson(store, memory, owner, page_size=page_size)])
+
+    return [json.loads(line) for line in asyncio.run(collect()).splitlines()]
+
+
+def test_export_pages_through_projects_and_tasks(store, memory):
+    projects = [make_project(store, f"P{i}") for i in range(3)]
+    tasks = [make_task(store, projects[1]["id"], f"t{i}") for i in range(5)]
+    make_project(store, "Theirs", owner="someone@example.com")
+    asyncio.run(memory.add_turn(OWNER, str(projects[1]["id"]), "what is left?", "five tasks"))
+    asyncio.run(memory.add_turn(OWNER, "general", "hello", "hi"))
+
+    records = export_records(store, memory, page_size=2)
+
+    assert records[0]["type"] == "workspace"
+    assert [(r["type"], r.get("id")) for r in records[1:]] == (
+        [("project", projects[0]["id"]), ("project", projects[1]["id"])]
+        + [("task", t["id"]) for t in tasks]
+        + [("conversation", None), ("project", projects[2]["id"]), ("conversation", None)]
+    )
+    assert records[-3] == {
+        "type": "conversation", "project_id": projects[1]["id"], "summary": "", "turns": [["what is left?", "five tasks"]]
+    }
+    assert records[-1]["project_id"] is None
+
+
+def test_importer_remaps_ids_and_batches_tasks(store, memory):
+    make_project(store, "Already there")
+    importer = WorkspaceImporter(store, memory, OWNER, batch_size=2)
+    importer.add_project(7, {"title": "Imported", "description": None, "created_at": "2024-01-01T00:00:00"})
+    for i in range(5):
+        importer.add_task(7, {"title": f"t{i}", "description": None, "status": "TODO", "created_at": "2024-01-01T00:00:00"})
+    importer.add_conversation(7, "", [["q", "a"]])
+    importer.flush()
+
+    new_id = importer.project_ids[7]
+    assert new_id != 7
+    assert [t["title"] for t in store.list_tasks(new_id)] == [f"t{i}" for i in range(5)]
+    assert memory.history(OWNER, str(new_id)) == ("", [("q", "a")])
+    assert importer.counts == {"projects": 1, "tasks": 5, "conversations": 1}
+
+    with pytest.raises(WorkspaceImportError):
+        importer.add_task(8, {"title": "orphan"})
+    with pytest.raises(WorkspaceImportError):
+        importer.add_project("7", {"title": "string id"})
+    with pytest.raises(WorkspaceImportError):
+        importer.add_conversation(None, "", [["only one message"]])
+
+
+@pytest.fixture(scope="module")
+def app(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("app")
+    with pytest.MonkeyPatch.context() as patch:
+        for name, value in {
+            "AI_PROVIDER": "offline",
+            "DB_DIR": str(directory / "db"),
+            "CONVERSATION_DIR": str(directory / "conversations"),
+            "VECTORSTORE_DIR": str(directory / "vectorstore"),
+            "EMBEDDING_CACHE_PATH": str(directory / "embeddings.sqlite3"),
+        }.items():
+            patch.setenv(name, value)
+        sys.modules.pop("main", None)
+        module = importlib.import_module("main")
+        yield module
+        module.close_store()
+        sys.modules.pop("main", None)
+
+
+def login(client, email):
+    client.post("/api/v1/users/register", json={"email": email, "password": "secret"})
+    token = client.post("/api/v1/token", data={"username": email, "password": "secret"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def post_ndjson(client, headers, records):
+    body = "\n".join(r if isinstance(r, str) else json.dumps(r) for r in records) + "\n"
+    return client.post("/api/v1/import", content=body, headers=dict(headers, **{"Content-Type": "application/x-ndjson"}))
+
+
+def test_export_import_round_trip(app):
+    client = TestClient(app.app)
+    alice = login(client, "alice@example.com")
+    bob = login(client, "bob@example.com")
+    client.post("/api/v1/projects", json={"title": "Bob's own"}, headers=bob)
+
+    launch = client.post("/api/v1/projects", json={"title": "Launch", "description": "spring"}, headers=alice).json()
+    for title in ("Book venue", "Send invitations"):
+        client.post(f"/api/v1/projects/{launch['id']}/tasks", json={"title": title, "status": "DONE"}, headers=alice)
+    asyncio.run(app.ai_service.memory.add_turn("alice@example.com", str(launch["id"]), "is the venue booked?", "yes"))
+
+    exported = client.get("/api/v1/export", headers=alice)
+    assert exported.status_code == 200
+    assert exported.headers["content-type"] == "application/x-ndjson"
+    records = [json.loads(line) for line in exported.text.splitlines()]
+
+    imported = post_ndjson(client, bob, records)
+    assert imported.status_code == 200
+    assert imported.json()["imported"] == {"projects": 1, "tasks": 2, "conversations": 1}
+    new_id = imported.json()["project_ids"][str(launch["id"])]
+    assert new_id != launch["id"]
+
+    projects = client.get("/api/v1/projects", headers=bob).json()
+    assert [(p["title"], p["description"]) for p in projects] == [("Bob's own", None), ("Launch", "spring")]
+    assert projects[1]["created_at"] == launch["created_at"]
+    tasks = client.get(f"/api/v1/projects/{new_id}/tasks", headers=bob).json()
+    assert [(t["title"], t["status"]) for t in tasks] == [("Book venue", "DONE"), ("Send invitations", "DONE")]
+    assert app.ai_service.memory.history("bob@example.com", str(new_id)) == ("", [("is the venue booked?", "yes")])
+
+
+@pytest.mark.parametrize("bad_line, error", [
+    ("{not json", "Expecting property name"),
+    ({"type": "task", "project_id": 99, "title": "orphan"}, "project 99 is not earlier in the file"),
+    ({"type": "project", "id": 2, "title": "P", "created_at": "yesterday"}, "is not an ISO 8601 timestamp"),
+    ({"type": "project", "id": 2}, "title"),
+    ({"type": "workspace", "version": 99}, "version 99 is not supported"),
+    ({"type": "mystery"}, "unknown record type"),
+])
+def test_bad_line_is_rejected_and_earlier_lines_kept(app, bad_line, error):
+    client = TestClient(app.app)
+    headers = login(client, "carol@example.com")
+    before = len(client.get("/api/v1/projects", headers=headers).json())
+
+    response = post_ndjson(client, headers, [
+        {"type": "project", "id": 1, "title": "Kept"},
+        {"type": "task", "project_id": 1, "title": "Also kept"},
+        bad_line,
+    ])
+
+    assert response.status_code == 400
+    detail = response.json()["detail"]
+    assert detail["line"] == 3
+    assert error in detail["error"]
+    assert detail["imported"] == {"projects": 1, "tasks": 1, "conversations": 0}
+    assert len(client.get("/api/v1/projects", headers=headers).json()) == before + 1